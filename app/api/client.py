@@ -7,6 +7,7 @@ import os
 import requests
 import logging
 from dotenv import load_dotenv
+from app.utils.metrics import observe_api_call, record_api_error
 
 # 加载环境变量
 load_dotenv()
@@ -34,6 +35,7 @@ class DouyinAPIClient:
             self.access_token = 'mock-access-token'
         return self.access_token
     
+    @observe_api_call
     def get_influencer_info(self, video_url):
         """
         通过视频链接获取达人信息
@@ -60,9 +62,11 @@ class DouyinAPIClient:
             }
             
         except Exception as e:
+            record_api_error('get_influencer_info')
             logger.error(f'获取达人信息失败: {str(e)}')
             return None
     
+    @observe_api_call
     def get_material_data(self, material_ids):
         """
         批量获取素材数据
@@ -92,9 +96,11 @@ class DouyinAPIClient:
             return result
             
         except Exception as e:
+            record_api_error('get_material_data')
             logger.error(f'获取素材数据失败: {str(e)}')
             return []
     
+    @observe_api_call
     def get_promotion_data(self, material_id, date_range=None):
         """
         获取推广数据
@@ -128,9 +134,11 @@ class DouyinAPIClient:
             ]
             
         except Exception as e:
+            record_api_error('get_promotion_data')
             logger.error(f'获取推广数据失败: {str(e)}')
             return []
     
+    @observe_api_call
     def fetch_all_material_ids(self, influencer_uid):
         """
         获取某个达人的所有素材ID
@@ -153,6 +161,7 @@ class DouyinAPIClient:
             ]
             
         except Exception as e:
+            record_api_error('fetch_all_material_ids')
             logger.error(f'获取达人素材ID列表失败: {str(e)}')
             return []
 
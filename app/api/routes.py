@@ -3,11 +3,30 @@ API路由定义
 提供系统的所有API接口
 """
 
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, url_for
 from flask_login import login_required, current_user
 from app.api.client import douyin_client
-from app.models import db, Influencer, Material, MaterialTag, PromotionData
-from datetime import datetime
+from app.models import db, Influencer, Material, MaterialTag, PromotionData, PromotionArchive, BackgroundJob
+from app.models import MaterialStatSnapshot
+from app.models import influencer_tag_association, material_tag_association
+from app.utils.tag_index import paginate_by_tags, TagExpressionError
+from app.utils.http_cache import conditional_get
+from app.utils.replica import read_replica
+from app.utils.scoping import scoped_query
+from app.utils.db_pool import pool_stats
+from app.utils.jobs import enqueue_job
+from app.utils.material_import import import_video_urls, MAX_BULK_URLS
+from app.utils.ingest import begin_batch, ingest_batch, IngestError
+from app.utils.reports import REPORTS
+from app.utils.engagement import growth_curve
+from app.utils.similarity import index_version, recommend_influencers, SimilarityIndexError
+from app.utils.budget import optimize_budget, BudgetError
+from app import csrf
+from flask_wtf.csrf import validate_csrf
+from wtforms import ValidationError
+from datetime import datetime, timedelta
+import hmac
+import math
 
 # 创建API蓝图
 api_bp = Blueprint('api', __name__)
@@ -142,72 +161,31 @@ def auto_fetch_material_data():
         if not video_url:
             return jsonify({'error': '视频链接不能为空'}), 400
         
-        # 获取达人信息
-        influencer_info = douyin_client.get_influencer_info(video_url)
-        
-        if not influencer_info:
-            return jsonify({'error': '获取达人信息失败'}), 500
-        
-        # 查找或创建达人
+        # 只能指定自己创建的达人；未指定时按API返回的达人信息查找或创建
         influencer = None
         if influencer_id:
-            influencer = Influencer.query.get(influencer_id)
+            influencer = Influencer.query.filter_by(id=influencer_id, created_by_id=current_user.id).first()
+            if not influencer:
+                return jsonify({'error': '达人不存在'}), 404
         
-        if not influencer:
-            # 检查是否已存在该达人
-            influencer = Influencer.query.filter_by(uid=influencer_info['uid']).first()
-            
-        if not influencer:
-            # 创建新达人
-            influencer = Influencer(
-                name=influencer_info['name'],
-                douyin_id=influencer_info['douyin_id'],
-                uid=influencer_info['uid'],
-                influencer_level=influencer_info.get('influencer_level'),
-                created_by_id=current_user.id
-            )
-            db.session.add(influencer)
-            db.session.commit()
-        
-        # 从URL中提取素材ID（简化处理）
-        material_id = video_url.split('/')[-1] if '/' in video_url else video_url
+        result = import_video_urls([video_url], current_user.id, influencer=influencer)[0]
         
-        # 检查素材是否已存在
-        existing_material = Material.query.filter_by(material_id=material_id).first()
+        if result['status'] == 'failed':
+            return jsonify({'error': result['error']}), 500
+        if result['status'] == 'invalid':
+            return jsonify({'error': result['error']}), 400
         
-        if existing_material:
+        if result['status'] == 'exists':
             return jsonify({
                 'error': '素材已存在',
-                'influencer': {
-                    'id': influencer.id,
-                    'name': influencer.name
-                },
-                'material': {
-                    'id': existing_material.id,
-                    'material_id': existing_material.material_id
-                }
+                'influencer': result['influencer'],
+                'material': result['material']
             }), 200
         
-        # 创建新素材
-        new_material = Material(
-            influencer_id=influencer.id,
-            material_id=material_id,
-            video_url=video_url,
-            created_by_id=current_user.id
-        )
-        db.session.add(new_material)
-        db.session.commit()
-        
         return jsonify({
             'message': '素材自动创建成功',
-            'influencer': {
-                'id': influencer.id,
-                'name': influencer.name
-            },
-            'material': {
-                'id': new_material.id,
-                'material_id': new_material.material_id
-            }
+            'influencer': result['influencer'],
+            'material': result['material']
         }), 201
         
     except Exception as e:
@@ -215,15 +193,71 @@ def auto_fetch_material_data():
         current_app.logger.error(f'自动获取素材API错误: {str(e)}')
         return jsonify({'error': '服务器内部错误'}), 500
 
+@api_bp.route('/material/auto-fetch/bulk', methods=['POST'])
+@login_required
+def bulk_auto_fetch_material_data():
+    """
+    通过多个视频链接批量创建素材
+    需要登录，仅商务用户可调用；已存在的达人与素材通过IN查询批量查找，缺失的在一个事务中创建
+    
+    POST参数：
+        video_urls: 视频素材链接列表
+        influencer_id: 达人ID (可选，指定后所有素材归属该达人)
+    
+    返回每个链接的处理状态：created / exists / duplicate / invalid / failed
+    """
+    try:
+        # 权限检查
+        if not current_user.is_business():
+            return jsonify({'error': '权限不足，仅商务用户可操作'}), 403
+        
+        data = request.get_json() or {}
+        video_urls = data.get('video_urls')
+        influencer_id = data.get('influencer_id')
+        
+        if not video_urls or not isinstance(video_urls, list):
+            return jsonify({'error': '视频链接列表不能为空'}), 400
+        if len(video_urls) > MAX_BULK_URLS:
+            return jsonify({'error': f'单次最多提交 {MAX_BULK_URLS} 个链接'}), 400
+        
+        influencer = None
+        if influencer_id:
+            influencer = Influencer.query.filter_by(id=influencer_id, created_by_id=current_user.id).first()
+            if not influencer:
+                return jsonify({'error': '达人不存在'}), 404
+        
+        results = import_video_urls(
+            [str(url) for url in video_urls], current_user.id, influencer=influencer,
+            concurrency=current_app.config.get('PROMOTION_FETCH_CONCURRENCY', 4)
+        )
+        
+        summary = {}
+        for item in results:
+            summary[item['status']] = summary.get(item['status'], 0) + 1
+        
+        return jsonify({
+            'message': f"共 {len(results)} 个链接，新建 {summary.get('created', 0)} 个素材",
+            'summary': summary,
+            'results': results
+        }), 201 if summary.get('created') else 200
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'批量自动获取素材API错误: {str(e)}')
+        return jsonify({'error': '服务器内部错误'}), 500
+
 @api_bp.route('/promotion/auto-fetch', methods=['POST'])
 @login_required
 def auto_fetch_promotion_data():
     """
     自动获取推广数据并保存
-    需要登录，仅投手用户可调用
+    需要登录，仅投手用户可调用；获取操作作为后台任务执行，返回任务ID
     
-    POST参数：
+    POST参数（获取目标四选一）：
         material_id: 素材ID
+        material_ids: 素材ID列表
+        influencer_id: 达人ID，获取该达人的全部素材
+        tag: 素材标签名称，获取带有该标签的全部素材
         start_date: 开始日期
         end_date: 结束日期
     """
@@ -236,56 +270,441 @@ def auto_fetch_promotion_data():
         material_id = data.get('material_id')
         start_date = data.get('start_date')
         end_date = data.get('end_date')
+        params = {'start_date': start_date, 'end_date': end_date, 'user_id': current_user.id}
+        
+        if data.get('influencer_id'):
+            if not Influencer.query.get(data['influencer_id']):
+                return jsonify({'error': '达人不存在'}), 404
+            params['influencer_id'] = data['influencer_id']
+        elif data.get('tag'):
+            if not MaterialTag.query.filter_by(name=data['tag']).first():
+                return jsonify({'error': '素材标签不存在'}), 404
+            params['tag'] = data['tag']
+        else:
+            material_ids = data.get('material_ids') or ([material_id] if material_id else [])
+            if not material_ids:
+                return jsonify({'error': '素材ID不能为空'}), 400
+            
+            # 查找素材
+            materials = Material.query.filter(Material.material_id.in_(material_ids)).all()
+            
+            if not materials:
+                return jsonify({'error': '素材不存在'}), 404
+            params['material_ids'] = [material.id for material in materials]
         
-        if not material_id:
-            return jsonify({'error': '素材ID不能为空'}), 400
+        # 提交后台任务
+        job = enqueue_job('promotion_fetch', params, user_id=current_user.id)
+        
+        return jsonify({
+            'message': '推广数据获取任务已提交',
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': url_for('api.job_status', job_id=job.id),
+            'material_id': material_id
+        }), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'自动获取推广数据API错误: {str(e)}')
+        return jsonify({'error': '服务器内部错误'}), 500
+
+def _ingest_user_id():
+    """
+    推送接口的认证：携带 Authorization: Bearer <INGEST_TOKEN> 时数据归属 INGEST_USER_ID，
+    否则要求已登录的投手用户，并且请求头 X-CSRFToken 必须携带有效的CSRF令牌
+    （接口整体免除了CSRF检查以便令牌推送，使用登录会话时在这里补做检查）
+
+    Returns:
+        tuple: (用户ID, 错误响应)
+    """
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        token = current_app.config.get('INGEST_TOKEN')
+        user_id = current_app.config.get('INGEST_USER_ID')
+        if not token or not user_id:
+            return None, (jsonify({'error': '推送接口未配置'}), 503)
+        if not hmac.compare_digest(header[len('Bearer '):].encode(), token.encode()):
+            return None, (jsonify({'error': '令牌无效'}), 401)
+        return user_id, None
+    if not current_user.is_authenticated:
+        return None, (jsonify({'error': '请先登录'}), 401)
+    if not current_user.is_pitcher():
+        return None, (jsonify({'error': '权限不足，仅投手用户可操作'}), 403)
+    if current_app.config.get('WTF_CSRF_ENABLED', True):
+        try:
+            validate_csrf(request.headers.get('X-CSRFToken'))
+        except ValidationError:
+            return None, (jsonify({'error': 'CSRF令牌无效'}), 400)
+    return current_user.id, None
+
+@api_bp.route('/promotion/ingest', methods=['POST'])
+@csrf.exempt
+def ingest_promotion_data():
+    """
+    接收推送的推广数据
+    请求体为NDJSON，每行一条推广数据，Content-Encoding: gzip 时为gzip压缩的NDJSON
+    
+    请求头：
+        Authorization: Bearer <INGEST_TOKEN>（或使用投手用户的登录会话，同时携带 X-CSRFToken）
+        X-Batch-Id: 批次ID，同一批次重复推送时直接返回首次处理的结果
+    
+    每行字段：material_id, date, cost, sales_amount, exposure_count, click_count, conversion_count, roi
+    """
+    user_id, error = _ingest_user_id()
+    if error:
+        return error
+    
+    batch_id = (request.headers.get('X-Batch-Id') or request.args.get('batch_id') or '').strip()
+    if not batch_id or len(batch_id) > 100:
+        return jsonify({'error': '批次ID不能为空且不能超过100个字符'}), 400
+    
+    encoding = (request.headers.get('Content-Encoding') or '').lower()
+    if encoding not in ('', 'identity', 'gzip'):
+        return jsonify({'error': f'不支持的Content-Encoding: {encoding}'}), 415
+    
+    try:
+        batch, should_process = begin_batch(batch_id, user_id, current_app.config.get('INGEST_BATCH_TIMEOUT', 600))
+        if not should_process:
+            if batch.status == 'completed':
+                return jsonify({'batch_id': batch_id, 'status': 'completed', 'duplicate': True,
+                                **(batch.summary or {})}), 200
+            return jsonify({'error': '该批次正在处理中', 'batch_id': batch_id, 'status': batch.status}), 409
+        
+        stats = ingest_batch(batch, request.stream, user_id, compressed=encoding == 'gzip',
+                             batch_size=current_app.config.get('INGEST_BATCH_SIZE', 5000))
+        return jsonify({'batch_id': batch_id, 'status': 'completed', 'duplicate': False, **stats}), 200
+    
+    except IngestError as e:
+        return jsonify({'error': str(e), 'batch_id': batch_id, 'status': 'failed'}), 400
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'推送推广数据API错误: {str(e)}')
+        return jsonify({'error': '服务器内部错误', 'batch_id': batch_id, 'status': 'failed'}), 500
+
+@api_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    """
+    查询后台任务状态与进度
+    需要登录，商务用户只能查询自己提交的任务
+    """
+    job = BackgroundJob.query.get(job_id)
+    if not job or (not current_user.is_pitcher() and job.created_by_id != current_user.id):
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(job.to_dict()), 200
+
+def _tag_filter_sources():
+    """标签筛选API的数据源：被筛选的实体表与对应的标签关联表"""
+    if request.args.get('type', 'influencer') == 'material':
+        model, association = Material, material_tag_association
+    else:
+        model, association = Influencer, influencer_tag_association
+    query = model.query
+    if current_user.is_business():
+        query = query.filter_by(created_by_id=current_user.id)
+    return [query, association]
+
+@api_bp.route('/tags/filter', methods=['GET'])
+@login_required
+@read_replica
+@conditional_get(_tag_filter_sources)
+def filter_by_tags():
+    """
+    按标签组合筛选达人或素材
+    需要登录，商务用户只能筛选自己创建的数据
+    
+    GET参数：
+        type: 筛选对象，influencer 或 material（默认influencer）
+        q: 标签筛选表达式，如 "美妆 AND 测评 NOT 开箱"
+        page: 页码 (可选)
+        per_page: 每页数量 (可选，最大100)
+    """
+    try:
+        tag_type = request.args.get('type', 'influencer')
+        expression = request.args.get('q', '').strip()
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 20, type=int), 100)
+        
+        if tag_type not in ('influencer', 'material'):
+            return jsonify({'error': '筛选对象只能是influencer或material'}), 400
+        
+        if not expression:
+            return jsonify({'error': '标签筛选表达式不能为空'}), 400
+        
+        model = Influencer if tag_type == 'influencer' else Material
+        query = model.query
+        if current_user.is_business():
+            query = query.filter_by(created_by_id=current_user.id)
+        
+        try:
+            pagination = paginate_by_tags(query, tag_type, expression, page, per_page,
+                                          scoped=current_user.is_business())
+        except TagExpressionError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if tag_type == 'influencer':
+            items = [{'id': inf.id, 'name': inf.name, 'uid': inf.uid} for inf in pagination.items]
+        else:
+            items = [{'id': mat.id, 'material_id': mat.material_id, 'influencer_id': mat.influencer_id}
+                     for mat in pagination.items]
+        
+        return jsonify({
+            'total': pagination.total,
+            'page': pagination.page,
+            'per_page': pagination.per_page,
+            'source': pagination.source,
+            'items': items
+        }), 200
         
-        # 查找素材
-        material = Material.query.filter_by(material_id=material_id).first()
+    except Exception as e:
+        current_app.logger.error(f'标签筛选API错误: {str(e)}')
+        return jsonify({'error': '服务器内部错误'}), 500
+
+@api_bp.route('/reports/promotions', methods=['GET'])
+@login_required
+@read_replica
+@conditional_get(lambda: [scoped_query(PromotionData), scoped_query(PromotionArchive), Material.query])
+def promotion_report():
+    """
+    推广数据汇总报表，同时统计每日数据与压缩后的归档数据
+    需要登录，商务用户只统计自己创建的数据
+    
+    GET参数：
+        group_by: 分组方式，day / material / influencer（默认day）
+        start_date: 开始日期 (可选)
+        end_date: 结束日期 (可选)
+        limit: 按素材或达人分组时返回的数量 (可选，最大500)
+    """
+    try:
+        group_by = request.args.get('group_by', 'day')
+        if group_by not in REPORTS:
+            return jsonify({'error': '分组方式只能是day、material或influencer'}), 400
+        
+        try:
+            start = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() \
+                if request.args.get('start_date') else None
+            end = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() \
+                if request.args.get('end_date') else None
+        except ValueError:
+            return jsonify({'error': '日期格式无效，请使用YYYY-MM-DD格式'}), 400
+        
+        created_by_id = current_user.id if current_user.is_business() else None
+        if group_by == 'day':
+            items = REPORTS[group_by](start, end, created_by_id)
+        else:
+            limit = min(request.args.get('limit', 50, type=int), 500)
+            items = REPORTS[group_by](start, end, created_by_id, limit=limit)
+        
+        return jsonify({'group_by': group_by, 'items': items}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f'推广数据报表API错误: {str(e)}')
+        return jsonify({'error': '服务器内部错误'}), 500
+
+@api_bp.route('/promotion/optimize-budget', methods=['POST'])
+@login_required
+@read_replica
+def optimize_promotion_budget():
+    """
+    按素材历史花费与销售额拟合收益递减曲线，计算总预算在素材间的分配方案
+    需要登录，仅投手用户可调用；只计算方案，不修改数据
+    
+    POST参数：
+        budget: 总预算
+        influencer_caps: 达人花费上限 {达人ID: 上限} (可选)
+        default_influencer_cap: 未单独指定的达人的花费上限 (可选)
+        min_spend: 单个素材的最低花费，低于该值的素材不投放 (可选，默认0)
+        material_ids: 只在这些素材中分配 (可选)
+        lookback_days: 拟合使用的历史天数 (可选，默认BUDGET_LOOKBACK_DAYS)
+    """
+    try:
+        # 权限检查
+        if not current_user.is_pitcher():
+            return jsonify({'error': '权限不足，仅投手用户可操作'}), 403
         
-        if not material:
+        data = request.get_json(silent=True) or {}
+        try:
+            budget = float(data.get('budget') or 0)
+            influencer_caps = {int(key): float(value) for key, value in (data.get('influencer_caps') or {}).items()}
+            default_cap = data.get('default_influencer_cap')
+            default_cap = float(default_cap) if default_cap is not None else None
+            min_spend = float(data.get('min_spend') or 0)
+            material_ids = [int(item) for item in data['material_ids']] if data.get('material_ids') else None
+            lookback_days = int(data.get('lookback_days') or current_app.config.get('BUDGET_LOOKBACK_DAYS', 90))
+        except (TypeError, ValueError, AttributeError):
+            return jsonify({'error': '参数格式无效'}), 400
+        # float()接受'inf'、'nan'，这些值会使分配计算失效
+        amounts = [budget, min_spend, *influencer_caps.values()]
+        if default_cap is not None:
+            amounts.append(default_cap)
+        if not all(math.isfinite(amount) for amount in amounts):
+            return jsonify({'error': '参数格式无效'}), 400
+        
+        try:
+            result = optimize_budget(budget, influencer_caps, default_cap, min_spend, material_ids, lookback_days)
+        except BudgetError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify(result), 200
+        
+    except Exception as e:
+        current_app.logger.error(f'预算分配API错误: {str(e)}')
+        return jsonify({'error': '服务器内部错误'}), 500
+
+# 互动数据增长曲线最多查询的天数
+MAX_GROWTH_DAYS = 366
+
+def _growth_range():
+    """
+    解析增长曲线的日期范围，默认最近30天
+
+    Returns:
+        tuple: (开始日期, 结束日期, 错误响应)
+    """
+    try:
+        end = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() \
+            if request.args.get('end_date') else datetime.utcnow().date()
+        start = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() \
+            if request.args.get('start_date') else end - timedelta(days=29)
+    except ValueError:
+        return None, None, (jsonify({'error': '日期格式无效，请使用YYYY-MM-DD格式'}), 400)
+    if start > end or (end - start).days >= MAX_GROWTH_DAYS:
+        return None, None, (jsonify({'error': f'日期范围无效，最多查询 {MAX_GROWTH_DAYS} 天'}), 400)
+    return start, end, None
+
+@api_bp.route('/materials/<int:material_id>/growth', methods=['GET'])
+@login_required
+@read_replica
+@conditional_get(lambda material_id: [Material.query.filter_by(id=material_id),
+                                      MaterialStatSnapshot.query.filter_by(material_id=material_id),
+                                      datetime.utcnow().date()])
+def material_growth(material_id):
+    """
+    素材互动数据增长曲线
+    需要登录，商务用户只能查询自己创建的素材
+    
+    GET参数：
+        start_date: 开始日期 (可选，默认30天前)
+        end_date: 结束日期 (可选，默认今天)
+    """
+    try:
+        material = Material.query.get(material_id)
+        if not material or (current_user.is_business() and material.created_by_id != current_user.id):
             return jsonify({'error': '素材不存在'}), 404
         
-        # 获取推广数据
-        date_range = None
-        if start_date and end_date:
-            date_range = (start_date, end_date)
+        start, end, error = _growth_range()
+        if error:
+            return error
         
-        promotion_data_list = douyin_client.get_promotion_data(material_id, date_range)
+        return jsonify({
+            'material_id': material.id,
+            'start_date': start.isoformat(),
+            'end_date': end.isoformat(),
+            'items': growth_curve([material.id], start, end)
+        }), 200
         
-        if not promotion_data_list:
-            return jsonify({'error': '获取推广数据失败'}), 500
+    except Exception as e:
+        current_app.logger.error(f'素材增长曲线API错误: {str(e)}')
+        return jsonify({'error': '服务器内部错误'}), 500
+
+@api_bp.route('/influencers/<int:influencer_id>/growth', methods=['GET'])
+@login_required
+@read_replica
+@conditional_get(lambda influencer_id: [Influencer.query.filter_by(id=influencer_id),
+                                        Material.query.filter_by(influencer_id=influencer_id),
+                                        MaterialStatSnapshot.query.join(Material, Material.id == MaterialStatSnapshot.material_id)
+                                        .filter(Material.influencer_id == influencer_id),
+                                        datetime.utcnow().date()])
+def influencer_growth(influencer_id):
+    """
+    达人全部素材互动数据之和的增长曲线
+    需要登录，商务用户只能查询自己创建的达人
+    
+    GET参数：
+        start_date: 开始日期 (可选，默认30天前)
+        end_date: 结束日期 (可选，默认今天)
+    """
+    try:
+        influencer = Influencer.query.get(influencer_id)
+        if not influencer or (current_user.is_business() and influencer.created_by_id != current_user.id):
+            return jsonify({'error': '达人不存在'}), 404
         
-        # 保存推广数据
-        saved_count = 0
-        for pd in promotion_data_list:
-            # 检查是否已存在
-            existing = PromotionData.query.filter_by(
-                material_id=material.id,
-                date=datetime.strptime(pd['date'], '%Y-%m-%d').date()
-            ).first()
-            
-            if not existing:
-                promotion_data = PromotionData(
-                    material_id=material.id,
-                    date=datetime.strptime(pd['date'], '%Y-%m-%d').date(),
-                    cost=pd['cost'],
-                    sales_amount=pd['sales_amount'],
-                    roi=pd['roi'],
-                    created_by_id=current_user.id
-                )
-                db.session.add(promotion_data)
-                saved_count += 1
-        
-        db.session.commit()
+        start, end, error = _growth_range()
+        if error:
+            return error
         
+        material_ids = [row.id for row in Material.query.with_entities(Material.id).filter_by(influencer_id=influencer.id)]
         return jsonify({
-            'message': '推广数据自动获取成功',
-            'saved_count': saved_count,
-            'material_id': material_id
-        }), 201
+            'influencer_id': influencer.id,
+            'material_count': len(material_ids),
+            'start_date': start.isoformat(),
+            'end_date': end.isoformat(),
+            'items': growth_curve(material_ids, start, end)
+        }), 200
         
     except Exception as e:
-        db.session.rollback()
-        current_app.logger.error(f'自动获取推广数据API错误: {str(e)}')
+        current_app.logger.error(f'达人增长曲线API错误: {str(e)}')
+        return jsonify({'error': '服务器内部错误'}), 500
+
+# 相似达人最多返回的数量
+MAX_SIMILAR_INFLUENCERS = 50
+
+@api_bp.route('/influencers/<int:influencer_id>/similar', methods=['GET'])
+@login_required
+@read_replica
+@conditional_get(lambda influencer_id: [Influencer.query.filter_by(id=influencer_id), scoped_query(Influencer),
+                                        index_version(current_app.config.get('SIMILARITY_INDEX_DIR', 'similarity'))])
+def similar_influencers(influencer_id):
+    """
+    与指定达人最相似的达人（标签、互动数据与ROI特征的余弦相似度）
+    需要登录，商务用户只能查询并只推荐自己创建的达人
+    
+    GET参数：
+        k: 返回数量 (可选，默认10，最多50)
+    """
+    try:
+        influencer = Influencer.query.get(influencer_id)
+        if not influencer or (current_user.is_business() and influencer.created_by_id != current_user.id):
+            return jsonify({'error': '达人不存在'}), 404
+        
+        k = min(max(request.args.get('k', 10, type=int), 1), MAX_SIMILAR_INFLUENCERS)
+        try:
+            matches = recommend_influencers(
+                current_app.config.get('SIMILARITY_INDEX_DIR', 'similarity'), influencer.id, k,
+                created_by_id=current_user.id if current_user.is_business() else None
+            )
+        except SimilarityIndexError as e:
+            return jsonify({'error': str(e)}), 503
+        
+        return jsonify({
+            'influencer_id': influencer.id,
+            'items': [{
+                'id': match.id,
+                'name': match.name,
+                'douyin_id': match.douyin_id,
+                'influencer_level': match.influencer_level,
+                'similarity': similarity,
+            } for match, similarity in matches]
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f'相似达人API错误: {str(e)}')
+        return jsonify({'error': '服务器内部错误'}), 500
+
+@api_bp.route('/system/db-pool', methods=['GET'])
+@login_required
+def get_db_pool_stats():
+    """
+    获取数据库连接池状态
+    包含连接获取等待时间统计与当前/峰值占用连接数，用于连接池容量调优
+    需要登录，仅投手用户可调用
+    """
+    try:
+        if not current_user.is_pitcher():
+            return jsonify({'error': '权限不足，仅投手用户可操作'}), 403
+        
+        return jsonify(pool_stats(db.engines)), 200
+        
+    except Exception as e:
+        current_app.logger.error(f'获取连接池状态API错误: {str(e)}')
         return jsonify({'error': '服务器内部错误'}), 500
\ No newline at end of file
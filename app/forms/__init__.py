@@ -3,7 +3,7 @@
 """
 
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, SelectField, URLField, DateField, DecimalField, SelectMultipleField, TextAreaField
+from wtforms import StringField, PasswordField, SubmitField, BooleanField, SelectField, URLField, DateField, DecimalField, SelectMultipleField, TextAreaField
 from wtforms.validators import DataRequired, Length, Email, EqualTo, ValidationError, Regexp, Optional
 from app.models import User, Influencer, Material, MaterialTag, InfluencerTag, PromotionData
 
@@ -11,6 +11,7 @@ from app.models import User, Influencer, Material, MaterialTag, InfluencerTag, P
 class LoginForm(FlaskForm):
     username = StringField('用户名', validators=[DataRequired(), Length(1, 50)])
     password = PasswordField('密码', validators=[DataRequired()])
+    remember = BooleanField('记住我')
     submit = SubmitField('登录')
 
 # 用户注册表单
@@ -3,15 +3,23 @@
 """
 
 from datetime import datetime
-from app import db, login_manager
+from app import db
 from flask_login import UserMixin
+from sqlalchemy import func
 from sqlalchemy.orm import relationship
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.utils.passwords import hash_password, verify_password
 
-@login_manager.user_loader
-def load_user(user_id):
-    """用户加载器，用于Flask-Login"""
-    return User.query.get(int(user_id))
+def _copy_parameter(name):
+    """列默认值：插入时未指定该列则取同一行中另一列的值"""
+    def default(context):
+        return context.get_current_parameters().get(name)
+    return default
+
+def _promotion_name(context):
+    """推广数据名称默认值，与数据导入时的命名方式一致"""
+    params = context.get_current_parameters()
+    day = params.get('date')
+    return f"{params.get('material_id')} {day.isoformat() if day else ''}".strip()
 
 # 用户表
 class User(db.Model, UserMixin):
@@ -27,20 +35,27 @@ class User(db.Model, UserMixin):
     update_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # 关系 - 兼容现有和新增的引用方式
-    created_influencers = relationship('Influencer', backref='created_by', lazy=True)
-    created_materials = relationship('Material', backref='created_by', lazy=True)
-    created_promotions = relationship('PromotionData', backref='created_by', lazy=True)
-    influencers = relationship('Influencer', backref='created_by_user', lazy=True)
-    materials = relationship('Material', backref='created_by_user', lazy=True)
-    promotions = relationship('PromotionData', backref='created_by_user', lazy=True)
+    # 数据表中created_by_id与created_by两列都引用users.id，关系统一按created_by_id关联
+    influencers = relationship('Influencer', foreign_keys='Influencer.created_by_id',
+                               backref='created_by_user', lazy=True)
+    materials = relationship('Material', foreign_keys='Material.created_by_id',
+                             backref='created_by_user', lazy=True)
+    promotions = relationship('PromotionData', foreign_keys='PromotionData.created_by_id',
+                              backref='created_by_user', lazy=True)
+    created_influencers = relationship('Influencer', foreign_keys='Influencer.created_by_id',
+                                       viewonly=True, lazy=True)
+    created_materials = relationship('Material', foreign_keys='Material.created_by_id',
+                                     viewonly=True, lazy=True)
+    created_promotions = relationship('PromotionData', foreign_keys='PromotionData.created_by_id',
+                                      viewonly=True, lazy=True)
     
     def set_password(self, password):
         """设置密码（加密存储）"""
-        self.password = generate_password_hash(password)
+        self.password = hash_password(password)
     
     def check_password(self, password):
         """验证密码"""
-        return check_password_hash(self.password, password)
+        return verify_password(self.password, password)
     
     def is_business(self):
         return self.role == 'business'
@@ -61,6 +76,7 @@ class InfluencerTag(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
+    usage_counter = db.Column(db.Integer, default=0, nullable=False)  # 冗余的使用次数计数器
     create_time = db.Column(db.DateTime, default=datetime.utcnow)
     
     # 关系
@@ -68,8 +84,10 @@ class InfluencerTag(db.Model):
     
     @property
     def usage_count(self):
-        """获取标签使用次数"""
-        return len(self.influencers)
+        """获取标签使用次数（直接统计关联表，不加载达人列表）"""
+        return db.session.query(func.count(influencer_tag_association.c.influencer_id)).filter(
+            influencer_tag_association.c.tag_id == self.id
+        ).scalar()
     
     def __repr__(self):
         return f'<InfluencerTag {self.name}>'
@@ -95,7 +113,8 @@ class Influencer(db.Model):
     avg_views = db.Column(db.Integer, default=0)  # 新增平均播放量
     contact_info = db.Column(db.String(200))  # 新增联系方式
     created_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
-    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # 兼容新增的引用方式
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True,
+                           default=_copy_parameter('created_by_id'))  # 兼容新增的引用方式
     create_time = db.Column(db.DateTime, default=datetime.utcnow)
     update_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -103,10 +122,51 @@ class Influencer(db.Model):
     materials = relationship('Material', backref='influencer', lazy=True, cascade='all, delete-orphan')
     promotions = relationship('PromotionData', backref='influencer', lazy=True)
     tags = relationship('InfluencerTag', secondary='influencer_tag_association', back_populates='influencers')
+    metrics = relationship('InfluencerMetrics', uselist=False, lazy=True, cascade='all, delete-orphan')
+    score = relationship('InfluencerScore', uselist=False, lazy=True, cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Influencer {self.name}>'
 
+# 达人指标表
+class InfluencerMetrics(db.Model):
+    """定时批量计算的达人指标，列表与详情页直接读取用于排序和筛选"""
+    __tablename__ = 'influencer_metrics'
+    
+    influencer_id = db.Column(db.Integer, db.ForeignKey('influencers.id', ondelete='CASCADE'), primary_key=True)
+    material_count = db.Column(db.Integer, nullable=False, default=0)
+    total_plays = db.Column(db.BigInteger, nullable=False, default=0)
+    total_engagements = db.Column(db.BigInteger, nullable=False, default=0)  # 点赞+评论+分享
+    engagement_rate = db.Column(db.Float, index=True)  # 互动数/播放量，没有播放时为空
+    play_growth_7d = db.Column(db.Float, index=True)  # 近7天播放量增长率
+    play_growth_30d = db.Column(db.Float)  # 近30天播放量增长率
+    level_percentile = db.Column(db.Float)  # 互动率在同等级达人中的百分位（0-1）
+    update_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # 计算时间
+    
+    def __repr__(self):
+        return f'<InfluencerMetrics {self.influencer_id}>'
+
+# 达人综合评分表
+class InfluencerScore(db.Model):
+    """达人综合评分，由互动率、花费加权ROI、转化率与最近投放时间加权得到，按数据变化增量更新"""
+    __tablename__ = 'influencer_scores'
+    
+    influencer_id = db.Column(db.Integer, db.ForeignKey('influencers.id', ondelete='CASCADE'), primary_key=True)
+    score = db.Column(db.Float, nullable=False, default=0, index=True)  # 0-100
+    engagement_score = db.Column(db.Float)  # 各项得分（0-1）
+    roi_score = db.Column(db.Float)
+    conversion_score = db.Column(db.Float)
+    recency_score = db.Column(db.Float)
+    engagement_rate = db.Column(db.Float)
+    roi = db.Column(db.Float)  # 花费加权ROI：(总销售额-总花费)/总花费
+    conversion_rate = db.Column(db.Float)  # 总转化量/总点击量
+    total_cost = db.Column(db.Numeric(14, 2), default=0)
+    last_promotion_date = db.Column(db.Date)
+    update_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # 计算时间
+    
+    def __repr__(self):
+        return f'<InfluencerScore {self.influencer_id} {self.score}>'
+
 # 素材标签表
 class MaterialTag(db.Model):
     """素材标签表，用于存储素材的各种标签"""
@@ -114,10 +174,21 @@ class MaterialTag(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
+    usage_counter = db.Column(db.Integer, default=0, nullable=False)  # 冗余的使用次数计数器
     create_time = db.Column(db.DateTime, default=datetime.utcnow)
     
     # 关系
     materials = relationship('Material', secondary='material_tag_association', back_populates='tags')
+    
+    @property
+    def usage_count(self):
+        """获取标签使用次数（直接统计关联表，不加载素材列表）"""
+        return db.session.query(func.count(material_tag_association.c.material_id)).filter(
+            material_tag_association.c.tag_id == self.id
+        ).scalar()
+    
+    def __repr__(self):
+        return f'<MaterialTag {self.name}>'
 
 # 素材-标签关联表（多对多关系）
 material_tag_association = db.Table('material_tag_association',
@@ -142,25 +213,44 @@ class Material(db.Model):
     share_count = db.Column(db.Integer, default=0)  # 新增分享量
     publish_time = db.Column(db.DateTime)  # 新增发布时间
     created_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
-    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # 兼容新增的引用方式
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True,
+                           default=_copy_parameter('created_by_id'))  # 兼容新增的引用方式
     create_time = db.Column(db.DateTime, default=datetime.utcnow)
-    update_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    update_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # 关系
     tags = relationship('MaterialTag', secondary='material_tag_association', back_populates='materials')
     promotion_data = relationship('PromotionData', backref='material', lazy=True, cascade='all, delete-orphan')
     promotions = relationship('PromotionData', backref='material_ref', lazy=True)  # 兼容新增的引用方式
+    # 归档数据由数据库级联删除，删除素材时不逐行加载
+    archives = relationship('PromotionArchive', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
     
     def __repr__(self):
         return f'<Material {self.material_id}>'
 
+# 素材互动数据快照表
+class MaterialStatSnapshot(db.Model):
+    """素材播放、点赞、评论、分享数的历史快照，只追加；数值未变化时不写入"""
+    __tablename__ = 'material_stat_snapshots'
+    
+    # (素材, 采集时间) 作为主键，按素材查询时间范围时直接使用主键索引
+    material_id = db.Column(db.Integer, db.ForeignKey('materials.id', ondelete='CASCADE'), primary_key=True)
+    captured_at = db.Column(db.DateTime, primary_key=True)
+    play_count = db.Column(db.BigInteger, nullable=False, default=0)
+    like_count = db.Column(db.Integer, nullable=False, default=0)
+    comment_count = db.Column(db.Integer, nullable=False, default=0)
+    share_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<MaterialStatSnapshot {self.material_id} {self.captured_at}>'
+
 # 推广数据表
 class PromotionData(db.Model):
     """推广数据表，存储每个素材的推广数据"""
     __tablename__ = 'promotion_data'
     
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(200), nullable=False)  # 新增推广名称
+    name = db.Column(db.String(200), nullable=False, default=_promotion_name)  # 新增推广名称
     influencer_id = db.Column(db.Integer, db.ForeignKey('influencers.id'))  # 新增达人关联
     material_id = db.Column(db.Integer, db.ForeignKey('materials.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
@@ -169,13 +259,15 @@ class PromotionData(db.Model):
     conversion_count = db.Column(db.Integer, default=0)  # 新增转化量
     cost = db.Column(db.Numeric(10, 2), nullable=False)
     sales_amount = db.Column(db.Numeric(10, 2), nullable=False)
-    revenue = db.Column(db.Numeric(10, 2), nullable=False)  # 新增收入字段（与sales_amount保持一致）
+    revenue = db.Column(db.Numeric(10, 2), nullable=False,
+                        default=_copy_parameter('sales_amount'))  # 新增收入字段（与sales_amount保持一致）
     roi = db.Column(db.Numeric(6, 2), nullable=True)
     notes = db.Column(db.Text)  # 新增备注
     created_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
-    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # 兼容新增的引用方式
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True,
+                           default=_copy_parameter('created_by_id'))  # 兼容新增的引用方式
     create_time = db.Column(db.DateTime, default=datetime.utcnow)
-    update_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    update_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # 唯一约束
     __table_args__ = (db.UniqueConstraint('material_id', 'date', name='_material_date_uc'),)
@@ -209,21 +301,167 @@ class PromotionData(db.Model):
             return float(self.sales_amount / self.cost)
         return 0
     
-    # 设置revenue时同步更新sales_amount
-    @revenue.setter
-    def revenue(self, value):
-        self.sales_amount = value
+    def __repr__(self):
+        return f'<PromotionData {self.name or "推广数据"}>'
+
+# 推广数据归档表
+class PromotionArchive(db.Model):
+    """超过保留期的每日推广数据按周或按月汇总后的归档数据"""
+    __tablename__ = 'promotion_data_archive'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    material_id = db.Column(db.Integer, db.ForeignKey('materials.id', ondelete='CASCADE'), nullable=False)
+    influencer_id = db.Column(db.Integer, db.ForeignKey('influencers.id'))
+    period = db.Column(db.String(10), nullable=False)  # week/month
+    period_start = db.Column(db.Date, nullable=False, index=True)  # 汇总周期的第一天
+    period_end = db.Column(db.Date, nullable=False)  # 汇总周期的最后一天
+    day_count = db.Column(db.Integer, default=0)  # 汇总的每日数据条数
+    exposure_count = db.Column(db.Integer, default=0)
+    click_count = db.Column(db.Integer, default=0)
+    conversion_count = db.Column(db.Integer, default=0)
+    cost = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    sales_amount = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    created_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    create_time = db.Column(db.DateTime, default=datetime.utcnow)
+    update_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # 获取revenue时返回sales_amount
-    @revenue.getter
-    def revenue(self):
-        return self.sales_amount
+    __table_args__ = (db.UniqueConstraint('material_id', 'period', 'period_start', name='_material_period_uc'),)
+    
+    @property
+    def roi(self):
+        if self.cost and self.cost > 0:
+            return (self.sales_amount - self.cost) / self.cost
+        return None
     
     def __repr__(self):
-        return f'<PromotionData {self.name or "推广数据"}>'
+        return f'<PromotionArchive {self.material_id} {self.period} {self.period_start}>'
+
+# 素材推广数据预测表
+class MaterialForecast(db.Model):
+    """素材未来7天每天的花费与销售额预测及预测区间，每晚整批重新计算"""
+    __tablename__ = 'material_forecasts'
+    
+    material_id = db.Column(db.Integer, db.ForeignKey('materials.id', ondelete='CASCADE'), primary_key=True)
+    forecast_date = db.Column(db.Date, primary_key=True)
+    cost = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    cost_lower = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    cost_upper = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    sales_amount = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    sales_lower = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    sales_upper = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    update_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # 计算时间
+    
+    def __repr__(self):
+        return f'<MaterialForecast {self.material_id} {self.forecast_date}>'
+
+# 后台任务表
+class BackgroundJob(db.Model):
+    """后台任务队列，记录任务参数、状态与进度"""
+    __tablename__ = 'background_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued/running/succeeded/failed
+    params = db.Column(db.JSON, nullable=False, default=dict)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    total_count = db.Column(db.Integer, default=0)  # 需要处理的对象数（如素材数）
+    processed_count = db.Column(db.Integer, default=0)  # 已处理的对象数
+    fetched_count = db.Column(db.Integer, default=0)  # 从API获取的记录数
+    saved_count = db.Column(db.Integer, default=0)  # 写入数据库的记录数
+    attempts = db.Column(db.Integer, default=0)
+    worker = db.Column(db.String(100))
+    created_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    create_time = db.Column(db.DateTime, default=datetime.utcnow)
+    start_time = db.Column(db.DateTime)
+    finish_time = db.Column(db.DateTime)
+    heartbeat_time = db.Column(db.DateTime)  # 执行中的任务定期更新，用于回收中断的任务
+    
+    @property
+    def is_finished(self):
+        return self.status in ('succeeded', 'failed')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'total_count': self.total_count,
+            'processed_count': self.processed_count,
+            'fetched_count': self.fetched_count,
+            'saved_count': self.saved_count,
+            'result': self.result,
+            'error': self.error,
+            'create_time': self.create_time.isoformat() if self.create_time else None,
+            'start_time': self.start_time.isoformat() if self.start_time else None,
+            'finish_time': self.finish_time.isoformat() if self.finish_time else None,
+        }
+    
+    def __repr__(self):
+        return f'<BackgroundJob {self.id} {self.job_type} {self.status}>'
+
+# 定时任务执行记录表
+class JobRun(db.Model):
+    """定时任务每次执行的记录"""
+    __tablename__ = 'job_runs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(100), nullable=False, index=True)  # 调度器中的任务ID
+    job_name = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='running')  # running/succeeded/failed/missed
+    scheduled_time = db.Column(db.DateTime)  # 计划执行时间
+    start_time = db.Column(db.DateTime, index=True)
+    end_time = db.Column(db.DateTime)
+    duration_seconds = db.Column(db.Float)
+    rows_processed = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    
+    @property
+    def delay_seconds(self):
+        """实际开始时间相对计划时间的延迟（补跑时较大）"""
+        if self.scheduled_time and self.start_time:
+            return (self.start_time - self.scheduled_time).total_seconds()
+        return None
+    
+    def __repr__(self):
+        return f'<JobRun {self.job_id} {self.status}>'
+
+# 推送数据批次表
+class IngestBatch(db.Model):
+    """推送接口接收的数据批次，按批次ID保证重复推送只写入一次"""
+    __tablename__ = 'ingest_batches'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.String(100), nullable=False, unique=True)  # 推送方生成的批次ID
+    status = db.Column(db.String(20), nullable=False, default='processing')  # processing/completed/failed
+    row_count = db.Column(db.Integer, default=0)  # 解析的行数
+    upserted_count = db.Column(db.Integer, default=0)  # 写入的行数
+    rejected_count = db.Column(db.Integer, default=0)  # 格式错误或素材不存在的行数
+    summary = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    created_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    create_time = db.Column(db.DateTime, default=datetime.utcnow)
+    finish_time = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<IngestBatch {self.batch_id} {self.status}>'
+
+# 共享数据版本号表
+class DataVersion(db.Model):
+    """多个进程共享的数据版本号，写入方在同一事务中增加，读取方据此判断进程内缓存是否过期"""
+    __tablename__ = 'data_versions'
+    
+    name = db.Column(db.String(100), primary_key=True)  # 如 tags:influencer
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    update_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<DataVersion {self.name} {self.version}>'
 
 # 别名，保持兼容性
 Promotion = PromotionData
 
 # 导出所有模型
-__all__ = ['db', 'User', 'Influencer', 'Material', 'PromotionData', 'Promotion', 'MaterialTag', 'InfluencerTag']
\ No newline at end of file
+__all__ = ['db', 'User', 'Influencer', 'Material', 'PromotionData', 'Promotion', 'MaterialTag', 'InfluencerTag',
+           'BackgroundJob', 'JobRun', 'IngestBatch', 'PromotionArchive',
+           'MaterialStatSnapshot', 'InfluencerMetrics', 'InfluencerScore', 'MaterialForecast', 'DataVersion']
\ No newline at end of file
@@ -0,0 +1,281 @@
+"""
+投放预算分配
+按素材的历史花费与销售额拟合边际收益递减的响应曲线 sales = a * cost^b（0 < b < 1），
+在总预算与约束下最大化预期销售额。
+
+拟合：对每个素材在对数空间做最小二乘（ln sales = ln a + b * ln cost），
+所有素材的回归系数通过 np.bincount 分组求和一次算出；数据点不足时弹性取默认值。
+
+分配：最优解处每个素材的边际收益 a*b*x^(b-1) 相等（拉格朗日乘子λ），
+对λ做二分即可满足总预算。达人花费上限使该达人的素材使用更高的乘子 max(λ, λ_g)，
+λ_g 与总预算无关，对全部达人同时二分预先求出。计算全部向量化，数千个素材在毫秒级完成
+"""
+
+from datetime import date, timedelta
+from sqlalchemy import select
+from app import db
+from app.models import Material, PromotionData
+
+# 数据点不足或花费没有变化时使用的默认弹性
+DEFAULT_ELASTICITY = 0.5
+
+# 弹性的取值范围，保证收益递减且曲线不退化为常数
+MIN_ELASTICITY = 0.05
+MAX_ELASTICITY = 0.95
+
+# 拟合曲线所需的最少数据点（同时有花费和销售额的天数）
+MIN_POINTS = 3
+
+# 默认使用的历史天数
+LOOKBACK_DAYS = 90
+
+# 二分迭代次数（对数空间，精度远高于分）
+BISECTION_STEPS = 60
+
+# 剔除低于最低花费的素材后重新分配的最多轮数
+MAX_PRUNE_ROUNDS = 20
+
+class BudgetError(ValueError):
+    """预算参数无效或没有可分配的素材"""
+
+def fit_response_curves(index, cost, sales, count):
+    """
+    按素材分组拟合响应曲线
+
+    Args:
+        index: 每条数据所属素材的序号（0..count-1）
+        cost: 每条数据的花费
+        sales: 每条数据的销售额
+        count: 素材数
+
+    Returns:
+        tuple: (系数a数组, 弹性b数组, 拟合使用的数据点数数组)
+    """
+    import numpy as np
+
+    index = np.asarray(index, dtype='int64')
+    cost = np.asarray(cost, dtype='float64')
+    sales = np.asarray(sales, dtype='float64')
+
+    # 只有花费时按平均花费与平均销售额估计系数
+    spent = cost > 0
+    days = np.bincount(index[spent], minlength=count).astype('float64')
+    total_cost = np.bincount(index[spent], weights=cost[spent], minlength=count)
+    total_sales = np.bincount(index[spent], weights=sales[spent], minlength=count)
+
+    valid = spent & (sales > 0)
+    x, y, group = np.log(cost[valid]), np.log(sales[valid]), index[valid]
+    n = np.bincount(group, minlength=count).astype('float64')
+    sx = np.bincount(group, weights=x, minlength=count)
+    sy = np.bincount(group, weights=y, minlength=count)
+    sxx = np.bincount(group, weights=x * x, minlength=count)
+    sxy = np.bincount(group, weights=x * y, minlength=count)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = sxx - sx * sx / n
+        covariance = sxy - sx * sy / n
+        fitted = (n >= MIN_POINTS) & (variance > 1e-9)
+        elasticity = np.clip(np.where(fitted, covariance / variance, DEFAULT_ELASTICITY),
+                             MIN_ELASTICITY, MAX_ELASTICITY)
+        scale = np.where(
+            fitted,
+            np.exp((sy - elasticity * sx) / n),
+            np.where(days > 0, (total_sales / days) / (total_cost / days) ** elasticity, 0.0),
+        )
+    return np.nan_to_num(scale, nan=0.0), elasticity, n.astype('int64')
+
+def _spend(log_lambda, log_marginal, exponent, budget):
+    """乘子为λ时每个素材的花费：a*b*x^(b-1) = λ => x = (λ / (a*b))^(1/(b-1))"""
+    import numpy as np
+
+    return np.exp(np.minimum((log_lambda - log_marginal) * exponent, np.log(budget)))
+
+def _group_multipliers(groups, caps, log_marginal, exponent, budget, low, high):
+    """
+    每个有花费上限的分组刚好达到上限时的乘子（对数），没有上限的分组为low
+
+    对全部分组同时二分：分组花费随乘子增大而减少
+    """
+    import numpy as np
+
+    group_count = len(caps)
+    lower = np.full(group_count, low)
+    upper = np.full(group_count, high)
+    capped = np.isfinite(caps)
+    for _ in range(BISECTION_STEPS):
+        middle = (lower + upper) / 2
+        totals = np.bincount(groups, weights=_spend(middle[groups], log_marginal, exponent, budget),
+                             minlength=group_count)
+        over = totals > caps
+        lower = np.where(over, middle, lower)
+        upper = np.where(over, upper, middle)
+    # 上限内已能满足的分组不需要额外的乘子
+    unconstrained = ~capped | (np.bincount(groups, weights=_spend(low, log_marginal, exponent, budget),
+                                           minlength=group_count) <= caps)
+    return np.where(unconstrained, low, upper)
+
+def allocate(scale, elasticity, budget, groups=None, group_caps=None):
+    """
+    在总预算与分组上限下分配花费
+
+    Args:
+        scale: 系数a数组（为0的素材不分配）
+        elasticity: 弹性b数组
+        budget: 总预算
+        groups: 每个素材所属分组的序号（可选）
+        group_caps: 每个分组的花费上限，无上限为inf（可选）
+
+    Returns:
+        ndarray: 每个素材的花费；分组上限之和小于预算时总花费小于预算
+    """
+    import numpy as np
+
+    scale = np.asarray(scale, dtype='float64')
+    elasticity = np.asarray(elasticity, dtype='float64')
+    allocation = np.zeros(len(scale))
+    active = scale > 0
+    if not active.any():
+        return allocation
+
+    log_marginal = np.log(scale[active] * elasticity[active])
+    exponent = 1 / (elasticity[active] - 1)
+    # 乘子的搜索范围：从单个素材花完全部预算时的边际收益，到每个素材只花极少预算时的边际收益
+    low = float(np.min(log_marginal + (elasticity[active] - 1) * np.log(budget))) - 1
+    high = float(np.max(log_marginal + (elasticity[active] - 1) * np.log(budget * 1e-9))) + 1
+
+    if groups is not None and group_caps is not None:
+        groups = np.asarray(groups, dtype='int64')[active]
+        floor = _group_multipliers(groups, np.asarray(group_caps, dtype='float64'),
+                                   log_marginal, exponent, budget, low, high)[groups]
+    else:
+        floor = np.full(len(log_marginal), low)
+
+    def spend(log_lambda):
+        return _spend(np.maximum(log_lambda, floor), log_marginal, exponent, budget)
+
+    if spend(low).sum() <= budget:
+        # 分组上限限制了总花费
+        allocation[active] = spend(low)
+        return allocation
+
+    lower, upper = low, high
+    for _ in range(BISECTION_STEPS):
+        middle = (lower + upper) / 2
+        if spend(middle).sum() > budget:
+            lower = middle
+        else:
+            upper = middle
+    allocation[active] = spend(upper)
+    return allocation
+
+def allocate_with_minimum(scale, elasticity, budget, groups=None, group_caps=None, min_spend=0):
+    """
+    分配花费，分到的花费低于 min_spend 的素材不投放，其预算重新分配给其他素材
+
+    Returns:
+        ndarray: 每个素材的花费
+    """
+    import numpy as np
+
+    scale = np.array(scale, dtype='float64')
+    allocation = allocate(scale, elasticity, budget, groups, group_caps)
+    for _ in range(MAX_PRUNE_ROUNDS):
+        below = (allocation > 0) & (allocation < min_spend)
+        if not min_spend or not below.any():
+            break
+        scale[below] = 0
+        allocation = allocate(scale, elasticity, budget, groups, group_caps)
+    return allocation
+
+def load_history(lookback_days=LOOKBACK_DAYS, material_ids=None, today=None):
+    """
+    读取最近 lookback_days 天有花费的推广数据
+
+    Returns:
+        tuple: (素材ID数组, 达人ID数组, 每条数据的素材序号, 花费数组, 销售额数组)
+    """
+    import numpy as np
+
+    since = (today or date.today()) - timedelta(days=lookback_days)
+    statement = select(PromotionData.material_id, Material.influencer_id, PromotionData.cost,
+                       PromotionData.sales_amount) \
+        .join(Material, Material.id == PromotionData.material_id) \
+        .where(PromotionData.date >= since, PromotionData.cost > 0)
+    if material_ids is not None:
+        statement = statement.where(PromotionData.material_id.in_(material_ids))
+    rows = db.session.execute(statement).all()
+
+    material_column = np.array([row[0] for row in rows], dtype='int64')
+    material_keys, index = np.unique(material_column, return_inverse=True)
+    influencers = np.zeros(len(material_keys), dtype='int64')
+    influencers[index] = [row[1] or 0 for row in rows]
+    cost = np.array([float(row[2] or 0) for row in rows], dtype='float64')
+    sales = np.array([float(row[3] or 0) for row in rows], dtype='float64')
+    return material_keys, influencers, index, cost, sales
+
+def optimize_budget(budget, influencer_caps=None, default_influencer_cap=None, min_spend=0,
+                    material_ids=None, lookback_days=LOOKBACK_DAYS):
+    """
+    根据推广数据历史计算预算分配方案
+
+    Args:
+        budget: 总预算
+        influencer_caps: {达人ID: 花费上限}（可选）
+        default_influencer_cap: 未单独指定的达人的花费上限（可选）
+        min_spend: 单个素材的最低花费，低于该值的素材不投放
+        material_ids: 只在这些素材中分配（可选）
+        lookback_days: 拟合使用的历史天数
+
+    Returns:
+        dict: 汇总与按花费从高到低排序的素材分配
+
+    Raises:
+        BudgetError: 参数无效或没有历史数据
+    """
+    import numpy as np
+
+    if budget is None or budget <= 0:
+        raise BudgetError('总预算必须大于0')
+    if lookback_days <= 0:
+        raise BudgetError('历史天数必须大于0')
+    if min_spend < 0 or min_spend > budget:
+        raise BudgetError('最低花费必须在0与总预算之间')
+    influencer_caps = influencer_caps or {}
+    if any(cap < 0 for cap in influencer_caps.values()) or (default_influencer_cap or 0) < 0:
+        raise BudgetError('达人花费上限不能为负数')
+
+    materials, influencers, index, cost, sales = load_history(lookback_days, material_ids)
+    if not len(materials):
+        raise BudgetError(f'最近 {lookback_days} 天没有可用于拟合的推广数据')
+
+    scale, elasticity, points = fit_response_curves(index, cost, sales, len(materials))
+    influencer_keys, groups = np.unique(influencers, return_inverse=True)
+    default_cap = np.inf if default_influencer_cap is None else float(default_influencer_cap)
+    caps = np.array([float(influencer_caps.get(int(key), default_cap)) for key in influencer_keys])
+    allocation = allocate_with_minimum(scale, elasticity, budget, groups, caps, min_spend)
+
+    expected = scale * allocation ** elasticity
+    with np.errstate(divide='ignore', invalid='ignore'):
+        marginal = np.where(allocation > 0, scale * elasticity * allocation ** (elasticity - 1), 0.0)
+    allocated = float(allocation.sum())
+    expected_sales = float(expected.sum())
+
+    order = np.argsort(-allocation)
+    order = order[allocation[order] > 0]
+    return {
+        'budget': round(float(budget), 2),
+        'allocated': round(allocated, 2),
+        'unallocated': round(float(budget) - allocated, 2),
+        'expected_sales': round(expected_sales, 2),
+        'expected_roi': round((expected_sales - allocated) / allocated, 4) if allocated > 0 else None,
+        'material_count': len(materials),
+        'items': [{
+            'material_id': int(materials[i]),
+            'influencer_id': int(influencers[i]) or None,
+            'cost': round(float(allocation[i]), 2),
+            'expected_sales': round(float(expected[i]), 2),
+            'marginal_return': round(float(marginal[i]), 4),
+            'elasticity': round(float(elasticity[i]), 4),
+            'data_points': int(points[i]),
+        } for i in order],
+    }
@@ -0,0 +1,256 @@
+"""
+推广数据分层压缩
+超过保留期的每日推广数据按周或按月汇总到 promotion_data_archive 表，
+原始数据先写入本地zstd压缩的Parquet文件，再从 promotion_data 中删除。
+每个汇总周期在一个事务中处理，失败时回滚并删除本次写入的Parquet文件
+"""
+
+import os
+from datetime import date, datetime, timedelta
+from sqlalchemy import Date, DateTime, Integer, Numeric, delete, func, select
+from app import db
+from app.models import Material, PromotionArchive, PromotionData
+from app.utils.db_pool import disable_statement_timeout
+from app.utils.partitions import add_months
+import logging
+
+# 创建日志记录器
+logger = logging.getLogger(__name__)
+
+# 支持的汇总周期
+PERIODS = ('week', 'month')
+
+# 每次读取的素材主键范围，限制单个周期处理时的内存占用
+MATERIAL_CHUNK_SIZE = 2000
+
+# 每条删除语句包含的主键数
+DELETE_CHUNK_SIZE = 1000
+
+# 写入Parquet文件的原始数据字段：promotion_data 的全部列，文件可以直接导回原表
+RAW_COLUMNS = tuple(column.name for column in PromotionData.__table__.columns)
+
+class CompactionError(RuntimeError):
+    """压缩配置无效或缺少依赖"""
+
+def period_start(day, period):
+    """day所在汇总周期的第一天（周一或每月1日）"""
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+def next_period(start, period):
+    if period == 'week':
+        return start + timedelta(days=7)
+    return add_months(start, 1)
+
+def compaction_cutoff(retention_days, period, today=None):
+    """
+    压缩截止日期（不含）
+    保留最近 retention_days 天的每日数据，并向前取整到周期的第一天，只压缩完整的周期
+    """
+    today = today or date.today()
+    return period_start(today - timedelta(days=retention_days), period)
+
+def _arrow_type(column_type):
+    """数据库列类型对应的Parquet类型"""
+    import pyarrow as pa
+
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, Numeric):
+        return pa.decimal128(column_type.precision, column_type.scale)
+    if isinstance(column_type, DateTime):
+        return pa.timestamp('us')
+    if isinstance(column_type, Date):
+        return pa.date32()
+    return pa.string()
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    table = PromotionData.__table__
+    return pa.schema([(name, _arrow_type(table.c[name].type)) for name in RAW_COLUMNS])
+
+def _material_ranges(start, end):
+    """周期内有数据的素材主键范围，按MATERIAL_CHUNK_SIZE分段"""
+    low, high = db.session.query(func.min(PromotionData.material_id), func.max(PromotionData.material_id)) \
+        .filter(PromotionData.date >= start, PromotionData.date < end).one()
+    if low is None:
+        return
+    for first in range(low, high + 1, MATERIAL_CHUNK_SIZE):
+        yield first, first + MATERIAL_CHUNK_SIZE
+
+def _archive_chunk(rows, start, end, period):
+    """将一段素材的每日数据汇总并合并到归档表（补录的旧数据累加到已有的汇总行）"""
+    summaries = {}
+    for row in rows:
+        summary = summaries.setdefault(row['material_id'], {
+            'influencer_id': row['material_influencer_id'], 'day_count': 0, 'exposure_count': 0,
+            'click_count': 0, 'conversion_count': 0, 'cost': 0, 'sales_amount': 0,
+        })
+        summary['day_count'] += 1
+        summary['exposure_count'] += row['exposure_count'] or 0
+        summary['click_count'] += row['click_count'] or 0
+        summary['conversion_count'] += row['conversion_count'] or 0
+        summary['cost'] += row['cost'] or 0
+        summary['sales_amount'] += row['sales_amount'] or 0
+        # 汇总行归属周期内最后一条数据的创建者
+        summary['created_by_id'] = row['created_by_id']
+
+    existing = {
+        archive.material_id: archive for archive in PromotionArchive.query.filter(
+            PromotionArchive.period == period,
+            PromotionArchive.period_start == start,
+            PromotionArchive.material_id.in_(list(summaries))
+        )
+    }
+    new_rows = []
+    for material_id, summary in summaries.items():
+        archive = existing.get(material_id)
+        if archive is None:
+            new_rows.append(dict(summary, material_id=material_id, period=period, period_start=start,
+                                 period_end=end - timedelta(days=1)))
+            continue
+        for column in ('day_count', 'exposure_count', 'click_count', 'conversion_count', 'cost', 'sales_amount'):
+            setattr(archive, column, (getattr(archive, column) or 0) + summary[column])
+        archive.created_by_id = summary['created_by_id']
+    if new_rows:
+        now = datetime.utcnow()
+        for item in new_rows:
+            item.update(create_time=now, update_time=now)
+        db.session.execute(PromotionArchive.__table__.insert(), new_rows)
+
+def compact_period(start, period, archive_dir):
+    """
+    压缩一个周期的每日数据
+
+    Args:
+        start: 周期的第一天
+        period: week 或 month
+        archive_dir: Parquet文件目录
+
+    Returns:
+        tuple: (压缩的行数, Parquet文件路径)
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    end = next_period(start, period)
+    table = PromotionData.__table__
+    # 素材已被删除的孤立数据也要压缩，否则会一直留在每日数据中
+    columns = [table.c[name] for name in RAW_COLUMNS] + [
+        func.coalesce(Material.influencer_id, table.c.influencer_id).label('material_influencer_id')
+    ]
+
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f'promotion_data_{period}_{start:%Y%m%d}_{datetime.utcnow():%Y%m%d%H%M%S}.parquet')
+    schema = _parquet_schema()
+    count = 0
+    writer = None
+    try:
+        disable_statement_timeout(db.session.connection())
+        for low, high in _material_ranges(start, end):
+            rows = [row._asdict() for row in db.session.execute(
+                select(*columns).outerjoin(Material, Material.id == table.c.material_id)
+                .where(table.c.date >= start, table.c.date < end,
+                       table.c.material_id >= low, table.c.material_id < high)
+                .order_by(table.c.material_id, table.c.date)
+            )]
+            if not rows:
+                continue
+
+            # 先写入原始数据，再汇总并删除
+            if writer is None:
+                writer = pq.ParquetWriter(path, schema, compression='zstd')
+            writer.write_table(pa.Table.from_pylist(
+                [{name: row[name] for name in RAW_COLUMNS} for row in rows], schema=schema
+            ))
+            _archive_chunk(rows, start, end, period)
+            ids = [row['id'] for row in rows]
+            for offset in range(0, len(ids), DELETE_CHUNK_SIZE):
+                db.session.execute(delete(table).where(
+                    table.c.date >= start, table.c.date < end,
+                    table.c.id.in_(ids[offset:offset + DELETE_CHUNK_SIZE])
+                ))
+            count += len(rows)
+
+        if writer is not None:
+            writer.close()
+            writer = None
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        if writer is not None:
+            writer.close()
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return count, path if count else None
+
+def compact_promotion_data(retention_days, period='month', archive_dir='archive', before=None):
+    """
+    压缩截止日期之前的全部每日数据
+
+    Args:
+        retention_days: 保留每日数据的天数
+        period: 汇总周期，week 或 month
+        archive_dir: Parquet文件目录
+        before: 指定截止日期（可选，向前取整到周期的第一天）
+
+    Returns:
+        dict: 压缩的周期数、行数与生成的文件
+    """
+    if period not in PERIODS:
+        raise CompactionError(f'汇总周期只能是 {" / ".join(PERIODS)}')
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise CompactionError('压缩推广数据需要安装pyarrow')
+
+    cutoff = period_start(before, period) if before else compaction_cutoff(retention_days, period)
+    result = {'cutoff': cutoff.isoformat(), 'periods': 0, 'rows': 0, 'files': []}
+    floor = None
+    while True:
+        # 每次从尚未处理的最早数据开始，跳过没有数据的周期；已处理的周期不再重复
+        query = db.session.query(func.min(PromotionData.date)).filter(PromotionData.date < cutoff)
+        if floor is not None:
+            query = query.filter(PromotionData.date >= floor)
+        first = query.scalar()
+        if first is None:
+            break
+        start = period_start(first, period)
+        floor = next_period(start, period)
+        count, path = compact_period(start, period, archive_dir)
+        result['periods'] += 1
+        result['rows'] += count
+        if path:
+            result['files'].append(path)
+        logger.info(f"已压缩 {start} 开始的{'周' if period == 'week' else '月'}推广数据 {count} 条")
+    return result
+
+def init_compaction(app):
+    """
+    注册压缩命令
+
+    Args:
+        app: Flask应用实例
+    """
+    import click
+
+    @app.cli.command('compact-promotion-data')
+    @click.option('--before', default=None, help='压缩该日期之前的数据（YYYY-MM-DD），默认按保留天数计算')
+    def compact_promotion_data_command(before):
+        """将超过保留期的每日推广数据汇总到归档表"""
+        retention_days = app.config.get('PROMOTION_RETENTION_DAYS', 0)
+        if not before and not retention_days:
+            raise click.ClickException('未配置PROMOTION_RETENTION_DAYS，请通过--before指定截止日期')
+        try:
+            result = compact_promotion_data(
+                retention_days,
+                period=app.config.get('PROMOTION_ARCHIVE_PERIOD', 'month'),
+                archive_dir=app.config.get('PROMOTION_ARCHIVE_DIR', 'archive'),
+                before=datetime.strptime(before, '%Y-%m-%d').date() if before else None,
+            )
+        except (CompactionError, ValueError) as e:
+            raise click.ClickException(str(e))
+        click.echo(f"截止 {result['cutoff']}：压缩 {result['periods']} 个周期，{result['rows']} 条每日数据")
@@ -0,0 +1,61 @@
+"""
+共享数据版本号
+gunicorn的多个worker、后台任务worker与调度器各自维护进程内缓存（如标签位图索引），
+通过 data_versions 表共享版本号：写入方在写入数据的同一事务中增加版本号，
+读取方比较版本号判断本进程的缓存是否已过期
+"""
+
+from datetime import datetime
+from sqlalchemy import select
+from app import db
+from app.models import DataVersion
+
+def _upsert_statement(dialect_name):
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(DataVersion.__table__)
+
+def bump_versions(connection, names):
+    """
+    在connection当前的事务中增加版本号（不存在时创建）
+    版本号行的锁持有到事务结束，提交顺序与版本号顺序一致
+
+    Args:
+        connection: 写入数据所用的连接（如 session.connection()）
+        names: 版本号名称
+
+    Returns:
+        dict: {名称: 增加后的版本号}
+    """
+    names = sorted(set(names))
+    if not names:
+        return {}
+    table = DataVersion.__table__
+    now = datetime.utcnow()
+    statement = _upsert_statement(connection.dialect.name).values(
+        [{'name': name, 'version': 1, 'update_time': now} for name in names]
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=['name'],
+        set_={'version': table.c.version + 1, 'update_time': now},
+    ).returning(table.c.name, table.c.version)
+    return dict(connection.execute(statement).all())
+
+def read_versions(names, connection=None):
+    """
+    读取已提交的版本号，没有记录的名称为0
+    默认使用主库的独立连接，不受副本延迟与当前会话事务的影响
+
+    Returns:
+        dict: {名称: 版本号}
+    """
+    names = list(names)
+    statement = select(DataVersion.name, DataVersion.version).where(DataVersion.name.in_(names))
+    if connection is None:
+        with db.engine.connect() as connection:
+            rows = dict(connection.execute(statement).all())
+    else:
+        rows = dict(connection.execute(statement).all())
+    return {name: rows.get(name, 0) for name in names}
@@ -0,0 +1,166 @@
+"""
+数据库连接池配置与监控
+从环境变量构建SQLALCHEMY_ENGINE_OPTIONS，并统计连接池的等待时间与占用情况
+"""
+
+import os
+import threading
+import time
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+# 等待时间直方图的桶上界（秒）
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float('inf'))
+
+class PoolMetrics:
+    """单个连接池的累计统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.wait_buckets = [0] * len(WAIT_BUCKETS)
+        self.in_use = 0
+        self.in_use_peak = 0
+
+    def record_checkout(self, wait_seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+            for index, bound in enumerate(WAIT_BUCKETS):
+                if wait_seconds <= bound:
+                    self.wait_buckets[index] += 1
+                    break
+            self.in_use += 1
+            self.in_use_peak = max(self.in_use_peak, self.in_use)
+
+    def record_timeout(self, wait_seconds):
+        with self._lock:
+            self.timeouts += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+    def record_checkin(self):
+        with self._lock:
+            self.in_use = max(self.in_use - 1, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_seconds_total': round(self.wait_seconds_total, 6),
+                'wait_seconds_avg': round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+                'wait_seconds_max': round(self.wait_seconds_max, 6),
+                'wait_buckets': {str(bound): count for bound, count in zip(WAIT_BUCKETS, self.wait_buckets)},
+                'in_use': self.in_use,
+                'in_use_peak': self.in_use_peak,
+            }
+
+class InstrumentedQueuePool(QueuePool):
+    """记录连接获取等待时间与占用数量的QueuePool"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record_timeout(time.perf_counter() - start)
+            raise
+        self.metrics.record_checkout(time.perf_counter() - start)
+        return connection
+
+    def _do_return_conn(self, record):
+        try:
+            super()._do_return_conn(record)
+        finally:
+            self.metrics.record_checkin()
+
+    def recreate(self):
+        # dispose()后重建连接池时保留累计统计
+        new_pool = super().recreate()
+        new_pool.metrics = self.metrics
+        return new_pool
+
+def _env_bool(name, default):
+    return os.getenv(name, default).lower() in ('true', '1', 't')
+
+def build_engine_options(database_uri):
+    """
+    根据环境变量构建引擎参数
+
+    环境变量：
+        DB_POOL_SIZE: 连接池常驻连接数
+        DB_MAX_OVERFLOW: 允许超出连接池大小的临时连接数
+        DB_POOL_TIMEOUT: 获取连接的最长等待秒数
+        DB_POOL_RECYCLE: 连接最长存活秒数，避免使用被服务端断开的连接
+        DB_POOL_PRE_PING: 取出连接前先检测是否可用
+        DB_STATEMENT_TIMEOUT: 语句超时毫秒数（仅PostgreSQL，0表示不限制）
+
+    Returns:
+        dict: SQLALCHEMY_ENGINE_OPTIONS
+    """
+    options = {
+        'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', 'True'),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+    }
+
+    # SQLite（尤其是内存库）使用SQLAlchemy默认的连接池策略
+    if database_uri.startswith('sqlite'):
+        return options
+
+    options.update({
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '10')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '20')),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '30')),
+    })
+
+    statement_timeout = int(os.getenv('DB_STATEMENT_TIMEOUT', '30000'))
+    if statement_timeout > 0 and database_uri.startswith('postgresql'):
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+
+    return options
+
+def disable_statement_timeout(connection):
+    """
+    取消当前事务的语句超时（DB_STATEMENT_TIMEOUT），事务结束后自动恢复
+    用于迁移、归档压缩等在一个事务中处理整表数据的批处理
+    """
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('SET LOCAL statement_timeout = 0'))
+
+def pool_stats(engines):
+    """
+    汇总各引擎连接池的状态
+
+    Args:
+        engines: {bind_key: Engine}，通常为db.engines
+
+    Returns:
+        dict: {bind名称: 连接池状态}
+    """
+    stats = {}
+    for bind_key, engine in engines.items():
+        pool = engine.pool
+        item = {'pool_class': type(pool).__name__, 'status': pool.status()}
+        if isinstance(pool, QueuePool):
+            item.update({
+                'size': pool.size(),
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow(),
+                'checked_in': pool.checkedin(),
+            })
+        metrics = getattr(pool, 'metrics', None)
+        if metrics is not None:
+            item.update(metrics.snapshot())
+        stats[bind_key or 'default'] = item
+    return stats
@@ -0,0 +1,143 @@
+"""
+素材互动数据同步与增长曲线
+定时任务通过抖音API批量获取素材的播放、点赞、评论、分享数，更新素材表中的当前值，
+并向 material_stat_snapshots 追加快照；与最近一次快照相同的数值不重复写入。
+增长曲线按天取每个素材当天最后一次快照，没有快照的日期沿用之前的数值
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, update
+from app import db
+from app.models import Material, MaterialStatSnapshot
+import logging
+
+# 创建日志记录器
+logger = logging.getLogger(__name__)
+
+# 互动数据字段
+COUNTERS = ('play_count', 'like_count', 'comment_count', 'share_count')
+
+# 每次调用批量接口的素材数
+SYNC_CHUNK_SIZE = 100
+
+# 每次查询快照的素材数
+QUERY_CHUNK_SIZE = 1000
+
+def latest_snapshots(material_ids, before=None):
+    """
+    查询素材最近一次快照的数值
+
+    Args:
+        material_ids: 素材主键ID列表
+        before: 只查询该时间之前的快照（可选）
+
+    Returns:
+        dict: {素材主键ID: (play_count, like_count, comment_count, share_count)}
+    """
+    latest = {}
+    for start in range(0, len(material_ids), QUERY_CHUNK_SIZE):
+        chunk = material_ids[start:start + QUERY_CHUNK_SIZE]
+        last = select(MaterialStatSnapshot.material_id, func.max(MaterialStatSnapshot.captured_at).label('captured_at')) \
+            .where(MaterialStatSnapshot.material_id.in_(chunk))
+        if before is not None:
+            last = last.where(MaterialStatSnapshot.captured_at < before)
+        last = last.group_by(MaterialStatSnapshot.material_id).subquery()
+        rows = db.session.query(MaterialStatSnapshot).join(
+            last, (MaterialStatSnapshot.material_id == last.c.material_id)
+            & (MaterialStatSnapshot.captured_at == last.c.captured_at)
+        )
+        latest.update((row.material_id, tuple(getattr(row, name) for name in COUNTERS)) for row in rows)
+    return latest
+
+def sync_material_stats(material_query=None, captured_at=None):
+    """
+    同步素材互动数据，每批素材在一个事务中批量写入快照并更新素材表
+
+    Args:
+        material_query: 需要同步的素材查询（默认全部素材）
+        captured_at: 快照时间（默认当前UTC时间）
+
+    Returns:
+        dict: 同步的素材数与写入的快照数
+    """
+    from app.api.client import douyin_client
+
+    captured_at = captured_at or datetime.utcnow()
+    query = material_query if material_query is not None else Material.query
+    materials = query.with_entities(Material.id, Material.material_id).order_by(Material.id).all()
+
+    result = {'materials': len(materials), 'snapshots': 0, 'failed': 0}
+    for start in range(0, len(materials), SYNC_CHUNK_SIZE):
+        chunk = materials[start:start + SYNC_CHUNK_SIZE]
+        ids_by_code = {code: pk for pk, code in chunk}
+        items = douyin_client.get_material_data(list(ids_by_code)) or []
+        if not items:
+            result['failed'] += len(chunk)
+            continue
+
+        latest = latest_snapshots([pk for pk, _ in chunk])
+        snapshots = []
+        for item in items:
+            pk = ids_by_code.get(str(item.get('material_id')))
+            if pk is None:
+                continue
+            values = tuple(int(item.get(name) or 0) for name in COUNTERS)
+            if latest.get(pk) == values:
+                continue
+            snapshots.append({'material_id': pk, 'captured_at': captured_at, **dict(zip(COUNTERS, values))})
+
+        if snapshots:
+            db.session.execute(MaterialStatSnapshot.__table__.insert(), snapshots)
+            # 按主键批量更新素材表中的当前值
+            db.session.execute(update(Material), [
+                {'id': row['material_id'], **{name: row[name] for name in COUNTERS}} for row in snapshots
+            ])
+        db.session.commit()
+        result['snapshots'] += len(snapshots)
+
+    logger.info(f"素材互动数据同步完成：{result['materials']} 个素材，写入 {result['snapshots']} 条快照")
+    return result
+
+def growth_curve(material_ids, start, end):
+    """
+    计算一组素材按天汇总的互动数据曲线
+
+    Args:
+        material_ids: 素材主键ID列表
+        start: 开始日期（含）
+        end: 结束日期（含）
+
+    Returns:
+        list: 每天一项，包含各互动数据的累计值与较前一天的增长量
+    """
+    begin = datetime.combine(start, datetime.min.time())
+    finish = datetime.combine(end + timedelta(days=1), datetime.min.time())
+
+    # 每个素材开始日期之前的最后一次快照作为初始值
+    current = latest_snapshots(material_ids, before=begin)
+    changes = {}
+    for chunk_start in range(0, len(material_ids), QUERY_CHUNK_SIZE):
+        chunk = material_ids[chunk_start:chunk_start + QUERY_CHUNK_SIZE]
+        rows = db.session.query(MaterialStatSnapshot.material_id, MaterialStatSnapshot.captured_at,
+                                *[getattr(MaterialStatSnapshot, name) for name in COUNTERS]) \
+            .filter(MaterialStatSnapshot.material_id.in_(chunk),
+                    MaterialStatSnapshot.captured_at >= begin,
+                    MaterialStatSnapshot.captured_at < finish) \
+            .order_by(MaterialStatSnapshot.captured_at)
+        for material_id, captured, *values in rows:
+            # 同一天多次快照时保留最后一次
+            changes.setdefault(captured.date(), {})[material_id] = tuple(values)
+
+    curve = []
+    previous = None
+    day = start
+    while day <= end:
+        current.update(changes.get(day, {}))
+        totals = [sum(values[index] for values in current.values()) for index in range(len(COUNTERS))]
+        point = {'date': day.isoformat(), **dict(zip(COUNTERS, totals))}
+        for index, name in enumerate(COUNTERS):
+            point[name.replace('_count', '_growth')] = totals[index] - previous[index] if previous else None
+        curve.append(point)
+        previous = totals
+        day += timedelta(days=1)
+    return curve
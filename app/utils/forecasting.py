@@ -0,0 +1,231 @@
+"""
+素材推广数据预测
+每晚为最近有推广数据的全部素材预测未来7天每天的花费与销售额，结果整批写入 material_forecasts。
+
+模型：带星期效应的指数加权平均
+    星期系数  每个素材各星期几的平均值 / 整体平均值，按该星期几的天数向1收缩
+    水平      去除星期效应后的每日数值按指数衰减加权平均（越近的日期权重越大）
+    预测      水平 × 目标日期的星期系数
+    区间      加权残差标准差 σ，第h天的区间为 预测 ± z·σ·sqrt(1 + h·α²)，下限不小于0
+素材第一条数据之前的日期不参与计算，之后没有数据的日期按0计。
+一批素材排成 素材×日期 的矩阵一次算完，可选用进程池并行计算
+"""
+
+from collections import deque
+from datetime import date, datetime, timedelta
+from sqlalchemy import delete, func, select
+from app import db
+from app.utils.db_pool import disable_statement_timeout
+from app.models import MaterialForecast, PromotionData
+import logging
+
+# 创建日志记录器
+logger = logging.getLogger(__name__)
+
+# 预测天数
+HORIZON = 7
+
+# 指数加权的平滑系数
+ALPHA = 0.3
+
+# 星期系数的收缩强度（相当于先验的周数）
+SEASONAL_PRIOR = 2.0
+
+# 80%预测区间对应的z值
+INTERVAL_Z = 1.2816
+
+# 每批计算的素材数（按素材主键范围划分）
+CHUNK_SIZE = 5000
+
+# 每条插入语句包含的行数
+INSERT_CHUNK_SIZE = 5000
+
+def forecast_arrays(values, observed, first_weekday, horizon=HORIZON, alpha=ALPHA):
+    """
+    对一批序列做带星期效应的指数加权预测
+
+    Args:
+        values: 素材×日期的数值矩阵（没有数据的日期为0）
+        observed: 素材×日期的布尔矩阵，该日期是否有数据
+        first_weekday: 第一列日期的星期（0为周一）
+        horizon: 预测天数（从最后一列的下一天开始）
+        alpha: 平滑系数
+
+    Returns:
+        tuple: (预测, 区间下限, 区间上限)，均为 素材×horizon 的矩阵
+    """
+    import numpy as np
+
+    values = np.asarray(values, dtype='float64')
+    count, days = values.shape
+    # 第一条数据之后的日期都参与计算
+    valid = np.maximum.accumulate(np.asarray(observed, dtype=bool), axis=1).astype('float64')
+    values = values * valid
+
+    weekdays = (first_weekday + np.arange(days)) % 7
+    onehot = np.eye(7)[weekdays]
+    day_counts = valid @ onehot
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weekday_means = (values @ onehot) / day_counts
+        overall = values.sum(axis=1) / valid.sum(axis=1)
+        raw = np.nan_to_num(weekday_means / overall[:, None], nan=1.0, posinf=1.0)
+    shrink = day_counts / (day_counts + SEASONAL_PRIOR)
+    factors = 1 + (raw - 1) * shrink
+    factors /= factors.mean(axis=1, keepdims=True)
+
+    weights = (1 - alpha) ** np.arange(days - 1, -1, -1) * valid
+    total_weight = weights.sum(axis=1)
+    history_factors = factors[:, weekdays]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        level = np.nan_to_num((weights * values / history_factors).sum(axis=1) / total_weight)
+        residuals = values - level[:, None] * history_factors
+        sigma = np.nan_to_num(np.sqrt((weights * residuals ** 2).sum(axis=1) / total_weight))
+
+    future = (first_weekday + days + np.arange(horizon)) % 7
+    forecast = level[:, None] * factors[:, future]
+    spread = INTERVAL_Z * sigma[:, None] * np.sqrt(1 + np.arange(horizon) * alpha ** 2)
+    return forecast, np.maximum(forecast - spread, 0), forecast + spread
+
+def _material_ranges(start):
+    """有推广数据的素材主键范围，按CHUNK_SIZE分段"""
+    low, high = db.session.query(func.min(PromotionData.material_id), func.max(PromotionData.material_id)) \
+        .filter(PromotionData.date >= start).one()
+    if low is None:
+        return
+    for first in range(low, high + 1, CHUNK_SIZE):
+        yield first, first + CHUNK_SIZE
+
+def _history_chunks(start, end):
+    """
+    按素材主键范围读取历史数据并排成矩阵
+
+    Yields:
+        tuple: (素材ID数组, 花费矩阵, 销售额矩阵, 有数据矩阵)
+    """
+    import numpy as np
+
+    days = (end - start).days
+    for low, high in _material_ranges(start):
+        rows = db.session.execute(
+            select(PromotionData.material_id, PromotionData.date, PromotionData.cost, PromotionData.sales_amount)
+            .where(PromotionData.date >= start, PromotionData.date < end,
+                   PromotionData.material_id >= low, PromotionData.material_id < high)
+        ).all()
+        if not rows:
+            continue
+        material_ids, index = np.unique(np.array([row[0] for row in rows], dtype='int64'), return_inverse=True)
+        columns = np.array([(row[1] - start).days for row in rows], dtype='int64')
+        cost = np.zeros((len(material_ids), days))
+        sales = np.zeros((len(material_ids), days))
+        observed = np.zeros((len(material_ids), days), dtype=bool)
+        cost[index, columns] = [float(row[2] or 0) for row in rows]
+        sales[index, columns] = [float(row[3] or 0) for row in rows]
+        observed[index, columns] = True
+        yield material_ids, cost, sales, observed
+
+def forecast_chunk(cost, sales, observed, first_weekday):
+    """计算一批素材的花费与销售额预测（进程池中执行）"""
+    return (forecast_arrays(cost, observed, first_weekday),
+            forecast_arrays(sales, observed, first_weekday))
+
+def _forecast_results(chunks, first_weekday, workers):
+    """
+    按读取顺序返回每批素材的预测结果，workers大于0时在进程池中计算，读取下一批数据与计算并行
+
+    Yields:
+        tuple: (素材ID数组, (花费预测, 销售额预测))
+    """
+    if not workers:
+        for material_ids, cost, sales, observed in chunks:
+            yield material_ids, forecast_chunk(cost, sales, observed, first_weekday)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for material_ids, cost, sales, observed in chunks:
+            pending.append((material_ids, executor.submit(forecast_chunk, cost, sales, observed, first_weekday)))
+            if len(pending) > workers:
+                material_ids, future = pending.popleft()
+                yield material_ids, future.result()
+        while pending:
+            material_ids, future = pending.popleft()
+            yield material_ids, future.result()
+
+def _forecast_rows(material_ids, cost_forecast, sales_forecast, start, now):
+    """将一批预测矩阵展开为 material_forecasts 的行"""
+    cost, cost_lower, cost_upper = (matrix.round(2).tolist() for matrix in cost_forecast)
+    sales, sales_lower, sales_upper = (matrix.round(2).tolist() for matrix in sales_forecast)
+    dates = [start + timedelta(days=offset) for offset in range(HORIZON)]
+    rows = []
+    for row, material_id in enumerate(material_ids.tolist()):
+        for offset, forecast_date in enumerate(dates):
+            rows.append({
+                'material_id': material_id,
+                'forecast_date': forecast_date,
+                'cost': cost[row][offset],
+                'cost_lower': cost_lower[row][offset],
+                'cost_upper': cost_upper[row][offset],
+                'sales_amount': sales[row][offset],
+                'sales_lower': sales_lower[row][offset],
+                'sales_upper': sales_upper[row][offset],
+                'update_time': now,
+            })
+    return rows
+
+def refresh_material_forecasts(history_days=56, workers=0, today=None):
+    """
+    重新计算最近 history_days 天内有推广数据的全部素材从今天起7天的预测
+    每批素材在一个事务中替换预测，最后删除本次没有计算的素材的旧预测
+
+    Args:
+        history_days: 使用的历史天数（截至昨天）
+        workers: 进程池大小，0表示在当前进程中计算
+        today: 预测的第一天（默认今天）
+
+    Returns:
+        int: 预测的素材数
+    """
+    today = today or date.today()
+    start = today - timedelta(days=history_days)
+    now = datetime.utcnow()
+
+    count = 0
+    table = MaterialForecast.__table__
+    # 每个事务开始时取消语句超时（SET LOCAL只对当前事务有效）
+    disable_statement_timeout(db.session.connection())
+    chunks = _history_chunks(start, today)
+    for material_ids, (cost_forecast, sales_forecast) in _forecast_results(chunks, start.weekday(), workers):
+        rows = _forecast_rows(material_ids, cost_forecast, sales_forecast, today, now)
+        db.session.execute(delete(table).where(
+            table.c.material_id.between(int(material_ids[0]), int(material_ids[-1]))
+        ))
+        for offset in range(0, len(rows), INSERT_CHUNK_SIZE):
+            db.session.execute(table.insert(), rows[offset:offset + INSERT_CHUNK_SIZE])
+        db.session.commit()
+        disable_statement_timeout(db.session.connection())
+        count += len(material_ids)
+
+    db.session.execute(delete(table).where(table.c.update_time < now))
+    db.session.commit()
+    logger.info(f"素材预测计算完成：{count} 个素材")
+    return count
+
+def init_forecasting(app):
+    """
+    注册预测命令
+
+    Args:
+        app: Flask应用实例
+    """
+    import click
+
+    @app.cli.command('forecast-materials')
+    @click.option('--workers', default=None, type=int, help='进程池大小，0表示在当前进程中计算')
+    def forecast_materials_command(workers):
+        """预测全部活跃素材未来7天的花费与销售额"""
+        if workers is None:
+            workers = app.config.get('FORECAST_WORKERS', 0)
+        count = refresh_material_forecasts(app.config.get('FORECAST_HISTORY_DAYS', 56), workers)
+        click.echo(f'已预测 {count} 个素材未来7天的花费与销售额')
@@ -0,0 +1,145 @@
+"""
+HTTP条件请求支持
+根据视图底层查询的最大update_time与行数生成弱ETag和Last-Modified，
+命中If-None-Match时直接返回304，跳过模板渲染与序列化。
+关联表没有时间戳且集合变更不会更新父表的update_time，按内容计算指纹。
+只按ETag判断：删除行、关联变更或版本号变化时最大update_time不变，If-Modified-Since会返回过期的304
+"""
+
+import hashlib
+from datetime import timezone
+from functools import wraps
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import BigInteger, Select, Table, cast, func, select
+from app import db
+
+def association_rows(table, **filters):
+    """
+    关联表中按列过滤的行，作为数据源使用，如 association_rows(influencer_tag_association, influencer_id=1)
+    """
+    return select(table).where(*(table.c[name] == value for name, value in filters.items()))
+
+def _association_fingerprint(source):
+    """
+    关联表（或association_rows的结果）的内容指纹：行数、第二列之和与两列乘积之和
+    替换关联（如标签A换成B）时行数不变，但指纹改变
+    """
+    rows = (source if isinstance(source, Select) else select(source)).subquery()
+    first, second = list(rows.c)[:2]
+    count, total, product = db.session.execute(select(
+        func.count(),
+        func.coalesce(func.sum(second), 0),
+        func.coalesce(func.sum(cast(first, BigInteger) * second), 0),
+    ).select_from(rows)).one()
+    return f'{count}.{total}.{product}'
+
+def _source_state(source):
+    """
+    计算单个数据源的状态
+
+    Args:
+        source: ORM查询，没有时间戳列的关联表（Table，或association_rows过滤后的行），
+                或直接计入指纹的其他值（如文件索引的版本号、日期）
+
+    Returns:
+        tuple: (最大更新时间或None, 行数、内容指纹或该值)
+    """
+    if isinstance(source, (Table, Select)):
+        return None, _association_fingerprint(source)
+    if not hasattr(source, 'column_descriptions'):
+        return None, source
+
+    entity = source.column_descriptions[0]['entity']
+    timestamp = getattr(entity, 'update_time', None) or getattr(entity, 'create_time', None)
+    if timestamp is None:
+        return None, source.order_by(None).count()
+
+    max_time, count = source.with_entities(func.max(timestamp), func.count()).order_by(None).one()
+    return max_time, count
+
+def compute_freshness(sources):
+    """
+    汇总多个数据源的状态
+
+    Returns:
+        tuple: (最后修改时间或None, 状态指纹字符串)
+    """
+    last_modified = None
+    parts = []
+    for source in sources:
+        max_time, count = _source_state(source)
+        parts.append(f"{max_time.isoformat() if max_time else '-'}:{count}")
+        if max_time and (last_modified is None or max_time > last_modified):
+            last_modified = max_time
+    return last_modified, '|'.join(parts)
+
+def _make_etag(fingerprint):
+    """结合用户、请求路径与数据状态生成ETag值"""
+    user_key = current_user.get_id() if current_user.is_authenticated else 'anonymous'
+    raw = '\n'.join([
+        current_app.config.get('ETAG_VERSION', ''),
+        str(user_key),
+        request.full_path,
+        fingerprint,
+    ])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def _to_http_date(value):
+    """将数据库中的UTC naive时间转换为秒级精度的aware时间"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+def _not_modified(etag):
+    """判断客户端缓存是否仍然有效（忽略If-Modified-Since，见模块说明）"""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    return False
+
+def conditional_get(sources):
+    """
+    条件请求装饰器
+
+    Args:
+        sources: 可调用对象，接收与视图相同的参数，返回数据源（查询、关联表、association_rows或其他值）列表
+
+    用法：
+        @influencers_bp.route('/influencers/<int:influencer_id>')
+        @login_required
+        @conditional_get(lambda influencer_id: [Influencer.query.filter_by(id=influencer_id)])
+        def influencer_detail(influencer_id):
+            ...
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # 仅处理GET/HEAD；有待显示的闪现消息时页面内容会不同，不做条件处理
+            if (request.method not in ('GET', 'HEAD')
+                    or not current_app.config.get('CONDITIONAL_GET_ENABLED', True)
+                    or session.get('_flashes')):
+                return view(*args, **kwargs)
+
+            last_modified, fingerprint = compute_freshness(sources(*args, **kwargs))
+            last_modified = _to_http_date(last_modified)
+            etag = _make_etag(fingerprint)
+
+            if _not_modified(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            if last_modified:
+                response.last_modified = last_modified
+            # 内容与登录用户相关，只允许浏览器私有缓存且每次须重新验证
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,145 @@
+"""
+达人指标批量计算
+一次读取全部达人、素材与互动数据快照，用pandas/numpy向量化计算互动率、播放量增长率
+以及互动率在同等级达人中的百分位，结果整表写入 influencer_metrics。
+列表与详情页只读取该表，不做实时计算
+"""
+
+import math
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select
+from app import db
+from app.utils.db_pool import disable_statement_timeout
+from app.models import Influencer, InfluencerMetrics, Material, MaterialStatSnapshot
+import logging
+
+# 创建日志记录器
+logger = logging.getLogger(__name__)
+
+# 计算增长率的时间窗口（天）
+GROWTH_WINDOWS = (7, 30)
+
+# 每条插入语句包含的行数
+INSERT_CHUNK_SIZE = 1000
+
+# 未设置等级的达人在计算百分位时归为一组
+UNLEVELED = ''
+
+def _plays_at(connection, moment):
+    """
+    每个素材在指定时间的播放量（该时间之前最后一次快照）
+
+    Returns:
+        DataFrame: material_id, play_count
+    """
+    import pandas as pd
+
+    last = select(MaterialStatSnapshot.material_id, func.max(MaterialStatSnapshot.captured_at).label('captured_at')) \
+        .where(MaterialStatSnapshot.captured_at <= moment) \
+        .group_by(MaterialStatSnapshot.material_id).subquery()
+    statement = select(MaterialStatSnapshot.material_id, MaterialStatSnapshot.play_count).join(
+        last, (MaterialStatSnapshot.material_id == last.c.material_id)
+        & (MaterialStatSnapshot.captured_at == last.c.captured_at)
+    )
+    return pd.read_sql(statement, connection)
+
+def _growth(materials, baseline, current):
+    """
+    按达人汇总的播放量增长率，只统计两个时间点都有快照的素材，避免新素材虚增增长率
+
+    Returns:
+        Series: 以influencer_id为索引的增长率
+    """
+    import numpy as np
+
+    merged = current.merge(baseline, on='material_id', suffixes=('_now', '_then')) \
+        .merge(materials[['id', 'influencer_id']], left_on='material_id', right_on='id')
+    totals = merged.groupby('influencer_id')[['play_count_now', 'play_count_then']].sum()
+    then = totals['play_count_then'].to_numpy(dtype='float64')
+    now = totals['play_count_now'].to_numpy(dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.where(then > 0, (now - then) / then, np.nan)
+    return totals.assign(rate=rate)['rate']
+
+def compute_metrics(connection, now=None):
+    """
+    计算全部达人的指标
+
+    Returns:
+        DataFrame: 每个达人一行，列与 influencer_metrics 表一致（不含update_time）
+    """
+    import numpy as np
+    import pandas as pd
+
+    now = now or datetime.utcnow()
+    influencers = pd.read_sql(select(Influencer.id, Influencer.influencer_level), connection)
+    materials = pd.read_sql(select(
+        Material.id, Material.influencer_id, Material.play_count, Material.like_count,
+        Material.comment_count, Material.share_count
+    ), connection)
+
+    counters = ['play_count', 'like_count', 'comment_count', 'share_count']
+    materials[counters] = materials[counters].fillna(0).astype('int64')
+    materials['engagements'] = materials['like_count'] + materials['comment_count'] + materials['share_count']
+    totals = materials.groupby('influencer_id').agg(
+        material_count=('id', 'size'),
+        total_plays=('play_count', 'sum'),
+        total_engagements=('engagements', 'sum'),
+    )
+
+    frame = influencers.rename(columns={'id': 'influencer_id'}).set_index('influencer_id').join(totals)
+    frame[['material_count', 'total_plays', 'total_engagements']] = \
+        frame[['material_count', 'total_plays', 'total_engagements']].fillna(0).astype('int64')
+
+    plays = frame['total_plays'].to_numpy(dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frame['engagement_rate'] = np.where(plays > 0, frame['total_engagements'].to_numpy(dtype='float64') / plays,
+                                            np.nan)
+
+    current = _plays_at(connection, now)
+    for days in GROWTH_WINDOWS:
+        frame[f'play_growth_{days}d'] = _growth(materials, _plays_at(connection, now - timedelta(days=days)), current)
+
+    # 同等级内互动率的百分位排名（没有互动率的达人不参与排名）
+    levels = frame['influencer_level'].fillna(UNLEVELED)
+    frame['level_percentile'] = frame.groupby(levels)['engagement_rate'].rank(pct=True)
+
+    return frame.drop(columns=['influencer_level']).reset_index()
+
+def refresh_influencer_metrics(now=None):
+    """
+    重新计算并整表替换达人指标，在一个事务中完成，读取方在提交前看到的是旧数据
+
+    Returns:
+        int: 写入的达人数
+    """
+    now = now or datetime.utcnow()
+    with db.engine.begin() as connection:
+        disable_statement_timeout(connection)
+        frame = compute_metrics(connection, now)
+        # to_dict返回Python原生类型，NaN转换为NULL
+        rows = [
+            {key: None if isinstance(value, float) and math.isnan(value) else value for key, value in row.items()}
+            for row in frame.to_dict('records')
+        ]
+        for row in rows:
+            row['update_time'] = now
+        connection.execute(delete(InfluencerMetrics.__table__))
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            connection.execute(InfluencerMetrics.__table__.insert(), rows[start:start + INSERT_CHUNK_SIZE])
+    logger.info(f"达人指标计算完成：{len(rows)} 个达人")
+    return len(rows)
+
+def init_influencer_metrics(app):
+    """
+    注册指标计算命令
+
+    Args:
+        app: Flask应用实例
+    """
+    import click
+
+    @app.cli.command('compute-influencer-metrics')
+    def compute_influencer_metrics_command():
+        """重新计算全部达人的互动率、增长率与等级内百分位"""
+        click.echo(f'已计算 {refresh_influencer_metrics()} 个达人的指标')
@@ -0,0 +1,297 @@
+"""
+推广数据推送接收
+广告平台导出程序通过 /api/promotion/ingest 推送 NDJSON（可gzip压缩）格式的推广数据，
+请求体按块读取、逐行解析，不在内存中缓存整个请求；素材ID通过缓存映射为主键后按批upsert。
+每次推送携带批次ID，同一批次只写入一次
+"""
+
+import json
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import IngestBatch, Material
+from app.utils.promotion_fetch import UPSERT_CHUNK_SIZE, bulk_upsert_promotion_rows
+import logging
+
+# 创建日志记录器
+logger = logging.getLogger(__name__)
+
+# 每次从请求体读取的字节数
+READ_CHUNK_SIZE = 64 * 1024
+
+# 单行最大字节数，超出时视为格式错误（同时限制gzip解压后的内存占用）
+MAX_LINE_BYTES = 64 * 1024
+
+# 响应中最多返回的错误行与未知素材ID数量
+MAX_ERROR_SAMPLES = 20
+
+# 推送数据冲突时更新的字段
+INGEST_UPDATE_COLUMNS = ('exposure_count', 'click_count', 'conversion_count', 'cost', 'sales_amount',
+                         'revenue', 'roi', 'update_time')
+
+class IngestError(ValueError):
+    """请求体无法解析（如gzip数据损坏或单行过长）"""
+
+def iter_lines(stream, compressed=False):
+    """
+    按块读取请求体并逐行返回，compressed为True时以流式方式解压gzip
+
+    Args:
+        stream: 可读的二进制流（request.stream）
+        compressed: 请求体是否为gzip压缩
+
+    Yields:
+        bytes: 不含换行符的一行
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if compressed else None
+    buffer = b''
+
+    def split(data):
+        nonlocal buffer
+        buffer += data
+        lines = buffer.split(b'\n')
+        buffer = lines.pop()
+        if len(buffer) > MAX_LINE_BYTES:
+            raise IngestError(f'单行数据超过 {MAX_LINE_BYTES} 字节')
+        return lines
+
+    try:
+        while True:
+            chunk = stream.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            if decompressor is None:
+                yield from split(chunk)
+                continue
+            # 限制每次解压的输出长度，避免高压缩比的数据一次展开过多
+            while chunk:
+                yield from split(decompressor.decompress(chunk, READ_CHUNK_SIZE))
+                chunk = decompressor.unconsumed_tail
+        if decompressor is not None:
+            yield from split(decompressor.flush())
+    except zlib.error as e:
+        raise IngestError(f'gzip数据无法解压: {e}')
+    if buffer:
+        yield buffer
+
+class MaterialKeyCache:
+    """素材ID -> (素材主键ID, 达人ID) 的进程内缓存，未命中的素材ID按批用IN查询加载"""
+
+    def __init__(self, ttl=300, max_size=200000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, material_ids):
+        """
+        将一批素材ID映射为主键
+
+        Returns:
+            dict: {素材ID: (素材主键ID, 达人ID)}，不存在的素材ID不在结果中
+        """
+        now = time.monotonic()
+        keys = {}
+        missing = []
+        with self._lock:
+            for material_id in set(material_ids):
+                item = self._items.get(material_id)
+                if item and item[0] > now:
+                    keys[material_id] = item[1]
+                else:
+                    missing.append(material_id)
+
+        loaded = {}
+        for start in range(0, len(missing), UPSERT_CHUNK_SIZE):
+            loaded.update(
+                (material_id, (pk, influencer_id)) for material_id, pk, influencer_id in
+                db.session.query(Material.material_id, Material.id, Material.influencer_id)
+                .filter(Material.material_id.in_(missing[start:start + UPSERT_CHUNK_SIZE]))
+            )
+
+        if loaded:
+            with self._lock:
+                if len(self._items) + len(loaded) > self.max_size:
+                    self._items.clear()
+                expires = now + self.ttl
+                self._items.update((material_id, (expires, key)) for material_id, key in loaded.items())
+        keys.update(loaded)
+        return keys
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+material_keys = MaterialKeyCache()
+
+def _decimal(value):
+    number = Decimal(str(value))
+    if not number.is_finite():
+        raise ValueError(f'无效的数值: {value}')
+    return number
+
+def parse_row(record):
+    """
+    校验一行推送数据
+
+    必填字段：material_id、date（YYYY-MM-DD）、cost、sales_amount
+    可选字段：exposure_count、click_count、conversion_count、roi
+
+    Returns:
+        dict: 转换类型后的字段
+    """
+    if not isinstance(record, dict):
+        raise ValueError('每行必须是JSON对象')
+    material_id = record['material_id']
+    if not isinstance(material_id, (str, int)) or not str(material_id):
+        raise ValueError('material_id无效')
+    roi = record.get('roi')
+    return {
+        'material_id': str(material_id),
+        'date': date.fromisoformat(str(record['date'])),
+        'cost': _decimal(record['cost']),
+        'sales_amount': _decimal(record['sales_amount']),
+        'roi': _decimal(roi) if roi is not None else None,
+        'exposure_count': int(record.get('exposure_count') or 0),
+        'click_count': int(record.get('click_count') or 0),
+        'conversion_count': int(record.get('conversion_count') or 0),
+    }
+
+def ingest_promotion_lines(lines, user_id, batch_size=5000):
+    """
+    解析NDJSON行并按批upsert推广数据，在当前事务中执行，不提交
+
+    格式错误或素材不存在的行被跳过并计入rejected，不影响其他行
+
+    Args:
+        lines: 逐行数据（iter_lines的返回值）
+        user_id: 数据归属的用户ID
+        batch_size: 每批upsert的行数
+
+    Returns:
+        dict: 处理统计
+    """
+    stats = {'rows': 0, 'upserted': 0, 'rejected': 0, 'errors': [], 'unknown_material_ids': []}
+    unknown = set()
+    pending = []
+
+    def flush():
+        keys = material_keys.resolve(row['material_id'] for row in pending)
+        now = datetime.utcnow()
+        # 同一批中同一素材同一天的数据以最后一条为准（一条upsert语句不能两次更新同一行）
+        values = {}
+        for row in pending:
+            key = keys.get(row['material_id'])
+            if key is None:
+                stats['rejected'] += 1
+                if row['material_id'] not in unknown and len(unknown) < MAX_ERROR_SAMPLES:
+                    unknown.add(row['material_id'])
+                continue
+            values[(key[0], row['date'])] = {
+                'name': f"{row['material_id']} {row['date'].isoformat()}",
+                'influencer_id': key[1],
+                'material_id': key[0],
+                'date': row['date'],
+                'exposure_count': row['exposure_count'],
+                'click_count': row['click_count'],
+                'conversion_count': row['conversion_count'],
+                'cost': row['cost'],
+                'sales_amount': row['sales_amount'],
+                'revenue': row['sales_amount'],
+                'roi': row['roi'],
+                'created_by_id': user_id,
+                'created_by': user_id,
+                'create_time': now,
+                'update_time': now,
+            }
+        bulk_upsert_promotion_rows(list(values.values()), update_columns=INGEST_UPDATE_COLUMNS)
+        stats['upserted'] += len(values)
+        pending.clear()
+
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        stats['rows'] += 1
+        try:
+            pending.append(parse_row(json.loads(line)))
+        except (ValueError, KeyError, TypeError, InvalidOperation) as e:
+            stats['rejected'] += 1
+            if len(stats['errors']) < MAX_ERROR_SAMPLES:
+                stats['errors'].append({'line': line_number, 'error': str(e)})
+            continue
+        if len(pending) >= batch_size:
+            flush()
+    if pending:
+        flush()
+
+    stats['unknown_material_ids'] = sorted(unknown)
+    return stats
+
+def begin_batch(batch_id, user_id, timeout_seconds=600):
+    """
+    登记推送批次
+
+    已完成的批次直接返回；处理中的批次在超时前不允许重复处理；失败或超时的批次可以重新推送
+
+    Returns:
+        tuple: (批次, 是否需要处理)
+    """
+    batch = IngestBatch.query.filter_by(batch_id=batch_id).first()
+    if batch is not None:
+        if batch.status == 'completed':
+            return batch, False
+        stale = batch.create_time and batch.create_time < datetime.utcnow() - timedelta(seconds=timeout_seconds)
+        if batch.status == 'processing' and not stale:
+            return batch, False
+        batch.status = 'processing'
+        batch.error = None
+        batch.create_time = datetime.utcnow()
+        batch.finish_time = None
+    else:
+        batch = IngestBatch(batch_id=batch_id, status='processing', created_by_id=user_id)
+        db.session.add(batch)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # 同一批次被并发推送
+        db.session.rollback()
+        return IngestBatch.query.filter_by(batch_id=batch_id).first(), False
+    return batch, True
+
+def ingest_batch(batch, stream, user_id, compressed=False, batch_size=5000):
+    """
+    处理一个推送批次：写入数据与标记批次完成在同一个事务中提交，失败时回滚并标记为failed
+
+    Returns:
+        dict: 处理统计（同时保存在批次记录中）
+    """
+    started = time.perf_counter()
+    try:
+        stats = ingest_promotion_lines(iter_lines(stream, compressed), user_id, batch_size)
+        seconds = time.perf_counter() - started
+        stats['seconds'] = round(seconds, 3)
+        stats['rows_per_second'] = round(stats['rows'] / seconds) if seconds > 0 else None
+        batch.status = 'completed'
+        batch.row_count = stats['rows']
+        batch.upserted_count = stats['upserted']
+        batch.rejected_count = stats['rejected']
+        batch.summary = stats
+        batch.finish_time = datetime.utcnow()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        # 缓存中可能有已删除素材的主键，清空后重新推送时重新加载
+        material_keys.clear()
+        batch.status = 'failed'
+        batch.error = str(e)
+        batch.finish_time = datetime.utcnow()
+        db.session.commit()
+        raise
+    logger.info(f"推送批次 {batch.batch_id} 写入 {stats['upserted']} 条，拒绝 {stats['rejected']} 条，"
+                f"耗时 {stats['seconds']}s")
+    return stats
@@ -0,0 +1,302 @@
+"""
+后台任务队列
+任务保存在background_jobs表中，由独立的worker进程（flask run-worker）领取执行，
+Web请求只负责提交任务并返回任务ID，客户端通过 /api/jobs/<id> 查询进度
+"""
+
+import importlib
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update
+from app import db
+from app.models import BackgroundJob
+import logging
+
+# 创建日志记录器
+logger = logging.getLogger(__name__)
+
+# 任务类型 -> 处理函数
+JOB_HANDLERS = {}
+
+# 注册任务处理函数的模块，worker启动时导入
+HANDLER_MODULES = ('app.utils.promotion_fetch',)
+
+def job_handler(job_type):
+    """
+    注册任务处理函数
+
+    处理函数签名为 handler(params, progress)，返回值作为任务结果保存（需可JSON序列化）
+    """
+    def decorator(func):
+        JOB_HANDLERS[job_type] = func
+        return func
+    return decorator
+
+def _load_handlers():
+    for module in HANDLER_MODULES:
+        importlib.import_module(module)
+
+class JobProgress:
+    """
+    任务进度上报
+    使用独立连接更新任务行，不影响处理函数自身的事务
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def update(self, total=None, processed=0, fetched=0, saved=0):
+        """
+        累加进度计数
+
+        Args:
+            total: 需要处理的对象总数（不为None时覆盖）
+            processed: 新处理完成的对象数
+            fetched: 新获取的记录数
+            saved: 新写入的记录数
+        """
+        values = {
+            'processed_count': BackgroundJob.processed_count + processed,
+            'fetched_count': BackgroundJob.fetched_count + fetched,
+            'saved_count': BackgroundJob.saved_count + saved,
+            'heartbeat_time': datetime.utcnow(),
+        }
+        if total is not None:
+            values['total_count'] = total
+        with db.engine.begin() as connection:
+            connection.execute(update(BackgroundJob).where(BackgroundJob.id == self.job_id).values(**values))
+
+def enqueue_job(job_type, params, user_id=None):
+    """
+    提交任务
+
+    Args:
+        job_type: 任务类型，必须已注册处理函数
+        params: 任务参数（需可JSON序列化）
+        user_id: 提交任务的用户ID
+
+    Returns:
+        BackgroundJob: 新建的任务
+    """
+    _load_handlers()
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f'未知的任务类型: {job_type}')
+    job = BackgroundJob(job_type=job_type, params=params, status='queued', created_by_id=user_id)
+    db.session.add(job)
+    db.session.commit()
+    logger.info(f"已提交任务 {job.id}（{job_type}）")
+    return job
+
+def claim_next_job(worker_name):
+    """
+    领取最早提交的待执行任务
+    PostgreSQL使用 FOR UPDATE SKIP LOCKED；其他数据库依靠带状态条件的UPDATE保证只被一个worker领取
+
+    Returns:
+        BackgroundJob: 领取到的任务，没有待执行任务时返回None
+    """
+    job_id = db.session.query(BackgroundJob.id).filter_by(status='queued') \
+        .order_by(BackgroundJob.id).limit(1).with_for_update(skip_locked=True).scalar()
+    if job_id is None:
+        db.session.rollback()
+        return None
+
+    now = datetime.utcnow()
+    claimed = db.session.execute(
+        update(BackgroundJob)
+        .where(BackgroundJob.id == job_id, BackgroundJob.status == 'queued')
+        .values(status='running', worker=worker_name, start_time=now, heartbeat_time=now,
+                attempts=BackgroundJob.attempts + 1)
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return None
+    return db.session.get(BackgroundJob, job_id)
+
+class JobHeartbeat(threading.Thread):
+    """
+    任务执行期间定期更新心跳时间
+    处理函数长时间没有上报进度（如单次API调用或写入很慢）时，任务也不会被当作中断而重新排队
+    """
+
+    def __init__(self, job_id, worker_name, interval):
+        super().__init__(name=f'job-heartbeat-{job_id}', daemon=True)
+        self.job_id = job_id
+        self.worker_name = worker_name
+        self.interval = interval
+        self.engine = db.engine
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                with self.engine.begin() as connection:
+                    connection.execute(update(BackgroundJob).where(
+                        BackgroundJob.id == self.job_id, BackgroundJob.worker == self.worker_name,
+                        BackgroundJob.status == 'running'
+                    ).values(heartbeat_time=datetime.utcnow()))
+            except Exception:
+                logger.exception(f"任务 {self.job_id} 更新心跳失败")
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+def run_job(job, heartbeat_interval=None):
+    """
+    执行已领取的任务并记录结果
+    只有任务仍由本worker持有时才写入结果：心跳超时被回收并由其他worker重新领取的任务不会被覆盖
+
+    Args:
+        job: claim_next_job 领取到的任务
+        heartbeat_interval: 心跳间隔秒数，默认为 JOB_STALE_SECONDS 的四分之一
+    """
+    handler = JOB_HANDLERS.get(job.job_type)
+    job_id, job_type, worker_name = job.id, job.job_type, job.worker
+    if heartbeat_interval is None:
+        heartbeat_interval = max(current_app.config.get('JOB_STALE_SECONDS', 600) / 4, 1)
+    heartbeat = JobHeartbeat(job_id, worker_name, heartbeat_interval)
+    heartbeat.start()
+    try:
+        if handler is None:
+            raise ValueError(f'未知的任务类型: {job_type}')
+        result = handler(dict(job.params or {}), JobProgress(job_id))
+        db.session.commit()
+        status, error = 'succeeded', None
+    except Exception as e:
+        db.session.rollback()
+        logger.exception(f"任务 {job_id} 执行失败")
+        status, result, error = 'failed', None, str(e)
+    finally:
+        heartbeat.stop()
+
+    finished = db.session.execute(
+        update(BackgroundJob)
+        .where(BackgroundJob.id == job_id, BackgroundJob.worker == worker_name, BackgroundJob.status == 'running')
+        .values(status=status, result=result, error=error, finish_time=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    if not finished:
+        logger.warning(f"任务 {job_id}（{job_type}）已不由 {worker_name} 持有，未写入本次结果")
+    else:
+        logger.info(f"任务 {job_id}（{job_type}）{status}")
+    return db.session.get(BackgroundJob, job_id)
+
+def requeue_stale_jobs(stale_seconds, max_attempts):
+    """
+    回收心跳超时的执行中任务（如worker进程被强制结束），未超过重试次数的重新排队，否则标记失败
+
+    Returns:
+        int: 处理的任务数
+    """
+    deadline = datetime.utcnow() - timedelta(seconds=stale_seconds)
+    stale = BackgroundJob.query.filter(BackgroundJob.status == 'running',
+                                       BackgroundJob.heartbeat_time < deadline).all()
+    for job in stale:
+        if job.attempts >= max_attempts:
+            job.status = 'failed'
+            job.error = 'worker中断且超过最大重试次数'
+            job.finish_time = datetime.utcnow()
+        else:
+            job.status = 'queued'
+            job.worker = None
+    if stale:
+        db.session.commit()
+        logger.warning(f"回收了 {len(stale)} 个中断的任务")
+    return len(stale)
+
+def work(app, worker_name=None, poll_interval=None, stop_event=None, once=False):
+    """
+    worker主循环：不断领取并执行任务
+
+    Args:
+        app: Flask应用实例
+        worker_name: worker名称，默认使用主机名和进程号
+        poll_interval: 没有任务时的轮询间隔秒数
+        stop_event: 设置后退出循环
+        once: 只处理当前队列中的任务，队列为空时退出
+    """
+    worker_name = worker_name or f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+    poll_interval = poll_interval or app.config.get('JOB_POLL_INTERVAL', 2)
+    _load_handlers()
+    logger.info(f"任务worker {worker_name} 已启动")
+
+    while stop_event is None or not stop_event.is_set():
+        with app.app_context():
+            # 数据库暂时不可用等错误只记录日志，等待下一轮重试，不让worker退出
+            try:
+                requeue_stale_jobs(app.config.get('JOB_STALE_SECONDS', 600), app.config.get('JOB_MAX_ATTEMPTS', 3))
+                job = claim_next_job(worker_name)
+                if job is not None:
+                    run_job(job)
+                    continue
+            except Exception:
+                db.session.rollback()
+                logger.exception(f"任务worker {worker_name} 领取或执行任务失败")
+        if once:
+            break
+        if stop_event is not None:
+            stop_event.wait(poll_interval)
+        else:
+            time.sleep(poll_interval)
+
+def _worker_process(index):
+    from app import create_app
+    app = create_app(lean=True, start_scheduler=False)
+    work(app, worker_name=f'{socket.gethostname()}:{os.getpid()}:{index}')
+
+def run_workers(app, concurrency=1):
+    """
+    以前台方式运行worker；concurrency大于1时启动多个worker进程
+
+    Args:
+        app: Flask应用实例
+        concurrency: worker进程数
+    """
+    if concurrency <= 1:
+        work(app)
+        return
+    processes = [multiprocessing.Process(target=_worker_process, args=(index,), daemon=True)
+                 for index in range(concurrency)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+def start_worker_threads(app, count):
+    """在当前进程中启动后台worker线程（用于开发环境，生产环境应使用独立进程）"""
+    stop_event = threading.Event()
+    for index in range(count):
+        thread = threading.Thread(target=work, args=(app,), kwargs={'stop_event': stop_event},
+                                  name=f'job-worker-{index}', daemon=True)
+        thread.start()
+    return stop_event
+
+def init_jobs(app, start_threads=True):
+    """
+    注册worker命令，并按配置在当前进程启动worker线程
+
+    Args:
+        app: Flask应用实例
+        start_threads: 是否按JOB_WORKER_THREADS启动进程内worker线程
+    """
+    import click
+
+    @app.cli.command('run-worker')
+    @click.option('--concurrency', default=1, show_default=True, help='worker进程数')
+    def run_worker_command(concurrency):
+        """启动后台任务worker并保持运行"""
+        run_workers(app, concurrency)
+
+    threads = app.config.get('JOB_WORKER_THREADS', 0)
+    if start_threads and threads > 0:
+        start_worker_threads(app, threads)
@@ -0,0 +1,164 @@
+"""
+通过视频链接批量创建素材
+按链接解析素材ID，批量查询已存在的达人与素材，缺失的在一个事务中创建
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import Influencer, Material
+import logging
+
+# 创建日志记录器
+logger = logging.getLogger(__name__)
+
+# 单次批量创建允许的最大链接数
+MAX_BULK_URLS = 500
+
+# 达人信息缓存：视频链接 -> (过期时间, 达人信息)
+INFLUENCER_INFO_TTL = 3600
+INFLUENCER_INFO_CACHE_SIZE = 10000
+_influencer_info_cache = {}
+_influencer_info_lock = threading.Lock()
+
+def extract_material_id(video_url):
+    """从视频链接中提取素材ID（取最后一段路径）"""
+    video_url = (video_url or '').strip()
+    material_id = video_url.rstrip('/').split('?')[0].split('/')[-1]
+    return material_id or None
+
+def _cached_influencer_info(video_url):
+    with _influencer_info_lock:
+        item = _influencer_info_cache.get(video_url)
+        if item and item[0] > time.monotonic():
+            return item[1]
+    return None
+
+def _cache_influencer_info(video_url, info):
+    with _influencer_info_lock:
+        if len(_influencer_info_cache) >= INFLUENCER_INFO_CACHE_SIZE:
+            # 容量已满时清除过期项，仍然不足则清空
+            now = time.monotonic()
+            for key in [key for key, item in _influencer_info_cache.items() if item[0] <= now]:
+                del _influencer_info_cache[key]
+            if len(_influencer_info_cache) >= INFLUENCER_INFO_CACHE_SIZE:
+                _influencer_info_cache.clear()
+        _influencer_info_cache[video_url] = (time.monotonic() + INFLUENCER_INFO_TTL, info)
+
+def resolve_influencer_infos(video_urls, concurrency=4):
+    """
+    获取一批视频链接对应的达人信息，优先使用缓存，未命中的以有限并发调用API
+
+    Returns:
+        dict: {视频链接: 达人信息或None}
+    """
+    from app.api.client import douyin_client
+
+    infos = {}
+    missing = []
+    for video_url in video_urls:
+        cached = _cached_influencer_info(video_url)
+        if cached is not None:
+            infos[video_url] = cached
+        else:
+            missing.append(video_url)
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=max(min(concurrency, len(missing)), 1)) as executor:
+            for video_url, info in zip(missing, executor.map(douyin_client.get_influencer_info, missing)):
+                infos[video_url] = info
+                if info:
+                    _cache_influencer_info(video_url, info)
+    return infos
+
+def import_video_urls(video_urls, user_id, influencer=None, concurrency=4):
+    """
+    根据视频链接批量创建素材（及缺失的达人），所有新建记录在一个事务中提交
+
+    Args:
+        video_urls: 视频链接列表
+        user_id: 创建者用户ID
+        influencer: 指定的达人；为None时按API返回的uid查找或创建
+        concurrency: 调用API的最大并发数
+
+    Returns:
+        list: 与输入顺序一致的结果，每项包含video_url、status（created/exists/duplicate/invalid/failed）、
+              material与influencer（id等基本字段）以及error
+    """
+    results = []
+    by_material_id = {}
+    for video_url in video_urls:
+        item = {'video_url': video_url, 'status': None, 'material': None, 'influencer': None, 'error': None}
+        results.append(item)
+        material_id = extract_material_id(video_url)
+        if not material_id:
+            item.update(status='invalid', error='视频链接无效')
+        elif material_id in by_material_id:
+            item.update(status='duplicate', error='与本批次中的其他链接重复')
+        else:
+            by_material_id[material_id] = item
+
+    # 一次查询出已存在的素材
+    existing_materials = {}
+    if by_material_id:
+        existing_materials = {
+            material.material_id: material
+            for material in Material.query.options(joinedload(Material.influencer))
+            .filter(Material.material_id.in_(list(by_material_id)))
+        }
+    pending = {material_id: item for material_id, item in by_material_id.items()
+               if material_id not in existing_materials}
+
+    # 未指定达人时获取达人信息，并一次查询出已存在的达人
+    infos = {}
+    influencers_by_uid = {}
+    if influencer is None and pending:
+        infos = resolve_influencer_infos([item['video_url'] for item in pending.values()], concurrency)
+        uids = {info['uid'] for info in infos.values() if info and info.get('uid')}
+        if uids:
+            influencers_by_uid = {row.uid: row for row in Influencer.query.filter(Influencer.uid.in_(uids))}
+
+    new_materials = []
+    for material_id, item in pending.items():
+        target = influencer
+        if target is None:
+            info = infos.get(item['video_url'])
+            if not info or not info.get('uid'):
+                item.update(status='failed', error='获取达人信息失败')
+                continue
+            target = influencers_by_uid.get(info['uid'])
+            if target is None:
+                target = Influencer(
+                    name=info['name'],
+                    douyin_id=info['douyin_id'],
+                    uid=info['uid'],
+                    influencer_level=info.get('influencer_level'),
+                    created_by_id=user_id
+                )
+                db.session.add(target)
+                influencers_by_uid[info['uid']] = target
+        material = Material(
+            influencer=target,
+            material_id=material_id,
+            video_url=item['video_url'],
+            created_by_id=user_id
+        )
+        db.session.add(material)
+        new_materials.append((item, material))
+
+    # 分配主键后在单个事务中提交所有新建的达人与素材
+    db.session.flush()
+    for item, material in new_materials:
+        item.update(status='created', **_describe(material))
+    for material_id, material in existing_materials.items():
+        by_material_id[material_id].update(status='exists', **_describe(material))
+    db.session.commit()
+    return results
+
+def _describe(material):
+    return {
+        'material': {'id': material.id, 'material_id': material.material_id},
+        'influencer': {'id': material.influencer.id, 'name': material.influencer.name},
+    }
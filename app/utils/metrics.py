@@ -0,0 +1,156 @@
+"""
+Prometheus监控指标
+提供/metrics端点，覆盖视图请求耗时、数据库查询耗时、定时任务以及抖音API客户端
+设置PROMETHEUS_MULTIPROC_DIR环境变量后以多进程模式汇总所有gunicorn worker的数据
+"""
+
+import hmac
+import os
+import time
+from functools import wraps
+from flask import Response, abort, current_app, g, has_request_context, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+from app.utils.sql_timing import add_statement_observer
+import logging
+
+# 创建日志记录器
+logger = logging.getLogger(__name__)
+
+# 请求耗时
+REQUEST_LATENCY = Histogram(
+    'ddkol_http_request_duration_seconds', '视图请求耗时',
+    ['method', 'endpoint', 'status']
+)
+# 单个请求内的数据库总耗时
+REQUEST_DB_TIME = Histogram(
+    'ddkol_http_request_db_seconds', '单个请求内的数据库耗时',
+    ['endpoint']
+)
+# 单条SQL语句耗时
+DB_QUERY_LATENCY = Histogram(
+    'ddkol_db_query_duration_seconds', 'SQL语句执行耗时',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, float('inf'))
+)
+# 定时任务
+JOB_DURATION = Histogram(
+    'ddkol_scheduler_job_duration_seconds', '定时任务执行耗时',
+    ['job'], buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, float('inf'))
+)
+JOB_ROWS_WRITTEN = Counter(
+    'ddkol_scheduler_job_rows_written', '定时任务写入的行数',
+    ['job']
+)
+JOB_FAILURES = Counter(
+    'ddkol_scheduler_job_failures', '定时任务失败次数',
+    ['job']
+)
+# 查询结果缓存
+QUERY_CACHE_REQUESTS = Counter(
+    'ddkol_query_cache_requests', '查询结果缓存的请求次数',
+    ['function', 'result']
+)
+# 抖音API客户端
+API_LATENCY = Histogram(
+    'ddkol_douyin_api_request_duration_seconds', '抖音API调用耗时',
+    ['method']
+)
+API_ERRORS = Counter(
+    'ddkol_douyin_api_errors', '抖音API调用失败次数',
+    ['method']
+)
+
+def observe_job(job_name):
+    """
+    定时任务装饰器：记录执行耗时，任务返回值视为写入行数
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                rows = func(*args, **kwargs)
+            except Exception:
+                JOB_FAILURES.labels(job=job_name).inc()
+                raise
+            finally:
+                JOB_DURATION.labels(job=job_name).observe(time.perf_counter() - start)
+            if rows:
+                JOB_ROWS_WRITTEN.labels(job=job_name).inc(rows)
+            return rows
+        return wrapper
+    return decorator
+
+def observe_api_call(func):
+    """API客户端方法装饰器：按方法名记录调用耗时"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            API_ERRORS.labels(method=func.__name__).inc()
+            raise
+        finally:
+            API_LATENCY.labels(method=func.__name__).observe(time.perf_counter() - start)
+    return wrapper
+
+def record_api_error(method):
+    """记录在客户端方法内部被捕获的API错误"""
+    API_ERRORS.labels(method=method).inc()
+
+def _record_statement(statement, seconds):
+    DB_QUERY_LATENCY.observe(seconds)
+    if has_request_context():
+        g._metrics_db_seconds = g.get('_metrics_db_seconds', 0.0) + seconds
+
+def _metrics_registry():
+    """多进程模式下每次采集时汇总所有worker写入的指标文件"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+def init_metrics(app):
+    """
+    根据配置启用监控指标与/metrics端点
+    未配置METRICS_TOKEN时仍然采集指标，但不注册/metrics端点，避免未授权访问
+
+    Args:
+        app: Flask应用实例
+    """
+    if not app.config.get('METRICS_ENABLED'):
+        return
+
+    add_statement_observer(_record_statement)
+
+    @app.before_request
+    def start_request_timer():
+        g._metrics_start = time.perf_counter()
+        g._metrics_db_seconds = 0.0
+
+    @app.after_request
+    def observe_request(response):
+        start = g.pop('_metrics_start', None)
+        if start is None or request.endpoint == 'metrics':
+            return response
+        # 使用端点名而不是URL作为标签，避免标签基数随ID增长
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_LATENCY.labels(
+            method=request.method, endpoint=endpoint, status=response.status_code
+        ).observe(time.perf_counter() - start)
+        REQUEST_DB_TIME.labels(endpoint=endpoint).observe(g.pop('_metrics_db_seconds', 0.0))
+        return response
+
+    def metrics():
+        """Prometheus文本格式的监控指标"""
+        expected = f"Bearer {current_app.config['METRICS_TOKEN']}"
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected.encode()):
+            abort(401)
+        return Response(generate_latest(_metrics_registry()), mimetype=CONTENT_TYPE_LATEST)
+
+    if not app.config.get('METRICS_TOKEN'):
+        logger.warning("未配置METRICS_TOKEN，/metrics端点未启用")
+        return
+    app.add_url_rule('/metrics', 'metrics', metrics)
@@ -0,0 +1,244 @@
+"""
+推广数据按月分区（仅PostgreSQL，可选）
+promotion_data 按 date 列做声明式范围分区，每月一个分区，另有一个默认分区接收超出范围的数据。
+分区后主键为 (id, date)，唯一约束 _material_date_uc (material_id, date) 保持不变，
+按日期筛选的查询只扫描相关月份的分区。
+
+已有数据通过 flask partition-promotion-data 迁移；之后由定时任务提前创建未来月份的分区
+"""
+
+from datetime import date
+from sqlalchemy import text
+from app import db
+from app.utils.db_pool import disable_statement_timeout
+import logging
+
+# 创建日志记录器
+logger = logging.getLogger(__name__)
+
+TABLE = 'promotion_data'
+DEFAULT_PARTITION = 'promotion_data_default'
+LEGACY_TABLE = 'promotion_data_legacy'
+
+# 创建分区与迁移时使用的事务级咨询锁，避免调度器与命令同时执行
+_LOCK_KEY = 'promotion_data_partitions'
+
+class PartitioningError(RuntimeError):
+    """当前数据库不支持或不需要执行分区操作"""
+
+def month_start(day):
+    return day.replace(day=1)
+
+def add_months(day, months):
+    year, month = divmod(day.month - 1 + months, 12)
+    return date(day.year + year, month + 1, 1)
+
+def partition_name(month):
+    """分区表名，如 promotion_data_p202406"""
+    return f'{TABLE}_p{month:%Y%m}'
+
+def is_partitioned(connection):
+    """promotion_data 是否为分区表"""
+    if connection.dialect.name != 'postgresql':
+        return False
+    return connection.execute(
+        text('SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:name))'),
+        {'name': TABLE}
+    ).scalar()
+
+def existing_partitions(connection):
+    """已有的分区表名"""
+    return set(connection.execute(
+        text('SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+             'WHERE i.inhparent = to_regclass(:name)'),
+        {'name': TABLE}
+    ).scalars())
+
+def _lock(connection):
+    connection.execute(text('SELECT pg_advisory_xact_lock(hashtext(:key))'), {'key': _LOCK_KEY})
+
+def _create_partition(connection, month, has_default):
+    """
+    创建一个月的分区
+    默认分区中已有该月数据时，先把数据移入新表再挂载为分区（PostgreSQL不允许直接创建与默认分区数据重叠的分区）
+    """
+    name = partition_name(month)
+    lower, upper = month.isoformat(), add_months(month, 1).isoformat()
+    bounds = f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+
+    moved = 0
+    if has_default:
+        moved = connection.execute(
+            text(f'SELECT count(*) FROM {DEFAULT_PARTITION} WHERE date >= :lower AND date < :upper'),
+            {'lower': lower, 'upper': upper}
+        ).scalar()
+
+    if not moved:
+        connection.execute(text(f'CREATE TABLE {name} PARTITION OF {TABLE} {bounds}'))
+        return 0
+
+    connection.execute(text(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+    connection.execute(
+        text(f'INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} WHERE date >= :lower AND date < :upper'),
+        {'lower': lower, 'upper': upper}
+    )
+    connection.execute(
+        text(f'DELETE FROM {DEFAULT_PARTITION} WHERE date >= :lower AND date < :upper'),
+        {'lower': lower, 'upper': upper}
+    )
+    connection.execute(text(f'ALTER TABLE {TABLE} ATTACH PARTITION {name} {bounds}'))
+    return moved
+
+def ensure_partitions(connection, first_month, last_month):
+    """
+    确保 first_month 到 last_month（含）每个月都有分区，在调用方的事务中执行
+
+    Returns:
+        list: 新建的分区名
+    """
+    existing = existing_partitions(connection)
+    has_default = DEFAULT_PARTITION in existing
+    created = []
+    month = month_start(first_month)
+    while month <= last_month:
+        name = partition_name(month)
+        if name not in existing:
+            moved = _create_partition(connection, month, has_default)
+            created.append(name)
+            logger.info(f"已创建推广数据分区 {name}" + (f"，从默认分区移入 {moved} 条数据" if moved else ''))
+        month = add_months(month, 1)
+    return created
+
+def create_future_partitions(months_ahead=3):
+    """
+    为当前月及之后 months_ahead 个月创建分区，promotion_data 未分区时不执行
+
+    Returns:
+        list: 新建的分区名
+    """
+    with db.engine.begin() as connection:
+        if not is_partitioned(connection):
+            return []
+        _lock(connection)
+        today = date.today()
+        return ensure_partitions(connection, month_start(today), add_months(today, months_ahead))
+
+def migrate_to_partitioned(months_ahead=3, keep_legacy=False):
+    """
+    将现有的 promotion_data 表迁移为按月分区表，在一个事务中完成
+
+    步骤：原表改名为 promotion_data_legacy，按原表结构创建分区表并复制外键与普通索引，
+    为已有数据的每个月及未来 months_ahead 个月创建分区与默认分区，复制数据并校验行数。
+    迁移期间原表被锁定，应在停止写入后执行
+
+    Args:
+        months_ahead: 预先创建的未来月份数
+        keep_legacy: 是否保留原表（默认校验通过后删除）
+
+    Returns:
+        dict: 迁移的行数与新建的分区
+    """
+    with db.engine.begin() as connection:
+        if connection.dialect.name != 'postgresql':
+            raise PartitioningError('仅PostgreSQL支持推广数据分区')
+        disable_statement_timeout(connection)
+        if is_partitioned(connection):
+            raise PartitioningError('promotion_data 已经是分区表')
+        _lock(connection)
+        if connection.execute(text('SELECT to_regclass(:name)'), {'name': LEGACY_TABLE}).scalar():
+            raise PartitioningError(f'{LEGACY_TABLE} 已存在，请确认上次迁移的结果后删除')
+
+        connection.execute(text(f'LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE'))
+        first_date, last_date, row_count = connection.execute(
+            text(f'SELECT min(date), max(date), count(*) FROM {TABLE}')
+        ).one()
+        sequence = connection.execute(text(f"SELECT pg_get_serial_sequence('{TABLE}', 'id')")).scalar()
+        foreign_keys = connection.execute(
+            text("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                 "WHERE conrelid = to_regclass(:name) AND contype = 'f'"),
+            {'name': TABLE}
+        ).all()
+        indexes = connection.execute(
+            text('SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+                 'WHERE i.indrelid = to_regclass(:name)'),
+            {'name': TABLE}
+        ).scalars().all()
+        # 不属于约束的普通索引（如update_time索引）在分区表上按原定义重建
+        index_definitions = connection.execute(
+            text('SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i '
+                 'WHERE i.indrelid = to_regclass(:name) AND NOT i.indisunique '
+                 'AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)'),
+            {'name': TABLE}
+        ).scalars().all()
+
+        # 原表及其索引改名（主键与唯一约束随索引一起改名），释放名称给分区表使用
+        quote = connection.dialect.identifier_preparer.quote
+        connection.execute(text(f'ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}'))
+        for index in indexes:
+            connection.execute(text(f'ALTER INDEX {quote(index)} RENAME TO {quote(index + "_legacy")}'))
+
+        # 分区表的主键与唯一约束必须包含分区键
+        connection.execute(text(
+            f'CREATE TABLE {TABLE} (LIKE {LEGACY_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE (date)'
+        ))
+        connection.execute(text(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, date)'))
+        connection.execute(text(f'ALTER TABLE {TABLE} ADD CONSTRAINT _material_date_uc UNIQUE (material_id, date)'))
+        connection.execute(text(f'CREATE INDEX ix_{TABLE}_date ON {TABLE} (date)'))
+        for definition in index_definitions:
+            connection.execute(text(definition))
+        for name, definition in foreign_keys:
+            connection.execute(text(f'ALTER TABLE {TABLE} ADD CONSTRAINT {quote(name)} {definition}'))
+        if sequence:
+            # 序列归属新表，删除原表时不会被一并删除
+            connection.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY {TABLE}.id'))
+
+        today = date.today()
+        last_month = max(add_months(today, months_ahead), month_start(last_date) if last_date else today)
+        created = ensure_partitions(connection, first_date or today, last_month)
+        connection.execute(text(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT'))
+
+        connection.execute(text(f'INSERT INTO {TABLE} SELECT * FROM {LEGACY_TABLE}'))
+        copied = connection.execute(text(f'SELECT count(*) FROM {TABLE}')).scalar()
+        if copied != row_count:
+            raise PartitioningError(f'数据复制不完整：原表 {row_count} 条，分区表 {copied} 条')
+
+        if not keep_legacy:
+            connection.execute(text(f'DROP TABLE {LEGACY_TABLE}'))
+        connection.execute(text(f'ANALYZE {TABLE}'))
+
+    logger.info(f"promotion_data 已迁移为分区表：{row_count} 条数据，{len(created)} 个月度分区")
+    return {'rows': row_count, 'partitions': created, 'legacy_table': LEGACY_TABLE if keep_legacy else None}
+
+def init_partitions(app):
+    """
+    注册分区相关命令
+
+    Args:
+        app: Flask应用实例
+    """
+    import click
+
+    @app.cli.command('partition-promotion-data')
+    @click.option('--months-ahead', default=None, type=int, help='预先创建的未来月份数')
+    @click.option('--keep-legacy', is_flag=True, help='保留迁移前的原表 promotion_data_legacy')
+    def partition_promotion_data_command(months_ahead, keep_legacy):
+        """将promotion_data迁移为按月分区表（仅PostgreSQL）"""
+        if months_ahead is None:
+            months_ahead = app.config.get('PROMOTION_PARTITION_MONTHS_AHEAD', 3)
+        try:
+            result = migrate_to_partitioned(months_ahead, keep_legacy)
+        except PartitioningError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"已迁移 {result['rows']} 条数据，创建 {len(result['partitions'])} 个月度分区")
+        if result['legacy_table']:
+            click.echo(f"原表保留为 {result['legacy_table']}，确认无误后可手动删除")
+
+    @app.cli.command('create-promotion-partitions')
+    @click.option('--months-ahead', default=None, type=int, help='预先创建的未来月份数')
+    def create_promotion_partitions_command(months_ahead):
+        """创建未来月份的推广数据分区"""
+        if months_ahead is None:
+            months_ahead = app.config.get('PROMOTION_PARTITION_MONTHS_AHEAD', 3)
+        created = create_future_partitions(months_ahead)
+        click.echo(f"新建分区：{', '.join(created)}" if created else '没有需要创建的分区')
@@ -0,0 +1,68 @@
+"""
+密码哈希
+统一使用bcrypt存储密码，计算成本由BCRYPT_LOG_ROUNDS配置；
+兼容旧版本通过werkzeug生成的哈希，登录成功时自动按当前参数重新哈希
+"""
+
+from flask import current_app
+from werkzeug.security import check_password_hash
+from app import bcrypt
+
+# bcrypt哈希前缀，如 $2b$12$...
+BCRYPT_PREFIXES = ('$2a$', '$2b$', '$2y$')
+
+def _rounds():
+    return current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
+
+def _is_bcrypt(password_hash):
+    return password_hash.startswith(BCRYPT_PREFIXES)
+
+def hash_password(password):
+    """
+    按当前配置的计算成本生成bcrypt哈希
+
+    Args:
+        password: 明文密码
+
+    Returns:
+        str: 密码哈希
+    """
+    return bcrypt.generate_password_hash(password, _rounds()).decode('utf-8')
+
+def verify_password(password_hash, password):
+    """
+    校验密码，支持bcrypt与werkzeug两种格式的哈希
+
+    Args:
+        password_hash: 存储的密码哈希
+        password: 明文密码
+
+    Returns:
+        bool: 密码是否正确
+    """
+    if not password_hash or not password:
+        return False
+    if _is_bcrypt(password_hash):
+        return bcrypt.check_password_hash(password_hash, password)
+    try:
+        return check_password_hash(password_hash, password)
+    except ValueError:
+        # 无法识别的哈希格式
+        return False
+
+def needs_rehash(password_hash):
+    """
+    判断哈希是否需要按当前参数重新生成（非bcrypt格式或计算成本与配置不同）
+
+    Args:
+        password_hash: 存储的密码哈希
+
+    Returns:
+        bool: 是否需要重新哈希
+    """
+    if not _is_bcrypt(password_hash):
+        return True
+    try:
+        return int(password_hash.split('$')[2]) != _rounds()
+    except (IndexError, ValueError):
+        return True
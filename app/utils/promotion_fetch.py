@@ -0,0 +1,257 @@
+"""
+推广数据获取任务
+调用抖音API获取素材的推广数据并写入数据库，由后台任务队列执行。
+支持指定多个素材、某个达人的全部素材或带有某个标签的全部素材；
+API调用以有限并发执行，结果在一个事务中批量upsert
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import tuple_
+from app import db
+from app.models import Influencer, Material, MaterialTag, PromotionData
+from app.utils.jobs import job_handler
+import logging
+
+# 创建日志记录器
+logger = logging.getLogger(__name__)
+
+# 每条upsert语句包含的行数（受SQLite绑定参数数量限制）
+UPSERT_CHUNK_SIZE = 1000
+
+# upsert时更新的字段
+UPSERT_UPDATE_COLUMNS = ('cost', 'sales_amount', 'revenue', 'roi', 'update_time')
+
+class FetchTargetError(ValueError):
+    """获取目标无效（如达人或标签不存在）"""
+
+def resolve_materials(params):
+    """
+    根据任务参数确定需要获取的素材
+
+    参数（三选一）：
+        material_ids: 素材主键ID列表
+        influencer_id: 达人ID，通过API获取该达人的全部素材ID，只处理已录入系统的素材
+        tag: 素材标签名称
+
+    Returns:
+        tuple: (素材列表, API返回但系统中不存在的素材ID列表)
+    """
+    from app.api.client import douyin_client
+
+    if params.get('influencer_id'):
+        influencer = db.session.get(Influencer, params['influencer_id'])
+        if influencer is None:
+            raise FetchTargetError(f"达人不存在: {params['influencer_id']}")
+        remote_ids = douyin_client.fetch_all_material_ids(influencer.uid) or []
+        materials = Material.query.filter(Material.material_id.in_(remote_ids)).all() if remote_ids else []
+        # 系统中已录入但API未返回的素材同样获取
+        known = {material.material_id for material in materials}
+        materials += [material for material in Material.query.filter_by(influencer_id=influencer.id)
+                      if material.material_id not in known]
+        unknown = sorted(set(remote_ids) - {material.material_id for material in materials})
+        return sorted(materials, key=lambda material: material.id), unknown
+
+    if params.get('tag'):
+        tag = MaterialTag.query.filter_by(name=params['tag']).first()
+        if tag is None:
+            raise FetchTargetError(f"素材标签不存在: {params['tag']}")
+        return Material.query.filter(Material.tags.any(MaterialTag.id == tag.id)).order_by(Material.id).all(), []
+
+    material_ids = params.get('material_ids') or []
+    if not material_ids:
+        return [], []
+    return Material.query.filter(Material.id.in_(material_ids)).order_by(Material.id).all(), []
+
+def _promotion_values(material, row, user_id, now):
+    """将API返回的一行推广数据转换为promotion_data表的字段"""
+    day = datetime.strptime(row['date'], '%Y-%m-%d').date()
+    sales_amount = Decimal(str(row['sales_amount']))
+    return {
+        'name': f'{material.title or material.material_id} {day.isoformat()}',
+        'influencer_id': material.influencer_id,
+        'material_id': material.id,
+        'date': day,
+        'cost': Decimal(str(row['cost'])),
+        'sales_amount': sales_amount,
+        'revenue': sales_amount,
+        'roi': row.get('roi'),
+        'created_by_id': user_id,
+        'created_by': user_id,
+        'create_time': now,
+        'update_time': now,
+    }
+
+def _upsert_statement(dialect_name, update_columns):
+    table = PromotionData.__table__
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    statement = insert(table)
+    return statement.on_conflict_do_update(
+        index_elements=['material_id', 'date'],
+        set_={column: statement.excluded[column] for column in update_columns},
+    )
+
+def existing_promotion_keys(keys):
+    """
+    查询已存在的 (material_id, date)
+
+    Args:
+        keys: (素材主键ID, 日期) 列表
+
+    Returns:
+        set: 已存在的键
+    """
+    existing = set()
+    for start in range(0, len(keys), UPSERT_CHUNK_SIZE):
+        existing.update(
+            tuple(row) for row in db.session.query(PromotionData.material_id, PromotionData.date)
+            .filter(tuple_(PromotionData.material_id, PromotionData.date).in_(keys[start:start + UPSERT_CHUNK_SIZE]))
+        )
+    return existing
+
+def bulk_upsert_promotion_rows(rows, update_columns=UPSERT_UPDATE_COLUMNS, existing=None):
+    """
+    批量upsert推广数据，在当前事务中执行，不提交
+    PostgreSQL与SQLite使用 INSERT ... ON CONFLICT DO UPDATE 按批executemany；
+    其他数据库先查询已存在的键，新行批量插入、已存在的行逐条更新
+
+    Args:
+        rows: 字段相同的字典列表，(material_id, date) 不能重复
+        update_columns: 冲突时更新的字段
+        existing: 已知的已存在键集合（可选，仅非PostgreSQL/SQLite时使用）
+    """
+    if not rows:
+        return
+    dialect_name = db.session.get_bind(mapper=PromotionData).dialect.name
+    if dialect_name in ('postgresql', 'sqlite'):
+        statement = _upsert_statement(dialect_name, update_columns)
+        for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            db.session.execute(statement, rows[start:start + UPSERT_CHUNK_SIZE])
+        return
+
+    if existing is None:
+        existing = existing_promotion_keys([(row['material_id'], row['date']) for row in rows])
+    new_rows = [row for row in rows if (row['material_id'], row['date']) not in existing]
+    if new_rows:
+        db.session.execute(PromotionData.__table__.insert(), new_rows)
+    for row in rows:
+        if (row['material_id'], row['date']) in existing:
+            db.session.query(PromotionData).filter_by(material_id=row['material_id'], date=row['date']) \
+                .update({column: row[column] for column in update_columns}, synchronize_session=False)
+
+def upsert_promotion_rows(values):
+    """
+    批量写入推广数据，(material_id, date) 已存在时更新金额字段
+
+    Args:
+        values: _promotion_values生成的字典列表
+
+    Returns:
+        set: 写入前已存在的 (material_id, date) 集合，用于区分新增与更新
+    """
+    if not values:
+        return set()
+
+    # 同一批数据中的重复日期以最后一条为准
+    deduplicated = {(item['material_id'], item['date']): item for item in values}
+    existing = existing_promotion_keys(list(deduplicated))
+    bulk_upsert_promotion_rows(list(deduplicated.values()), existing=existing)
+    return existing
+
+def fetch_promotion_rows(materials, date_range, concurrency, on_done=None):
+    """
+    以有限并发调用API获取多个素材的推广数据（线程中只调用API，不访问数据库）
+
+    Args:
+        materials: 素材列表
+        date_range: 日期范围
+        concurrency: 最大并发数
+        on_done: 每个素材完成时的回调 on_done(material, rows, error)
+
+    Returns:
+        dict: {素材主键ID: (推广数据列表, 错误信息)}
+    """
+    from app.api.client import douyin_client
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+        futures = {
+            executor.submit(douyin_client.get_promotion_data, material.material_id, date_range): material
+            for material in materials
+        }
+        for future in as_completed(futures):
+            material = futures[future]
+            try:
+                rows, error = future.result() or [], None
+            except Exception as e:
+                rows, error = [], str(e)
+            results[material.id] = (rows, error)
+            if on_done is not None:
+                on_done(material, rows, error)
+    return results
+
+@job_handler('promotion_fetch')
+def fetch_promotion_data_job(params, progress):
+    """
+    获取一批素材的推广数据
+
+    参数：
+        material_ids / influencer_id / tag: 获取目标，见resolve_materials
+        start_date / end_date: 日期范围（可选）
+        user_id: 提交任务的用户ID
+
+    Returns:
+        dict: 汇总数据与每个素材的获取结果
+    """
+    date_range = None
+    if params.get('start_date') and params.get('end_date'):
+        date_range = (params['start_date'], params['end_date'])
+    user_id = params.get('user_id')
+
+    materials, unknown = resolve_materials(params)
+    progress.update(total=len(materials))
+
+    fetched = fetch_promotion_rows(
+        materials, date_range, current_app.config.get('PROMOTION_FETCH_CONCURRENCY', 4),
+        on_done=lambda material, rows, error: progress.update(processed=1, fetched=len(rows))
+    )
+
+    now = datetime.utcnow()
+    summaries = []
+    values = []
+    for material in materials:
+        rows, error = fetched[material.id]
+        summary = {'id': material.id, 'material_id': material.material_id, 'title': material.title,
+                   'fetched': len(rows), 'inserted': 0, 'updated': 0, 'error': error}
+        try:
+            values.extend(_promotion_values(material, row, user_id, now) for row in rows)
+        except (KeyError, ValueError) as e:
+            summary['error'] = f'数据格式错误: {e}'
+            summary['fetched'] = 0
+            values = [item for item in values if item['material_id'] != material.id]
+        summaries.append(summary)
+
+    # 所有素材的数据在一个事务中写入
+    existing = upsert_promotion_rows(values)
+    db.session.commit()
+
+    by_id = {summary['id']: summary for summary in summaries}
+    for key in {(item['material_id'], item['date']) for item in values}:
+        by_id[key[0]]['updated' if key in existing else 'inserted'] += 1
+    saved_count = sum(summary['inserted'] + summary['updated'] for summary in summaries)
+    progress.update(saved=saved_count)
+
+    return {
+        'material_count': len(materials),
+        'fetched_count': sum(summary['fetched'] for summary in summaries),
+        'inserted_count': sum(summary['inserted'] for summary in summaries),
+        'updated_count': sum(summary['updated'] for summary in summaries),
+        'failed_count': sum(1 for summary in summaries if summary['error']),
+        'unknown_material_ids': unknown,
+        'materials': summaries,
+    }
@@ -0,0 +1,296 @@
+"""
+查询结果缓存
+缓存报表、仪表盘统计等开销较大的只读查询函数的结果。键由函数名、参数与当前用户的角色范围组成，
+并包含函数依赖的各表的版本号：写入数据后版本号增加，旧结果不再命中，随容量淘汰或过期。
+
+版本号按表维护三种计数：
+    all        该表任意写入时增加
+    owner:<id> 该用户创建的数据被逐行写入（ORM的after_insert/after_update/after_delete）时增加
+    epoch      批量写入（session.execute执行的INSERT/UPDATE/DELETE）时增加，无法确定涉及哪些用户
+按用户限定范围的查询（scope_arg参数非空）只依赖 epoch 与该用户的 owner 计数，其他用户的写入不会使其失效。
+
+版本号保存在 data_versions 表（名称前缀 query:）中，在写入数据的同一事务中增加，
+所有进程（gunicorn worker、后台任务worker、调度器）看到的版本号一致；提交前读到的旧数据不会以新版本号写入缓存。
+被缓存的函数与版本号都从主库读取，副本库的复制延迟不会把旧数据写入新版本号的缓存。
+
+默认使用进程内LRU缓存结果；配置QUERY_CACHE_URL（redis://）后结果以JSON保存在Redis中，多个进程共享
+"""
+
+import hashlib
+import inspect
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import has_request_context
+from sqlalchemy import event, inspect as inspect_instance
+from sqlalchemy.orm import Session, object_session
+from app import db
+from app.utils.data_versions import bump_versions, read_versions
+from app.utils.metrics import QUERY_CACHE_REQUESTS
+from app.utils.replica import primary_reads
+import logging
+
+# 创建日志记录器
+logger = logging.getLogger(__name__)
+
+# 提交时需要增加的版本号，保存在session.info中
+_PENDING_KEY = 'query_cache_pending'
+
+# 版本号在 data_versions 表中的名称前缀
+VERSION_PREFIX = 'query:'
+
+class LRUBackend:
+    """进程内缓存，带过期时间和容量上限"""
+
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return False, None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._items[key]
+                return False, None
+            self._items.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._items[key] = (time.monotonic() + ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+class RedisBackend:
+    """Redis共享缓存，结果以JSON序列化"""
+
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self.client.get(key)
+        if value is None:
+            return False, None
+        return True, json.loads(value)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, json.dumps(value, ensure_ascii=False), ex=max(int(ttl), 1))
+
+    def clear(self):
+        for key in self.client.scan_iter('ddkol:query_cache:*'):
+            self.client.delete(key)
+
+class QueryCache:
+    """查询结果缓存，后端与参数由init_query_cache按配置设置"""
+
+    def __init__(self):
+        self.backend = LRUBackend()
+        self.ttl = 300
+        # 参与版本号管理的表名
+        self.tracked_tables = set()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def get(self, key):
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            logger.error(f"读取查询缓存失败: {str(e)}")
+            return False, None
+
+    def set(self, key, value):
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            logger.error(f"写入查询缓存失败: {str(e)}")
+
+    def generations(self, names):
+        """从主库读取已提交的版本号"""
+        versions = read_versions(VERSION_PREFIX + name for name in names)
+        return [versions[VERSION_PREFIX + name] for name in names]
+
+    def bump(self, connection, names):
+        """在connection当前的事务中增加版本号，随事务一起提交"""
+        bump_versions(connection, (VERSION_PREFIX + name for name in names))
+
+    def clear(self):
+        self.backend.clear()
+
+# 查询结果缓存（后端与参数由init_query_cache按配置设置）
+query_cache = QueryCache()
+
+def _role_scope():
+    """当前用户的角色范围：商务用户按用户区分，投手共享，请求之外（任务、命令）为system"""
+    if not has_request_context():
+        return 'system'
+    from flask_login import current_user
+
+    if not current_user.is_authenticated:
+        return 'anonymous'
+    if current_user.is_business():
+        return f'business:{current_user.id}'
+    return current_user.role
+
+def _table_name(model):
+    return model.__table__.name
+
+def cached_query(models, related=(), scope_arg=None):
+    """
+    缓存只读查询函数的结果
+
+    Args:
+        models: 函数读取的模型；scope_arg非空时这些表的数据按创建者筛选
+        related: 函数关联读取但不按创建者筛选的模型（如联表取达人ID的素材表）
+        scope_arg: 表示数据创建者（created_by_id）的参数名，参数值非空时只依赖该用户的写入
+
+    返回值会被多个请求共享，调用方不能修改；返回值需可JSON序列化（使用Redis时以JSON保存）
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        name = f'{func.__module__}.{func.__qualname__}'
+
+        def cached(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            owner = bound.arguments.get(scope_arg) if scope_arg else None
+            if owner is not None:
+                versions = [f'{_table_name(model)}:epoch' for model in models] + \
+                           [f'{_table_name(model)}:owner:{owner}' for model in models]
+            else:
+                versions = [f'{_table_name(model)}:all' for model in models]
+            versions += [f'{_table_name(model)}:all' for model in related]
+
+            try:
+                generations = query_cache.generations(versions)
+            except Exception as e:
+                logger.error(f"读取查询缓存版本号失败: {str(e)}")
+                return func(*args, **kwargs)
+
+            payload = json.dumps([bound.arguments, dict(zip(versions, generations))], sort_keys=True, default=str)
+            key = f'ddkol:query_cache:{name}:{_role_scope()}:{hashlib.sha1(payload.encode()).hexdigest()}'
+            hit, value = query_cache.get(key)
+            QUERY_CACHE_REQUESTS.labels(function=func.__name__, result='hit' if hit else 'miss').inc()
+            if hit:
+                return value
+            value = func(*args, **kwargs)
+            query_cache.set(key, value)
+            return value
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            # 未启用，或当前会话有尚未提交的写入（缓存中是写入前的结果）时直接查询
+            if not query_cache.enabled or db.session.info.get(_PENDING_KEY):
+                return func(*args, **kwargs)
+            # 副本库可能尚未同步到版本号对应的写入，查询与版本号都使用主库
+            with primary_reads():
+                return cached(*args, **kwargs)
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+def invalidate(*models, connection=None):
+    """
+    使依赖这些表的全部缓存失效
+    通过 db.engine 的连接直接写入数据（不经过会话）时需要调用，传入该连接使版本号随写入一起提交
+
+    Args:
+        models: 写入的模型
+        connection: 写入数据的连接（可选，默认单独提交）
+    """
+    names = set()
+    for model in models:
+        table = _table_name(model)
+        names.update((f'{table}:all', f'{table}:epoch'))
+    if connection is not None:
+        query_cache.bump(connection, names)
+        return
+    with db.engine.begin() as connection:
+        query_cache.bump(connection, names)
+
+def _pending(session):
+    return session.info.setdefault(_PENDING_KEY, set())
+
+def _record_row_change(mapper, connection, target):
+    """逐行写入：记录该表与数据创建者（包括修改前的创建者）的版本号"""
+    session = object_session(target)
+    table = mapper.local_table.name
+    owners = {getattr(target, 'created_by_id', None)}
+    if 'created_by_id' in mapper.attrs:
+        owners.update(inspect_instance(target).attrs.created_by_id.history.deleted or ())
+    names = {f'{table}:all'} | {f'{table}:owner:{owner}' for owner in owners if owner is not None}
+    if session is None:
+        query_cache.bump(connection, names)
+    else:
+        _pending(session).update(names)
+
+def _record_row_update(mapper, connection, target):
+    """
+    逐行更新：只有列值实际变化时才记录
+    只改变关联集合（如添加标签、追加推广数据）的对象也会触发after_update，但没有写入该表，
+    不记录可以避免无关的版本号行被加锁
+    """
+    state = inspect_instance(target)
+    if any(state.attrs[attr.key].history.has_changes() for attr in mapper.column_attrs):
+        _record_row_change(mapper, connection, target)
+
+def _record_bulk_change(orm_execute_state):
+    """session.execute执行的批量写入：无法确定涉及的用户，增加整表版本号"""
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement.table, 'name', None)
+    if table in query_cache.tracked_tables:
+        _pending(orm_execute_state.session).update((f'{table}:all', f'{table}:epoch'))
+
+def _bump_pending(session):
+    """提交前在同一事务中增加记录的版本号"""
+    # 先flush，使提交时才写入的变更也被记录
+    session.flush()
+    names = session.info.pop(_PENDING_KEY, None)
+    if names:
+        query_cache.bump(session.connection(), names)
+
+def _discard_pending(session):
+    """事务回滚时丢弃记录的版本号"""
+    session.info.pop(_PENDING_KEY, None)
+
+def init_query_cache(app):
+    """
+    根据配置设置查询缓存并注册写入事件
+
+    Args:
+        app: Flask应用实例
+    """
+    from app.models import Influencer, Material, PromotionArchive, PromotionData
+
+    url = app.config.get('QUERY_CACHE_URL')
+    query_cache.backend = RedisBackend(url) if url else LRUBackend(app.config.get('QUERY_CACHE_SIZE', 512))
+    query_cache.ttl = app.config.get('QUERY_CACHE_TTL', 300)
+
+    models = (PromotionData, Material, Influencer, PromotionArchive)
+    query_cache.tracked_tables = {_table_name(model) for model in models}
+    for model in models:
+        for event_name, listener in (('after_insert', _record_row_change), ('after_update', _record_row_update),
+                                     ('after_delete', _record_row_change)):
+            if not event.contains(model, event_name, listener):
+                event.listen(model, event_name, listener)
+    if not event.contains(Session, 'do_orm_execute', _record_bulk_change):
+        event.listen(Session, 'do_orm_execute', _record_bulk_change)
+    if not event.contains(Session, 'before_commit', _bump_pending):
+        event.listen(Session, 'before_commit', _bump_pending)
+        event.listen(Session, 'after_rollback', _discard_pending)
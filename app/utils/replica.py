@@ -0,0 +1,155 @@
+"""
+只读副本路由
+为只读视图把查询路由到可选的副本库（SQLALCHEMY_BINDS中的replica），
+写操作、发生过写入的会话以及刚写入数据的用户请求始终使用主库
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.sql.dml import UpdateBase
+import logging
+
+# 创建日志记录器
+logger = logging.getLogger(__name__)
+
+# 副本库在SQLALCHEMY_BINDS中的键名
+REPLICA_BIND_KEY = 'replica'
+
+# 不同数据库的复制延迟查询（秒），返回NULL视为无延迟
+LAG_QUERIES = {
+    'postgresql': 'SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())',
+}
+
+# 用户写入后在此时间点之前的请求都走主库（存放在Flask session中）
+_PRIMARY_UNTIL_KEY = '_primary_until'
+
+# 副本健康状态缓存
+_lag_state = {'checked_at': 0.0, 'healthy': False, 'lag': None}
+_lag_lock = threading.Lock()
+
+class RoutingSession(Session):
+    """根据请求上下文选择主库或副本库的会话"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_replica(clause):
+            replica = self._db.engines.get(REPLICA_BIND_KEY)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self, clause):
+        if not has_request_context() or not g.get('_replica_reads'):
+            return False
+        # 写语句、flush过程以及本会话已写入之后的读取都走主库
+        if self._flushing or self.info.get('has_writes'):
+            return False
+        if isinstance(clause, UpdateBase):
+            return False
+        return True
+
+def _measure_lag(engine):
+    """查询副本复制延迟（秒），不支持的数据库返回None"""
+    query = current_app.config.get('REPLICA_LAG_QUERY') or LAG_QUERIES.get(engine.dialect.name)
+    if not query:
+        return None
+    with engine.connect() as connection:
+        lag = connection.execute(text(query)).scalar()
+    return float(lag) if lag is not None else None
+
+def replica_available():
+    """
+    判断副本库当前是否可用
+    复制延迟超过REPLICA_MAX_LAG或检查失败时回退到主库，检查结果按REPLICA_LAG_CHECK_INTERVAL缓存
+    """
+    from app import db
+
+    engine = db.engines.get(REPLICA_BIND_KEY)
+    if engine is None:
+        return False
+
+    interval = current_app.config.get('REPLICA_LAG_CHECK_INTERVAL', 5)
+    now = time.monotonic()
+    if now - _lag_state['checked_at'] < interval:
+        return _lag_state['healthy']
+
+    with _lag_lock:
+        if now - _lag_state['checked_at'] < interval:
+            return _lag_state['healthy']
+        try:
+            lag = _measure_lag(engine)
+            healthy = lag is None or lag <= current_app.config.get('REPLICA_MAX_LAG', 5)
+            if not healthy:
+                logger.warning(f"副本库复制延迟 {lag:.1f}s 超过阈值，读取回退到主库")
+        except Exception as e:
+            lag = None
+            healthy = False
+            logger.warning(f"副本库延迟检查失败，读取回退到主库: {str(e)}")
+        _lag_state.update(checked_at=now, healthy=healthy, lag=lag)
+    return healthy
+
+def read_replica(view):
+    """
+    只读视图装饰器：允许本次请求的查询使用副本库
+    用户最近写入过数据时（读己之写）仍使用主库
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        primary_until = flask_session.get(_PRIMARY_UNTIL_KEY, 0)
+        g._replica_reads = time.time() >= primary_until and replica_available()
+        return view(*args, **kwargs)
+    return wrapper
+
+@contextmanager
+def primary_reads():
+    """在代码块内的查询使用主库（如结果会被缓存、必须与已提交的写入一致的查询）"""
+    if not has_request_context():
+        yield
+        return
+    previous = g.get('_replica_reads')
+    g._replica_reads = False
+    try:
+        yield
+    finally:
+        g._replica_reads = previous
+
+def _mark_writes(session, flush_context):
+    """flush写入数据后，本会话后续读取都走主库（会话在请求结束时销毁）"""
+    session.info['has_writes'] = True
+
+def _pin_to_primary(session):
+    """提交了写入的请求，在粘滞时间内将该用户的后续请求固定到主库"""
+    if not session.info.get('has_writes') or not has_request_context():
+        return
+    sticky_seconds = current_app.config.get('REPLICA_STICKY_SECONDS', 10)
+    flask_session[_PRIMARY_UNTIL_KEY] = time.time() + sticky_seconds
+
+def init_replica(app, db):
+    """
+    注册副本路由所需的事件与命令
+
+    Args:
+        app: Flask应用实例
+        db: SQLAlchemy扩展实例
+    """
+    import click
+
+    if not event.contains(db.session, 'after_flush', _mark_writes):
+        event.listen(db.session, 'after_flush', _mark_writes)
+        event.listen(db.session, 'after_commit', _pin_to_primary)
+
+    @app.cli.command('replica-status')
+    def replica_status_command():
+        """检查副本库配置与复制延迟"""
+        if REPLICA_BIND_KEY not in app.config.get('SQLALCHEMY_BINDS', {}):
+            click.echo("未配置副本库（REPLICA_DATABASE_URL），所有查询使用主库")
+            return
+        _lag_state['checked_at'] = 0.0
+        healthy = replica_available()
+        lag = _lag_state['lag']
+        click.echo(f"副本库状态: {'可用' if healthy else '不可用，回退主库'}，"
+              f"复制延迟: {'未知' if lag is None else f'{lag:.1f}s'}")
@@ -0,0 +1,114 @@
+"""
+推广数据报表查询
+报表同时读取 promotion_data 中的每日数据与 promotion_data_archive 中的周/月汇总数据（UNION ALL），
+压缩后的历史数据仍然计入统计。归档数据按汇总周期的第一天参与日期筛选。
+汇总结果通过查询缓存共享，数据写入后自动失效（见app/utils/query_cache.py）
+"""
+
+from sqlalchemy import func, literal, select, union_all
+from app import db
+from app.models import Influencer, Material, PromotionArchive, PromotionData
+from app.utils.query_cache import cached_query
+
+def promotion_tiers(start=None, end=None, created_by_id=None, material_ids=None):
+    """
+    合并每日数据与归档数据的子查询
+
+    列：material_id, day（日期或汇总周期的第一天）, exposure_count, click_count, conversion_count,
+        cost, sales_amount, tier（daily/week/month）
+
+    Args:
+        start: 开始日期（含，可选）
+        end: 结束日期（含，可选）
+        created_by_id: 只统计该用户创建的数据（可选）
+        material_ids: 只统计这些素材（素材主键ID列表或子查询，可选）
+    """
+    hot = select(
+        PromotionData.material_id.label('material_id'),
+        PromotionData.date.label('day'),
+        PromotionData.exposure_count.label('exposure_count'),
+        PromotionData.click_count.label('click_count'),
+        PromotionData.conversion_count.label('conversion_count'),
+        PromotionData.cost.label('cost'),
+        PromotionData.sales_amount.label('sales_amount'),
+        literal('daily').label('tier'),
+    )
+    archived = select(
+        PromotionArchive.material_id,
+        PromotionArchive.period_start,
+        PromotionArchive.exposure_count,
+        PromotionArchive.click_count,
+        PromotionArchive.conversion_count,
+        PromotionArchive.cost,
+        PromotionArchive.sales_amount,
+        PromotionArchive.period,
+    )
+    # 日期条件直接作用于 date 列，分区表可以只扫描相关分区
+    if start:
+        hot = hot.where(PromotionData.date >= start)
+        archived = archived.where(PromotionArchive.period_start >= start)
+    if end:
+        hot = hot.where(PromotionData.date <= end)
+        archived = archived.where(PromotionArchive.period_start <= end)
+    if created_by_id:
+        hot = hot.where(PromotionData.created_by_id == created_by_id)
+        archived = archived.where(PromotionArchive.created_by_id == created_by_id)
+    if material_ids is not None:
+        hot = hot.where(PromotionData.material_id.in_(material_ids))
+        archived = archived.where(PromotionArchive.material_id.in_(material_ids))
+    return union_all(hot, archived).subquery('promotion_tiers')
+
+def _totals(cost, sales_amount):
+    cost = float(cost or 0)
+    sales_amount = float(sales_amount or 0)
+    return {
+        'cost': round(cost, 2),
+        'sales_amount': round(sales_amount, 2),
+        'roi': round((sales_amount - cost) / cost, 4) if cost > 0 else None,
+    }
+
+@cached_query(models=(PromotionData, PromotionArchive), scope_arg='created_by_id')
+def totals_by_day(start=None, end=None, created_by_id=None):
+    """按日期汇总，归档数据以汇总周期为一行（tier标明粒度）"""
+    tiers = promotion_tiers(start, end, created_by_id)
+    rows = db.session.query(
+        tiers.c.day, tiers.c.tier, func.sum(tiers.c.cost), func.sum(tiers.c.sales_amount)
+    ).group_by(tiers.c.day, tiers.c.tier).order_by(tiers.c.day).all()
+    return [{'date': day.isoformat(), 'tier': tier, **_totals(cost, sales)} for day, tier, cost, sales in rows]
+
+@cached_query(models=(PromotionData, PromotionArchive), scope_arg='created_by_id')
+def totals_by_material(start=None, end=None, created_by_id=None, limit=50):
+    """按素材汇总，按销售额从高到低排序"""
+    tiers = promotion_tiers(start, end, created_by_id)
+    sales = func.sum(tiers.c.sales_amount)
+    rows = db.session.query(tiers.c.material_id, func.sum(tiers.c.cost), sales) \
+        .group_by(tiers.c.material_id).order_by(sales.desc()).limit(limit).all()
+    return [{'material_id': material_id, **_totals(cost, sales_amount)}
+            for material_id, cost, sales_amount in rows]
+
+@cached_query(models=(PromotionData, PromotionArchive), related=(Material,), scope_arg='created_by_id')
+def totals_by_influencer(start=None, end=None, created_by_id=None, limit=50):
+    """按达人汇总，按销售额从高到低排序"""
+    tiers = promotion_tiers(start, end, created_by_id)
+    sales = func.sum(tiers.c.sales_amount)
+    rows = db.session.query(Material.influencer_id, func.sum(tiers.c.cost), sales) \
+        .join(Material, Material.id == tiers.c.material_id) \
+        .group_by(Material.influencer_id).order_by(sales.desc()).limit(limit).all()
+    return [{'influencer_id': influencer_id, **_totals(cost, sales_amount)}
+            for influencer_id, cost, sales_amount in rows]
+
+@cached_query(models=(Influencer, Material, PromotionData), scope_arg='created_by_id')
+def creator_counts(created_by_id):
+    """用户创建的达人、素材与推广数据数量（仪表盘统计）"""
+    return {
+        'influencers_count': Influencer.query.filter_by(created_by_id=created_by_id).count(),
+        'materials_count': Material.query.filter_by(created_by_id=created_by_id).count(),
+        'promotions_count': PromotionData.query.filter_by(created_by_id=created_by_id).count(),
+    }
+
+# 报表分组方式 -> 查询函数
+REPORTS = {
+    'day': totals_by_day,
+    'material': totals_by_material,
+    'influencer': totals_by_influencer,
+}
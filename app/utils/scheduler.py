@@ -3,12 +3,18 @@
 用于设置自动调用API获取数据的任务
 """
 
+from apscheduler.events import EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+import atexit
+import time
 from app.api.client import douyin_client
 from app import db
-from app.models import Material, PromotionData, User
+from app.models import JobRun, Material, PromotionData, User
+from app.utils.metrics import observe_job
 import logging
 
 # 创建日志记录器
@@ -17,10 +23,14 @@ logger = logging.getLogger(__name__)
 # 创建调度器实例
 scheduler = BackgroundScheduler()
 
+@observe_job('fetch_latest_promotion_data')
 def fetch_latest_promotion_data():
     """
     定时获取最新的推广数据
     每天凌晨2点执行，获取前一天的推广数据
+    
+    Returns:
+        int: 写入的推广数据条数
     """
     try:
         logger.info("开始执行定时任务：获取最新推广数据")
@@ -37,7 +47,7 @@ def fetch_latest_promotion_data():
         pitcher_user = User.query.filter_by(role='pitcher').first()
         if not pitcher_user:
             logger.warning("未找到投手用户，无法保存推广数据")
-            return
+            return 0
         
         # 为每个素材获取推广数据
         saved_count = 0
@@ -75,26 +85,258 @@ def fetch_latest_promotion_data():
         # 提交所有更改
         db.session.commit()
         logger.info(f"定时任务完成：成功保存 {saved_count} 条推广数据")
+        return saved_count
         
     except Exception as e:
         db.session.rollback()
         logger.error(f"定时任务执行失败: {str(e)}")
+        raise
 
+@observe_job('fetch_all_materials_data')
 def fetch_all_materials_data():
     """
-    定时获取所有达人的素材数据
-    每周一凌晨3点执行
+    定时同步所有素材的互动数据（播放、点赞、评论、分享数）
+    每天凌晨3点执行，数值变化的素材写入快照并更新素材表
+    
+    Returns:
+        int: 写入的快照条数
     """
+    from app.utils.engagement import sync_material_stats
+    
     try:
-        logger.info("开始执行定时任务：获取达人素材数据")
-        
-        # 这里可以根据实际需求实现获取达人素材的逻辑
-        # 目前简化实现
-        
-        logger.info("定时任务完成：获取达人素材数据")
+        logger.info("开始执行定时任务：同步素材互动数据")
+        result = sync_material_stats()
+        logger.info(f"定时任务完成：同步 {result['materials']} 个素材，写入 {result['snapshots']} 条快照")
+        return result['snapshots']
         
     except Exception as e:
+        db.session.rollback()
         logger.error(f"定时任务执行失败: {str(e)}")
+        raise
+
+def _refresh_similarity_index(influencer_ids=None):
+    """
+    评分或指标更新后同步相似达人索引，influencer_ids为空时全量重建
+    索引更新失败不影响已提交的评分与指标，只记录错误
+    """
+    from app.utils.similarity import rebuild_similarity_index, update_similarity_index
+    
+    directory = current_app.config.get('SIMILARITY_INDEX_DIR', 'similarity')
+    try:
+        if influencer_ids is None:
+            rebuild_similarity_index(directory)
+        else:
+            update_similarity_index(directory, influencer_ids)
+    except Exception as e:
+        logger.error(f"更新相似达人索引失败: {str(e)}")
+
+@observe_job('compute_influencer_metrics')
+def compute_influencer_metrics():
+    """
+    批量计算达人的互动率、播放量增长率与等级内百分位
+    每天凌晨3点30分执行（在同步素材互动数据之后）
+    
+    Returns:
+        int: 计算的达人数
+    """
+    from app.utils.influencer_metrics import refresh_influencer_metrics
+    
+    count = refresh_influencer_metrics()
+    _refresh_similarity_index()
+    return count
+
+@observe_job('score_influencers')
+def score_influencers():
+    """
+    增量更新达人综合评分（只计算数据有变化的达人，每天第一次执行时全量重算）
+    每小时第15分钟执行
+    
+    Returns:
+        int: 计算的达人数
+    """
+    from app.utils.scoring import parse_weights, refresh_influencer_scores
+    
+    result = refresh_influencer_scores(
+        parse_weights(current_app.config.get('INFLUENCER_SCORE_WEIGHTS')),
+        current_app.config.get('INFLUENCER_SCORE_HALF_LIFE_DAYS', 30),
+    )
+    _refresh_similarity_index(None if result['full'] else result['influencer_ids'])
+    return result['influencers']
+
+@observe_job('forecast_materials')
+def forecast_materials():
+    """
+    预测全部活跃素材未来7天的花费与销售额
+    每天凌晨4点30分执行（在获取推广数据之后）
+    
+    Returns:
+        int: 预测的素材数
+    """
+    from app.utils.forecasting import refresh_material_forecasts
+    
+    return refresh_material_forecasts(
+        current_app.config.get('FORECAST_HISTORY_DAYS', 56),
+        current_app.config.get('FORECAST_WORKERS', 0),
+    )
+
+@observe_job('create_promotion_partitions')
+def create_promotion_partitions():
+    """
+    提前创建未来月份的推广数据分区
+    每天凌晨1点执行，promotion_data未分区时不做任何操作
+    
+    Returns:
+        int: 新建的分区数
+    """
+    from app.utils.partitions import create_future_partitions
+    
+    created = create_future_partitions(current_app.config.get('PROMOTION_PARTITION_MONTHS_AHEAD', 3))
+    if created:
+        logger.info(f"定时任务完成：新建推广数据分区 {', '.join(created)}")
+    return len(created)
+
+@observe_job('compact_promotion_data')
+def compact_old_promotion_data():
+    """
+    将超过保留期的每日推广数据汇总到归档表
+    每周日凌晨4点执行，未配置PROMOTION_RETENTION_DAYS时不执行
+    
+    Returns:
+        int: 压缩的每日数据条数
+    """
+    from app.utils.compaction import compact_promotion_data
+    
+    retention_days = current_app.config.get('PROMOTION_RETENTION_DAYS', 0)
+    if not retention_days:
+        return 0
+    result = compact_promotion_data(
+        retention_days,
+        period=current_app.config.get('PROMOTION_ARCHIVE_PERIOD', 'month'),
+        archive_dir=current_app.config.get('PROMOTION_ARCHIVE_DIR', 'archive'),
+    )
+    logger.info(f"定时任务完成：压缩 {result['cutoff']} 之前的推广数据 {result['rows']} 条")
+    return result['rows']
+
+# 定时任务定义：任务ID -> (名称, 任务函数名, 触发器参数)
+# 任务函数以文本引用保存到持久化任务存储中，因此这里只记录函数名
+SCHEDULED_JOBS = {
+    'fetch_daily_promotion_data': ('每日获取推广数据', 'fetch_latest_promotion_data',
+                                   {'hour': 2, 'minute': 0}),
+    'fetch_daily_materials_data': ('每日同步素材互动数据', 'fetch_all_materials_data',
+                                   {'hour': 3, 'minute': 0}),
+    'compute_influencer_metrics': ('计算达人指标', 'compute_influencer_metrics',
+                                   {'hour': 3, 'minute': 30}),
+    'score_influencers': ('更新达人综合评分', 'score_influencers', {'minute': 15}),
+    'forecast_materials': ('预测素材花费与销售额', 'forecast_materials', {'hour': 4, 'minute': 30}),
+    'create_promotion_partitions': ('创建推广数据分区', 'create_promotion_partitions',
+                                    {'hour': 1, 'minute': 0}),
+    'compact_promotion_data': ('压缩历史推广数据', 'compact_old_promotion_data',
+                               {'day_of_week': 6, 'hour': 4, 'minute': 0}),
+}
+
+# 调度器所属的应用（任务在该应用的上下文中执行）
+_app = None
+
+# 任务ID -> 最近一次提交执行时的计划时间，由调度器事件写入
+_scheduled_times = {}
+
+def run_scheduled_job(job_id):
+    """
+    执行定时任务并记录执行历史
+    调度器通过文本引用 app.utils.scheduler:run_scheduled_job 调用该函数
+    
+    Args:
+        job_id: SCHEDULED_JOBS中的任务ID
+    """
+    name, func_name, _ = SCHEDULED_JOBS[job_id]
+    func = globals()[func_name]
+    
+    with _app.app_context():
+        run = JobRun(job_id=job_id, job_name=name, status='running',
+                     scheduled_time=_scheduled_times.pop(job_id, None), start_time=datetime.utcnow())
+        db.session.add(run)
+        db.session.commit()
+        run_id = run.id
+        
+        started = time.perf_counter()
+        try:
+            rows = func()
+            status, error = 'succeeded', None
+        except Exception as e:
+            db.session.rollback()
+            rows, status, error = None, 'failed', str(e)
+        
+        run = db.session.get(JobRun, run_id)
+        run.status = status
+        run.rows_processed = rows
+        run.error = error
+        run.end_time = datetime.utcnow()
+        run.duration_seconds = round(time.perf_counter() - started, 3)
+        db.session.commit()
+
+def _on_job_submitted(event):
+    if event.scheduled_run_times:
+        _scheduled_times[event.job_id] = _to_naive_utc(event.scheduled_run_times[-1])
+
+def _on_job_missed(event):
+    """超过容错时间未能执行的任务记为missed"""
+    if event.job_id not in SCHEDULED_JOBS:
+        return
+    with _app.app_context():
+        db.session.add(JobRun(
+            job_id=event.job_id, job_name=SCHEDULED_JOBS[event.job_id][0], status='missed',
+            scheduled_time=_to_naive_utc(event.scheduled_run_time),
+            error='超过错过执行容错时间，已跳过'
+        ))
+        db.session.commit()
+    logger.warning(f"定时任务 {event.job_id} 错过了 {event.scheduled_run_time} 的执行")
+
+def _to_naive_utc(value):
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _configure(app):
+    """按配置设置任务存储与任务默认参数"""
+    jobstores = {}
+    if app.config.get('SCHEDULER_JOBSTORE', 'sqlalchemy') == 'sqlalchemy':
+        url = app.config.get('SCHEDULER_JOBSTORE_URL')
+        jobstores['default'] = (SQLAlchemyJobStore(url=url) if url
+                                else SQLAlchemyJobStore(engine=db.engine))
+    scheduler.configure(
+        jobstores=jobstores or None,
+        job_defaults={
+            # 多次错过的执行只补跑一次
+            'coalesce': True,
+            # 在该时间内错过的执行（如进程重启期间）在恢复后补跑
+            'misfire_grace_time': app.config.get('SCHEDULER_MISFIRE_GRACE_SECONDS', 3600),
+            'max_instances': 1,
+        },
+    )
+
+def _sync_jobs():
+    """
+    将SCHEDULED_JOBS同步到任务存储
+    已存在且触发器未变化的任务保持原有的下次执行时间，这样停机期间错过的执行可以被检测并补跑
+    """
+    for job_id, (name, _, trigger_args) in SCHEDULED_JOBS.items():
+        trigger = CronTrigger(**trigger_args)
+        existing = scheduler.get_job(job_id)
+        if existing is None:
+            scheduler.add_job(
+                func='app.utils.scheduler:run_scheduled_job',
+                args=[job_id],
+                trigger=trigger,
+                id=job_id,
+                name=name,
+            )
+        elif str(existing.trigger) != str(trigger):
+            scheduler.reschedule_job(job_id, trigger=trigger)
+    
+    # 删除已不在定义中的任务
+    for job in scheduler.get_jobs():
+        if job.id not in SCHEDULED_JOBS:
+            scheduler.remove_job(job.id)
 
 def init_scheduler(app):
     """
@@ -103,32 +345,45 @@ def init_scheduler(app):
     Args:
         app: Flask应用实例
     """
+    global _app
+    if scheduler.running:
+        return
+    _app = app
+    
     with app.app_context():
-        # 添加定时任务：每天凌晨2点执行
-        scheduler.add_job(
-            func=fetch_latest_promotion_data,
-            trigger=CronTrigger(hour=2, minute=0),
-            id='fetch_daily_promotion_data',
-            name='每日获取推广数据',
-            replace_existing=True
-        )
+        _configure(app)
+        scheduler.add_listener(_on_job_submitted, EVENT_JOB_SUBMITTED)
+        scheduler.add_listener(_on_job_missed, EVENT_JOB_MISSED)
         
-        # 添加定时任务：每周一凌晨3点执行
-        scheduler.add_job(
-            func=fetch_all_materials_data,
-            trigger=CronTrigger(day_of_week=0, hour=3, minute=0),
-            id='fetch_weekly_materials_data',
-            name='每周获取达人素材数据',
-            replace_existing=True
-        )
+        # 以暂停状态启动，先同步任务定义再开始调度
+        scheduler.start(paused=True)
+        _sync_jobs()
+        scheduler.resume()
         
-        # 启动调度器
-        scheduler.start()
+        # 进程退出时关闭
+        atexit.register(shutdown_scheduler)
         logger.info("定时任务调度器已启动")
 
+def run_scheduler(app):
+    """
+    以前台方式运行调度器，直到进程被中断
+    用于将定时任务与Web进程分开部署
+    
+    Args:
+        app: Flask应用实例
+    """
+    init_scheduler(app)
+    try:
+        while True:
+            time.sleep(60)
+    except (KeyboardInterrupt, SystemExit):
+        shutdown_scheduler()
+
 def shutdown_scheduler():
     """
     关闭定时任务调度器
     """
+    if not scheduler.running:
+        return
     scheduler.shutdown()
     logger.info("定时任务调度器已关闭")
\ No newline at end of file
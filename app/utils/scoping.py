@@ -0,0 +1,20 @@
+"""
+按用户角色限定数据范围
+商务用户只能看到自己创建的数据，投手用户可以看到全部数据
+"""
+
+from flask_login import current_user
+
+def scoped_query(model):
+    """
+    按当前用户角色限定查询范围：商务用户只能看到自己创建的数据
+
+    Args:
+        model: 带 created_by_id 列的模型
+
+    Returns:
+        Query: 模型查询
+    """
+    if current_user.is_business():
+        return model.query.filter_by(created_by_id=current_user.id)
+    return model.query
@@ -0,0 +1,218 @@
+"""
+达人综合评分
+综合评分由四项得分加权得到（0-100）：
+    engagement  互动率（点赞+评论+分享）/播放量
+    roi         花费加权ROI（总销售额-总花费）/总花费，投放花费越大的数据权重越大
+    conversion  转化率 总转化量/总点击量
+    recency     最近一次投放距今的天数，按半衰期指数衰减
+前三项按目标值线性折算为0-1，达到目标值即满分；没有数据的项按0分计入。
+
+增量计算：上次计算之后 update_time 发生变化的达人、素材、推广数据与归档数据所属的达人重新计算，
+其余达人保留已有评分。最近投放得分随日期变化，每天第一次运行时全量重算；
+删除素材或推广数据不会更新 update_time，同样在每天的全量重算中修正
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select
+from app import db
+from app.models import Influencer, InfluencerScore, Material, PromotionArchive, PromotionData
+from app.utils.reports import promotion_tiers
+import logging
+
+# 创建日志记录器
+logger = logging.getLogger(__name__)
+
+# 评分项
+COMPONENTS = ('engagement', 'roi', 'conversion', 'recency')
+
+# 默认权重，可通过 INFLUENCER_SCORE_WEIGHTS 配置
+DEFAULT_WEIGHTS = {'engagement': 0.3, 'roi': 0.4, 'conversion': 0.2, 'recency': 0.1}
+
+# 各项得分的满分目标值
+ENGAGEMENT_TARGET = 0.10
+ROI_TARGET = 3.0
+CONVERSION_TARGET = 0.05
+
+# 增量计算时向前多取的时间，覆盖上次计算期间提交的数据
+OVERLAP = timedelta(minutes=5)
+
+# 每次计算的达人数
+CHUNK_SIZE = 1000
+
+def parse_weights(value):
+    """
+    解析权重配置，如 "engagement=0.3,roi=0.4,conversion=0.2,recency=0.1"
+    未配置的项使用默认权重
+
+    Raises:
+        ValueError: 评分项未知或权重无效
+    """
+    weights = dict(DEFAULT_WEIGHTS)
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in COMPONENTS:
+            raise ValueError(f'未知的评分项：{name}')
+        weights[name] = float(weight)
+        if weights[name] < 0:
+            raise ValueError(f'评分项 {name} 的权重不能为负数')
+    if sum(weights.values()) <= 0:
+        raise ValueError('评分权重之和必须大于0')
+    return weights
+
+def _ratio_score(value, target):
+    """按目标值线性折算为0-1"""
+    if value is None:
+        return None
+    return max(0.0, min(1.0, value / target))
+
+def recency_score(last_date, today, half_life_days):
+    """最近投放得分：当天投放为1，每过半衰期减半"""
+    if last_date is None:
+        return None
+    days = max((today - last_date).days, 0)
+    return 0.5 ** (days / half_life_days)
+
+def composite_score(components, weights):
+    """加权平均后折算为0-100，缺失的项按0分计入"""
+    total = sum(weights.values())
+    return round(100 * sum(weights[name] * (components.get(name) or 0) for name in COMPONENTS) / total, 2)
+
+def changed_influencer_ids(since):
+    """
+    自 since 以来数据发生变化的达人，以及还没有评分的达人
+
+    Returns:
+        set: 达人ID
+    """
+    statements = [
+        select(Influencer.id).where(Influencer.update_time >= since),
+        select(Material.influencer_id).where(Material.update_time >= since),
+        select(Material.influencer_id).join(PromotionData, PromotionData.material_id == Material.id)
+        .where(PromotionData.update_time >= since),
+        select(Material.influencer_id).join(PromotionArchive, PromotionArchive.material_id == Material.id)
+        .where(PromotionArchive.update_time >= since),
+        select(Influencer.id).outerjoin(InfluencerScore, InfluencerScore.influencer_id == Influencer.id)
+        .where(InfluencerScore.influencer_id.is_(None)),
+    ]
+    ids = set()
+    for statement in statements:
+        ids.update(db.session.execute(statement.distinct()).scalars())
+    ids.discard(None)
+    return ids
+
+def _score_chunk(influencer_ids, weights, half_life_days, now):
+    """计算一批达人的评分行"""
+    engagement = {
+        influencer_id: (plays, engagements) for influencer_id, plays, engagements in db.session.query(
+            Material.influencer_id,
+            func.sum(func.coalesce(Material.play_count, 0)),
+            func.sum(func.coalesce(Material.like_count, 0) + func.coalesce(Material.comment_count, 0)
+                     + func.coalesce(Material.share_count, 0)),
+        ).filter(Material.influencer_id.in_(influencer_ids)).group_by(Material.influencer_id)
+    }
+
+    # 推广数据包含已压缩到归档表的历史数据
+    tiers = promotion_tiers(material_ids=select(Material.id).where(Material.influencer_id.in_(influencer_ids)))
+    promotions = {
+        row[0]: row[1:] for row in db.session.query(
+            Material.influencer_id,
+            func.sum(tiers.c.cost), func.sum(tiers.c.sales_amount),
+            func.sum(tiers.c.click_count), func.sum(tiers.c.conversion_count),
+            func.max(tiers.c.day),
+        ).join(Material, Material.id == tiers.c.material_id).group_by(Material.influencer_id)
+    }
+
+    today = now.date()
+    rows = []
+    for influencer_id in influencer_ids:
+        plays, engagements = engagement.get(influencer_id, (0, 0))
+        cost, sales, clicks, conversions, last_date = promotions.get(influencer_id, (0, 0, 0, 0, None))
+        cost, sales = float(cost or 0), float(sales or 0)
+        # 归档数据按汇总周期的第一天参与统计，最近投放日期不会晚于今天
+        if last_date is not None and last_date > today:
+            last_date = today
+
+        engagement_rate = engagements / plays if plays else None
+        roi = (sales - cost) / cost if cost > 0 else None
+        conversion_rate = conversions / clicks if clicks else None
+        components = {
+            'engagement': _ratio_score(engagement_rate, ENGAGEMENT_TARGET),
+            'roi': _ratio_score(roi, ROI_TARGET),
+            'conversion': _ratio_score(conversion_rate, CONVERSION_TARGET),
+            'recency': recency_score(last_date, today, half_life_days),
+        }
+        rows.append({
+            'influencer_id': influencer_id,
+            'score': composite_score(components, weights),
+            **{f'{name}_score': value for name, value in components.items()},
+            'engagement_rate': engagement_rate,
+            'roi': roi,
+            'conversion_rate': conversion_rate,
+            'total_cost': round(cost, 2),
+            'last_promotion_date': last_date,
+            'update_time': now,
+        })
+    return rows
+
+def refresh_influencer_scores(weights=None, half_life_days=30, full=False, now=None):
+    """
+    更新达人综合评分
+
+    Args:
+        weights: 各项权重（默认DEFAULT_WEIGHTS）
+        half_life_days: 最近投放得分的半衰期（天）
+        full: 是否全量重算；没有评分或当天尚未全量计算时自动全量
+        now: 计算时间（默认当前UTC时间）
+
+    Returns:
+        dict: 是否全量计算、更新的达人数与达人ID
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    now = now or datetime.utcnow()
+    oldest, newest = db.session.query(func.min(InfluencerScore.update_time),
+                                      func.max(InfluencerScore.update_time)).one()
+    midnight = datetime.combine(now.date(), datetime.min.time())
+    full = full or oldest is None or oldest < midnight
+
+    if full:
+        influencer_ids = sorted(db.session.execute(select(Influencer.id)).scalars())
+    else:
+        influencer_ids = sorted(changed_influencer_ids(newest - OVERLAP))
+
+    for start in range(0, len(influencer_ids), CHUNK_SIZE):
+        chunk = influencer_ids[start:start + CHUNK_SIZE]
+        rows = _score_chunk(chunk, weights, half_life_days, now)
+        db.session.execute(delete(InfluencerScore).where(InfluencerScore.influencer_id.in_(chunk)))
+        db.session.execute(InfluencerScore.__table__.insert(), rows)
+        db.session.commit()
+
+    if full:
+        # 已删除的达人
+        db.session.execute(delete(InfluencerScore).where(InfluencerScore.update_time < now))
+        db.session.commit()
+
+    logger.info(f"达人评分{'全量' if full else '增量'}计算完成：{len(influencer_ids)} 个达人")
+    return {'full': full, 'influencers': len(influencer_ids), 'influencer_ids': influencer_ids}
+
+def init_scoring(app):
+    """
+    注册评分命令
+
+    Args:
+        app: Flask应用实例
+    """
+    import click
+
+    @app.cli.command('score-influencers')
+    @click.option('--full', is_flag=True, help='全量重算全部达人的评分')
+    def score_influencers_command(full):
+        """计算达人综合评分（默认只计算数据有变化的达人）"""
+        try:
+            weights = parse_weights(app.config.get('INFLUENCER_SCORE_WEIGHTS'))
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        result = refresh_influencer_scores(weights, app.config.get('INFLUENCER_SCORE_HALF_LIFE_DAYS', 30), full)
+        click.echo(f"已{'全量' if result['full'] else '增量'}计算 {result['influencers']} 个达人的评分")
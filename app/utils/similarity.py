@@ -0,0 +1,343 @@
+"""
+相似达人推荐
+每个达人的特征向量由三部分组成：
+    数值特征  互动率、播放量、近7天播放增长、等级内百分位（influencer_metrics），
+              ROI、转化率、投放花费、综合评分（influencer_scores），标准化后截断到±3
+    标签特征  达人标签的归属（one-hot，按标签数归一化）
+向量按行L2归一化后以float32矩阵保存为.npy文件，查询时以内存映射方式加载，
+一次矩阵-向量乘法即得到与全部达人的余弦相似度。
+
+评分或指标任务完成后更新索引：全量计算时重建索引；增量计算时按上次重建的标准化参数与标签表
+原地改写变化达人的向量，出现新达人或新标签时重建
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from sqlalchemy import select
+from app import db
+from app.models import Influencer, InfluencerMetrics, InfluencerScore, influencer_tag_association
+import logging
+
+# 创建日志记录器
+logger = logging.getLogger(__name__)
+
+# 数值特征：(来源表的列, 是否取对数)
+NUMERIC_FEATURES = (
+    (InfluencerMetrics.engagement_rate, False),
+    (InfluencerMetrics.total_plays, True),
+    (InfluencerMetrics.play_growth_7d, False),
+    (InfluencerMetrics.level_percentile, False),
+    (InfluencerScore.roi, False),
+    (InfluencerScore.conversion_rate, False),
+    (InfluencerScore.total_cost, True),
+    (InfluencerScore.score, False),
+)
+
+# 数值特征与标签特征两部分的权重
+NUMERIC_WEIGHT = 1.0
+TAG_WEIGHT = 1.0
+
+# 标准化后的截断范围
+Z_CLIP = 3.0
+
+# 每次查询的达人数
+QUERY_CHUNK_SIZE = 1000
+
+META_FILE = 'meta.json'
+
+class SimilarityIndexError(RuntimeError):
+    """相似达人索引不存在或无法读取"""
+
+def _feature_rows(influencer_ids=None):
+    """
+    读取达人的数值特征与标签
+
+    Returns:
+        tuple: (按ID升序的达人ID列表, 数值特征行列表, {达人ID: [标签ID]})
+    """
+    columns = [column for column, _ in NUMERIC_FEATURES]
+    statement = select(Influencer.id, *columns) \
+        .outerjoin(InfluencerMetrics, InfluencerMetrics.influencer_id == Influencer.id) \
+        .outerjoin(InfluencerScore, InfluencerScore.influencer_id == Influencer.id)
+    tag_statement = select(influencer_tag_association.c.influencer_id, influencer_tag_association.c.tag_id)
+
+    if influencer_ids is None:
+        rows = db.session.execute(statement.order_by(Influencer.id)).all()
+        tag_rows = db.session.execute(tag_statement).all()
+    else:
+        influencer_ids = sorted(influencer_ids)
+        rows, tag_rows = [], []
+        for start in range(0, len(influencer_ids), QUERY_CHUNK_SIZE):
+            chunk = influencer_ids[start:start + QUERY_CHUNK_SIZE]
+            rows.extend(db.session.execute(statement.where(Influencer.id.in_(chunk)).order_by(Influencer.id)))
+            tag_rows.extend(db.session.execute(
+                tag_statement.where(influencer_tag_association.c.influencer_id.in_(chunk))
+            ))
+
+    tags = {}
+    for influencer_id, tag_id in tag_rows:
+        tags.setdefault(influencer_id, []).append(tag_id)
+    return [row[0] for row in rows], [row[1:] for row in rows], tags
+
+def _numeric_matrix(rows):
+    """数值特征矩阵，缺失值为NaN，计数类特征取log1p"""
+    import numpy as np
+
+    matrix = np.array([[float(value) if value is not None else np.nan for value in row] for row in rows],
+                      dtype='float64').reshape(len(rows), len(NUMERIC_FEATURES))
+    for index, (_, logarithmic) in enumerate(NUMERIC_FEATURES):
+        if logarithmic:
+            matrix[:, index] = np.log1p(np.maximum(matrix[:, index], 0))
+    return matrix
+
+def _statistics(matrix):
+    """各数值特征的均值与标准差（全部缺失时为0与1）"""
+    import numpy as np
+
+    with np.errstate(invalid='ignore'):
+        mean = np.nanmean(matrix, axis=0) if len(matrix) else np.zeros(matrix.shape[1])
+        std = np.nanstd(matrix, axis=0) if len(matrix) else np.ones(matrix.shape[1])
+    mean = np.nan_to_num(mean, nan=0.0)
+    std = np.where(np.isnan(std) | (std == 0), 1.0, std)
+    return mean, std
+
+def _vectors(matrix, tags_by_row, mean, std, vocabulary):
+    """
+    组合数值与标签特征并按行L2归一化
+
+    Args:
+        matrix: 数值特征矩阵
+        tags_by_row: 每行的标签ID列表
+        mean, std: 标准化参数
+        vocabulary: {标签ID: 列号}
+
+    Returns:
+        ndarray: float32矩阵
+    """
+    import numpy as np
+
+    numeric = np.clip(np.nan_to_num((matrix - mean) / std, nan=0.0), -Z_CLIP, Z_CLIP)
+    numeric *= NUMERIC_WEIGHT / (Z_CLIP * np.sqrt(len(NUMERIC_FEATURES)))
+
+    vectors = np.zeros((len(matrix), len(NUMERIC_FEATURES) + len(vocabulary)), dtype='float32')
+    vectors[:, :len(NUMERIC_FEATURES)] = numeric
+    for row, tag_ids in enumerate(tags_by_row):
+        positions = [len(NUMERIC_FEATURES) + vocabulary[tag_id] for tag_id in tag_ids]
+        if positions:
+            vectors[row, positions] = TAG_WEIGHT / np.sqrt(len(positions))
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+def _read_meta(directory):
+    path = os.path.join(directory, META_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def _write_meta(directory, meta):
+    """先写临时文件再替换meta.json，读取方不会读到写了一半的文件"""
+    temporary = os.path.join(directory, META_FILE + '.tmp')
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(temporary, os.path.join(directory, META_FILE))
+
+def index_version(directory):
+    """
+    索引的版本：构建版本与最后一次增量更新的时间，用于页面的ETag
+
+    Returns:
+        str: 版本字符串，索引尚未构建时为None
+    """
+    meta = _read_meta(directory)
+    if meta is None:
+        return None
+    return f"{meta['version']}:{meta.get('update_time', meta['build_time'])}"
+
+def _save_array(path, array):
+    import numpy as np
+
+    with open(path, 'wb') as f:
+        np.save(f, array)
+
+def rebuild_similarity_index(directory):
+    """
+    全量重建索引
+    新的矩阵写入带版本号的文件后替换meta.json，正在读取旧文件的进程不受影响
+
+    Returns:
+        int: 索引中的达人数
+    """
+    import numpy as np
+
+    ids, rows, tags = _feature_rows()
+    matrix = _numeric_matrix(rows)
+    mean, std = _statistics(matrix)
+    tag_ids = sorted({tag_id for influencer_tags in tags.values() for tag_id in influencer_tags})
+    vocabulary = {tag_id: column for column, tag_id in enumerate(tag_ids)}
+    vectors = _vectors(matrix, [tags.get(influencer_id, []) for influencer_id in ids], mean, std, vocabulary)
+
+    os.makedirs(directory, exist_ok=True)
+    previous = _read_meta(directory)
+    version = datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
+    meta = {
+        'version': version,
+        'vectors': f'vectors-{version}.npy',
+        'ids': f'ids-{version}.npy',
+        'count': len(ids),
+        'mean': mean.tolist(),
+        'std': std.tolist(),
+        'tags': sorted(vocabulary, key=vocabulary.get),
+        'build_time': datetime.utcnow().isoformat(),
+    }
+    _save_array(os.path.join(directory, meta['vectors']), vectors)
+    _save_array(os.path.join(directory, meta['ids']), np.array(ids, dtype='int64'))
+    _write_meta(directory, meta)
+
+    if previous:
+        # 已映射旧文件的进程在关闭前仍可读取（删除只移除目录项）
+        for name in (previous['vectors'], previous['ids']):
+            path = os.path.join(directory, name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    logger.info(f"相似达人索引已重建：{len(ids)} 个达人，{vectors.shape[1]} 维")
+    return len(ids)
+
+def update_similarity_index(directory, influencer_ids):
+    """
+    增量更新指定达人的向量，索引不存在或出现新达人、新标签时全量重建
+
+    Returns:
+        int: 更新的达人数
+    """
+    import numpy as np
+
+    meta = _read_meta(directory)
+    if meta is None:
+        return rebuild_similarity_index(directory)
+    if not influencer_ids:
+        return 0
+
+    ids, rows, tags = _feature_rows(influencer_ids)
+    vocabulary = {tag_id: column for column, tag_id in enumerate(meta['tags'])}
+    indexed = np.load(os.path.join(directory, meta['ids']), mmap_mode='r')
+    positions = np.searchsorted(indexed, ids)
+    unknown_tag = any(tag_id not in vocabulary for influencer_tags in tags.values() for tag_id in influencer_tags)
+    missing = any(position >= len(indexed) or indexed[position] != influencer_id
+                  for position, influencer_id in zip(positions, ids))
+    if unknown_tag or missing:
+        return rebuild_similarity_index(directory)
+
+    vectors = _vectors(_numeric_matrix(rows), [tags.get(influencer_id, []) for influencer_id in ids],
+                       np.array(meta['mean']), np.array(meta['std']), vocabulary)
+    # 以读写方式映射并原地改写，其他进程的只读映射共享同一页缓存，立即可见
+    stored = np.load(os.path.join(directory, meta['vectors']), mmap_mode='r+')
+    stored[positions] = vectors
+    stored.flush()
+    del stored
+    # 向量原地改写不改变构建版本，记录更新时间使依赖索引的页面缓存失效
+    meta['update_time'] = datetime.utcnow().isoformat()
+    _write_meta(directory, meta)
+    logger.info(f"相似达人索引已增量更新：{len(ids)} 个达人")
+    return len(ids)
+
+# 进程内缓存的索引：(版本号, 达人ID数组, 向量矩阵)
+_index = None
+_index_lock = threading.Lock()
+
+def load_index(directory):
+    """
+    以内存映射方式加载索引，meta.json的版本变化后重新映射
+
+    Returns:
+        tuple: (达人ID数组, 向量矩阵)
+
+    Raises:
+        SimilarityIndexError: 索引尚未构建
+    """
+    global _index
+    import numpy as np
+
+    meta = _read_meta(directory)
+    if meta is None:
+        raise SimilarityIndexError('相似达人索引尚未构建，请执行 flask build-similarity-index')
+    with _index_lock:
+        if _index is None or _index[0] != meta['version']:
+            _index = (
+                meta['version'],
+                np.load(os.path.join(directory, meta['ids']), mmap_mode='r'),
+                np.load(os.path.join(directory, meta['vectors']), mmap_mode='r'),
+            )
+        return _index[1], _index[2]
+
+def similar_influencers(directory, influencer_id, k=10, candidate_ids=None):
+    """
+    与指定达人余弦相似度最高的k个达人
+
+    Args:
+        directory: 索引目录
+        influencer_id: 达人ID
+        k: 返回数量
+        candidate_ids: 只在这些达人中查找（可选）
+
+    Returns:
+        list: [(达人ID, 相似度)]，按相似度从高到低排序；达人不在索引中或没有任何特征时为空
+    """
+    import numpy as np
+
+    ids, vectors = load_index(directory)
+    position = int(np.searchsorted(ids, influencer_id))
+    if position >= len(ids) or ids[position] != influencer_id or not vectors[position].any():
+        return []
+
+    similarities = vectors @ vectors[position]
+    similarities[position] = -np.inf
+    if candidate_ids is not None:
+        similarities[~np.isin(ids, np.fromiter(candidate_ids, dtype='int64'))] = -np.inf
+
+    k = min(k, int(np.isfinite(similarities).sum()))
+    if k <= 0:
+        return []
+    top = np.argpartition(-similarities, k - 1)[:k]
+    top = top[np.argsort(-similarities[top])]
+    return [(int(ids[index]), round(float(similarities[index]), 4)) for index in top]
+
+def recommend_influencers(directory, influencer_id, k=10, created_by_id=None):
+    """
+    相似达人及其相似度，created_by_id 非空时只推荐该用户创建的达人
+    索引中已删除的达人会被跳过
+
+    Returns:
+        list: [(Influencer, 相似度)]
+    """
+    candidate_ids = None
+    if created_by_id is not None:
+        candidate_ids = db.session.execute(
+            select(Influencer.id).where(Influencer.created_by_id == created_by_id)
+        ).scalars().all()
+    matches = similar_influencers(directory, influencer_id, k, candidate_ids)
+    if not matches:
+        return []
+    influencers = {influencer.id: influencer for influencer in
+                   Influencer.query.filter(Influencer.id.in_([match_id for match_id, _ in matches]))}
+    return [(influencers[match_id], similarity) for match_id, similarity in matches if match_id in influencers]
+
+def init_similarity(app):
+    """
+    注册相似达人索引命令
+
+    Args:
+        app: Flask应用实例
+    """
+    import click
+
+    @app.cli.command('build-similarity-index')
+    def build_similarity_index_command():
+        """全量重建相似达人索引"""
+        count = rebuild_similarity_index(app.config.get('SIMILARITY_INDEX_DIR', 'similarity'))
+        click.echo(f'相似达人索引已重建：{count} 个达人')
@@ -0,0 +1,144 @@
+"""
+请求级SQL分析器
+通过共享的SQL语句计时（app.utils.sql_timing）统计每个请求的语句数、数据库耗时和重复语句，
+以Server-Timing响应头输出，并将慢请求保存在环形缓冲区中供调试页面查看
+"""
+
+import re
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from flask import g, has_request_context, request
+from app.utils.sql_timing import add_statement_observer
+import logging
+
+# 创建日志记录器
+logger = logging.getLogger(__name__)
+
+# 语句归一化规则：字符串/数字字面量与各种参数占位符统一替换为?，IN列表折叠
+_NORMALIZE_RULES = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%\(\w+\)s|%s|:\w+|\$\d+'), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+def normalize_statement(statement):
+    """归一化SQL语句，使仅参数不同的语句可以合并统计"""
+    for pattern, replacement in _NORMALIZE_RULES:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+class RequestProfile:
+    """单个请求的SQL统计"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.statement_count = 0
+        self.db_seconds = 0.0
+        self.statements = Counter()
+        self.statement_seconds = Counter()
+
+    def record(self, statement, seconds):
+        normalized = normalize_statement(statement)
+        self.statement_count += 1
+        self.db_seconds += seconds
+        self.statements[normalized] += 1
+        self.statement_seconds[normalized] += seconds
+
+    def suspected_n_plus_one(self, threshold):
+        """重复执行次数超过阈值的语句"""
+        return [(statement, count) for statement, count in self.statements.most_common()
+                if count > threshold]
+
+class SlowRequestBuffer:
+    """慢请求环形缓冲区，满后自动丢弃最早的记录"""
+
+    def __init__(self, size):
+        self._items = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, item):
+        with self._lock:
+            self._items.append(item)
+
+    def items(self):
+        """按总耗时从高到低返回缓冲区中的请求"""
+        with self._lock:
+            items = list(self._items)
+        return sorted(items, key=lambda item: item['total_ms'], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def resize(self, size):
+        with self._lock:
+            self._items = deque(self._items, maxlen=size)
+
+# 进程内慢请求缓冲区（容量由init_sql_profiler按配置调整）
+slow_requests = SlowRequestBuffer(50)
+
+def _record_statement(statement, seconds):
+    if not has_request_context():
+        return
+    profile = g.get('_sql_profile')
+    if profile is not None:
+        profile.record(statement, seconds)
+
+def init_sql_profiler(app):
+    """
+    根据配置启用SQL分析器
+
+    Args:
+        app: Flask应用实例
+    """
+    if not app.config.get('SQL_PROFILER_ENABLED'):
+        return
+
+    slow_requests.resize(app.config.get('SQL_PROFILER_BUFFER_SIZE', 50))
+    slow_threshold_ms = app.config.get('SQL_PROFILER_SLOW_MS', 200)
+    repeat_threshold = app.config.get('SQL_PROFILER_N_PLUS_ONE_THRESHOLD', 5)
+
+    add_statement_observer(_record_statement)
+
+    @app.before_request
+    def start_sql_profile():
+        g._sql_profile = RequestProfile()
+
+    @app.after_request
+    def finish_sql_profile(response):
+        profile = g.pop('_sql_profile', None)
+        if profile is None:
+            return response
+
+        total_ms = (time.perf_counter() - profile.started_at) * 1000
+        db_ms = profile.db_seconds * 1000
+        response.headers.add('Server-Timing', f'db;dur={db_ms:.2f};desc="{profile.statement_count} queries"')
+        response.headers.add('Server-Timing', f'app;dur={total_ms:.2f}')
+
+        suspects = profile.suspected_n_plus_one(repeat_threshold)
+        if suspects:
+            logger.warning(f"疑似N+1查询 {request.method} {request.path}: "
+                           f"{suspects[0][1]} 次 {suspects[0][0][:200]}")
+
+        if total_ms >= slow_threshold_ms or suspects:
+            slow_requests.add({
+                'time': datetime.now(),
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'total_ms': round(total_ms, 2),
+                'db_ms': round(db_ms, 2),
+                'statement_count': profile.statement_count,
+                'top_statements': [
+                    {'statement': statement, 'count': count,
+                     'ms': round(profile.statement_seconds[statement] * 1000, 2)}
+                    for statement, count in profile.statements.most_common(10)
+                ],
+                'n_plus_one': [{'statement': statement, 'count': count} for statement, count in suspects],
+            })
+        return response
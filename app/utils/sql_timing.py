@@ -0,0 +1,53 @@
+"""
+SQL语句计时
+在Engine上只注册一组before_cursor_execute/after_cursor_execute/handle_error事件，
+每条语句计时一次后分发给所有观察者（SQL分析器、监控指标），避免各自计时重复记录
+"""
+
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import logging
+
+# 创建日志记录器
+logger = logging.getLogger(__name__)
+
+# 语句执行完成后调用的观察者：observer(statement, seconds)
+_observers = []
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_sql_timing_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('_sql_timing_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    for observer in _observers:
+        try:
+            observer(statement, elapsed)
+        except Exception as e:
+            logger.error(f"SQL计时观察者执行失败: {str(e)}")
+
+def _handle_error(exception_context):
+    """语句执行失败时不会触发after_cursor_execute，丢弃对应的开始时间"""
+    connection = exception_context.connection
+    if connection is None or exception_context.execution_context is None:
+        return
+    starts = connection.info.get('_sql_timing_start')
+    if starts:
+        starts.pop()
+
+def add_statement_observer(observer):
+    """
+    注册语句耗时观察者，首次注册时安装Engine事件
+
+    Args:
+        observer: 可调用对象，参数为 (语句, 秒数)
+    """
+    if observer not in _observers:
+        _observers.append(observer)
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
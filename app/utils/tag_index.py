@@ -0,0 +1,531 @@
+"""
+标签位图索引
+在进程内以整数位图（tag -> 实体ID位集）维护标签归属，支持 AND/OR/NOT 组合的快速筛选
+索引懒加载构建，并随标签关联的变更增量更新；索引未就绪时回退到SQL查询
+
+每个进程各有一份索引。标签变更在提交的事务中增加共享版本号（data_versions 表的 tags:<类型>），
+本进程提交的变更在版本号连续时增量应用；查询前按 TAG_INDEX_CHECK_INTERVAL 比较数据库中的版本号，
+与索引不一致（其他进程提交了变更）时重建索引，重建完成前回退到SQL。
+绕过会话直接写入实体表、标签表或关联表时需调用 bump_index_versions
+"""
+
+import re
+import threading
+import time
+from flask import current_app
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import and_, event, not_, or_, select
+from app import db
+from app.utils.data_versions import bump_versions, read_versions
+from app.utils.tags import TAG_TYPES, iter_tag_changes
+import logging
+
+# 创建日志记录器
+logger = logging.getLogger(__name__)
+
+# 表达式词法：括号或连续的非空白字符
+_TOKEN_RE = re.compile(r'\(|\)|[^\s()]+')
+_OPERATORS = ('AND', 'OR', 'NOT')
+
+class TagExpressionError(ValueError):
+    """标签筛选表达式格式错误"""
+
+# ---------------------------------------------------------------------------
+# 位集工具
+# ---------------------------------------------------------------------------
+
+def popcount(bitset):
+    """统计位集中置位的数量"""
+    return bin(bitset).count('1')
+
+def bitset_from_ids(ids):
+    """
+    将ID集合转换为整数位集
+
+    Args:
+        ids: 非负整数ID的可迭代对象
+
+    Returns:
+        int: 第i位为1表示ID i在集合中
+    """
+    ids = list(ids)
+    if not ids:
+        return 0
+    buffer = bytearray((max(ids) >> 3) + 1)
+    for entity_id in ids:
+        buffer[entity_id >> 3] |= 1 << (entity_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+def bitset_slice(bitset, offset, limit, chunk_size=4096):
+    """
+    按升序取出位集中第offset个起的limit个ID
+    整块跳过offset之前的数据，深分页也无需逐位扫描
+
+    Returns:
+        list: ID列表
+    """
+    result = []
+    if limit <= 0 or bitset <= 0:
+        return result
+
+    data = bitset.to_bytes((bitset.bit_length() + 7) // 8, 'little')
+    for start in range(0, len(data), chunk_size):
+        block = data[start:start + chunk_size]
+        block_count = popcount(int.from_bytes(block, 'little'))
+        if offset >= block_count:
+            offset -= block_count
+            continue
+
+        for index, byte in enumerate(block):
+            if not byte:
+                continue
+            for bit in range(8):
+                if not (byte >> bit) & 1:
+                    continue
+                if offset:
+                    offset -= 1
+                    continue
+                result.append(((start + index) << 3) + bit)
+                if len(result) == limit:
+                    return result
+    return result
+
+# ---------------------------------------------------------------------------
+# 表达式解析
+# ---------------------------------------------------------------------------
+
+def parse_tag_expression(expression):
+    """
+    解析标签筛选表达式
+
+    支持 AND、OR、NOT（不区分大小写）与括号，相邻标签默认按 AND 组合，
+    例如 "美妆 AND 测评 NOT 开箱"、"(美妆 OR 时尚) 测评"
+
+    Returns:
+        tuple: 语法树，节点为 ('tag', name)、('not', node)、('and', a, b)、('or', a, b)
+
+    Raises:
+        TagExpressionError: 表达式格式错误
+    """
+    tokens = _TOKEN_RE.findall(expression or '')
+    if not tokens:
+        raise TagExpressionError('标签筛选表达式不能为空')
+
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def keyword(token):
+        return token.upper() if token and token.upper() in _OPERATORS else None
+
+    def advance():
+        nonlocal position
+        token = tokens[position]
+        position += 1
+        return token
+
+    def parse_or():
+        node = parse_and()
+        while keyword(peek()) == 'OR':
+            advance()
+            node = ('or', node, parse_and())
+        return node
+
+    def parse_and():
+        node = parse_unary()
+        while True:
+            token = peek()
+            if token is None or token == ')' or keyword(token) == 'OR':
+                return node
+            if keyword(token) == 'AND':
+                advance()
+                node = ('and', node, parse_unary())
+            elif keyword(token) == 'NOT':
+                # "A NOT B" 视为 "A AND NOT B"
+                advance()
+                node = ('and', node, ('not', parse_unary()))
+            else:
+                node = ('and', node, parse_unary())
+
+    def parse_unary():
+        token = peek()
+        if token is None:
+            raise TagExpressionError('标签筛选表达式不完整')
+        if keyword(token) == 'NOT':
+            advance()
+            return ('not', parse_unary())
+        if token == '(':
+            advance()
+            node = parse_or()
+            if peek() != ')':
+                raise TagExpressionError('标签筛选表达式括号不匹配')
+            advance()
+            return node
+        if token == ')' or keyword(token):
+            raise TagExpressionError(f'标签筛选表达式在“{token}”处格式错误')
+        return ('tag', advance())
+
+    node = parse_or()
+    if position != len(tokens):
+        raise TagExpressionError(f'标签筛选表达式在“{tokens[position]}”处格式错误')
+    return node
+
+def compile_tag_filter(node, entity_model, tag_model):
+    """
+    将语法树编译为SQL过滤条件（索引未就绪时使用）
+    每个标签条件对应一个EXISTS子查询
+    """
+    kind = node[0]
+    if kind == 'tag':
+        return entity_model.tags.any(tag_model.name == node[1])
+    if kind == 'not':
+        return not_(compile_tag_filter(node[1], entity_model, tag_model))
+    left = compile_tag_filter(node[1], entity_model, tag_model)
+    right = compile_tag_filter(node[2], entity_model, tag_model)
+    return and_(left, right) if kind == 'and' else or_(left, right)
+
+# ---------------------------------------------------------------------------
+# 位图索引
+# ---------------------------------------------------------------------------
+
+def _version_name(tag_type):
+    return f'tags:{tag_type}'
+
+def source_version(tag_type):
+    """数据库中的共享版本号（主库独立连接读取，只读取 data_versions 的一行）"""
+    name = _version_name(tag_type)
+    return read_versions([name])[name]
+
+def bump_index_versions(connection, tag_types=TAG_TYPES):
+    """
+    增加标签类型的共享版本号，使各进程的索引在下次检查时重建
+    通过Core语句或连接直接写入实体表、标签表或关联表（不经过会话事件）后需要调用，
+    传入写入数据的连接使版本号随写入一起提交
+
+    Args:
+        connection: 写入数据的连接
+        tag_types: 发生变更的标签类型
+    """
+    bump_versions(connection, (_version_name(tag_type) for tag_type in tag_types))
+
+class TagBitmapIndex:
+    """单一标签类型（达人或素材）的位图索引"""
+
+    def __init__(self, tag_type):
+        self.tag_type = tag_type
+        self._bitmaps = {}
+        self._universe = 0
+        # 索引对应的共享版本号（见source_version），随增量变更同步推进
+        self._version = None
+        self._checked_at = 0.0
+        self._ready = False
+        self._building = False
+        self._build_log = []
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._ready
+
+    def build(self):
+        """从数据库全量构建索引（需在应用上下文中调用）"""
+        entity_model, tag_model, association = TAG_TYPES[self.tag_type]
+        entity_column = next(c for c in association.c if c.name != 'tag_id')
+
+        with self._lock:
+            self._building = True
+            self._build_log = []
+            generation = self._generation
+
+        try:
+            # 先读取版本号再读取数据：其间提交的变更会在重放或下次检查时处理
+            version = source_version(self.tag_type)
+            universe = bitset_from_ids(db.session.execute(select(entity_model.id)).scalars())
+
+            members = {}
+            rows = db.session.execute(
+                select(tag_model.name, entity_column)
+                .join(association, association.c.tag_id == tag_model.id)
+            )
+            for tag_name, entity_id in rows:
+                members.setdefault(tag_name, []).append(entity_id)
+            bitmaps = {tag_name: bitset_from_ids(ids) for tag_name, ids in members.items()}
+        except Exception:
+            with self._lock:
+                self._building = False
+                self._build_log = []
+            raise
+
+        with self._lock:
+            self._building = False
+            if generation != self._generation:
+                # 构建期间索引被置为失效，丢弃本次结果
+                self._build_log = []
+                return
+            self._bitmaps = bitmaps
+            self._universe = universe
+            self._version = version
+            self._checked_at = time.monotonic()
+            self._ready = True
+            # 重放构建期间本进程提交的变更，置位/清位操作是幂等的
+            for changes in self._build_log:
+                self._apply_locked(*changes)
+            self._build_log = []
+
+        logger.info(f"{self.tag_type} 标签位图索引构建完成：{popcount(universe)} 个实体，{len(bitmaps)} 个标签")
+
+    def ensure_built(self, app=None):
+        """索引未就绪时在后台线程中构建"""
+        with self._lock:
+            if self._ready or self._building:
+                return
+            self._building = True
+
+        app = app or current_app._get_current_object()
+
+        def run():
+            with app.app_context():
+                try:
+                    self.build()
+                except Exception as e:
+                    logger.error(f"{self.tag_type} 标签位图索引构建失败: {str(e)}")
+                finally:
+                    db.session.remove()
+
+        threading.Thread(target=run, name=f'tag-index-{self.tag_type}', daemon=True).start()
+
+    def invalidate(self):
+        """使索引失效，下次查询时重新构建"""
+        with self._lock:
+            self._invalidate_locked()
+
+    def _invalidate_locked(self):
+        self._generation += 1
+        self._ready = False
+        self._bitmaps = {}
+        self._universe = 0
+        self._version = None
+
+    def is_current(self):
+        """
+        索引是否与数据库一致
+        按 TAG_INDEX_CHECK_INTERVAL 秒节流读取共享版本号，与索引的版本号不一致时使索引失效
+        """
+        interval = current_app.config.get('TAG_INDEX_CHECK_INTERVAL', 5)
+        with self._lock:
+            if not self._ready:
+                return False
+            now = time.monotonic()
+            if now - self._checked_at < interval:
+                return True
+            self._checked_at = now
+            generation = self._generation
+
+        version = source_version(self.tag_type)
+        with self._lock:
+            if generation != self._generation or not self._ready:
+                return False
+            if version == self._version:
+                return True
+            logger.info(f"{self.tag_type} 标签位图索引已过期（版本 {self._version} -> {version}），重新构建")
+            self._invalidate_locked()
+        return False
+
+    def apply(self, added_entities, removed_entities, tag_changes, version):
+        """
+        增量更新索引
+
+        Args:
+            added_entities: 新增实体ID列表
+            removed_entities: 删除实体ID列表
+            tag_changes: (实体ID, 标签名, 1/-1) 列表
+            version: 提交这些变更的事务增加后的共享版本号
+        """
+        with self._lock:
+            if self._building:
+                self._build_log.append((added_entities, removed_entities, tag_changes, version))
+            elif self._ready:
+                self._apply_locked(added_entities, removed_entities, tag_changes, version)
+
+    def _apply_locked(self, added_entities, removed_entities, tag_changes, version):
+        if version <= self._version:
+            # 构建索引时已包含这次提交
+            return
+        if version != self._version + 1:
+            # 其间有其他进程提交的变更，增量结果不完整
+            self._invalidate_locked()
+            return
+
+        self._version = version
+        for entity_id in added_entities:
+            self._universe |= 1 << entity_id
+        for entity_id, tag_name, delta in tag_changes:
+            bitmap = self._bitmaps.get(tag_name, 0)
+            if delta > 0:
+                self._bitmaps[tag_name] = bitmap | (1 << entity_id)
+            else:
+                self._bitmaps[tag_name] = bitmap & ~(1 << entity_id)
+        for entity_id in removed_entities:
+            self._universe &= ~(1 << entity_id)
+
+    def evaluate(self, node):
+        """在索引上计算语法树，返回结果位集"""
+        kind = node[0]
+        if kind == 'tag':
+            return self._bitmaps.get(node[1], 0)
+        if kind == 'not':
+            return self._universe & ~self.evaluate(node[1])
+        if kind == 'and':
+            return self.evaluate(node[1]) & self.evaluate(node[2])
+        return self.evaluate(node[1]) | self.evaluate(node[2])
+
+# 每种标签类型一个进程内索引
+tag_indexes = {tag_type: TagBitmapIndex(tag_type) for tag_type in TAG_TYPES}
+
+class TagBitmapPagination(Pagination):
+    """
+    基于位集结果的分页：总数由位集直接统计，只查询当前页的实体
+    指定排序时由数据库按标签过滤条件（EXISTS子查询）排序并取当前页，
+    不把位集中的全部ID放进 IN 列表
+    """
+
+    def _query_items(self):
+        bitset = self._query_args['bitset']
+        model = self._query_args['model']
+        order_by = self._query_args['order_by']
+        if order_by:
+            if not popcount(bitset):
+                return []
+            return self._query_args['query'].filter(self._query_args['tag_filter']).order_by(*order_by) \
+                .limit(self.per_page).offset(self._query_offset).all()
+
+        ids = bitset_slice(bitset, self._query_offset, self.per_page)
+        if not ids:
+            return []
+        items = {item.id: item for item in self._query_args['query'].filter(model.id.in_(ids))}
+        return [items[entity_id] for entity_id in ids if entity_id in items]
+
+    def _query_count(self):
+        return popcount(self._query_args['bitset'])
+
+def paginate_by_tags(query, tag_type, expression, page, per_page, scoped=False, order_by=()):
+    """
+    按标签表达式筛选并分页
+
+    Args:
+        query: 实体查询（可带其他过滤条件）
+        tag_type: 'influencer' 或 'material'
+        expression: 标签筛选表达式
+        page: 页码
+        per_page: 每页数量
+        scoped: query是否带有额外过滤条件（如按创建者过滤），为True时位图结果会与query的ID集合求交
+        order_by: 排序条件（默认按实体ID升序）
+
+    Returns:
+        Pagination: 分页结果，source属性标明结果来源（'index' 或 'sql'）
+
+    Raises:
+        TagExpressionError: 表达式格式错误
+    """
+    node = parse_tag_expression(expression)
+    entity_model, tag_model, _ = TAG_TYPES[tag_type]
+    index = tag_indexes[tag_type]
+
+    if current_app.config.get('TAG_INDEX_ENABLED'):
+        if index.is_current():
+            bitset = index.evaluate(node)
+            if scoped:
+                bitset &= bitset_from_ids(row[0] for row in query.with_entities(entity_model.id))
+            pagination = TagBitmapPagination(query=query, bitset=bitset, model=entity_model, order_by=order_by,
+                                             tag_filter=compile_tag_filter(node, entity_model, tag_model),
+                                             page=page, per_page=per_page, error_out=False)
+            pagination.source = 'index'
+            return pagination
+        index.ensure_built()
+
+    # 索引未就绪：回退到SQL
+    pagination = query.filter(compile_tag_filter(node, entity_model, tag_model)).order_by(
+        *(order_by or (entity_model.id,))
+    ).paginate(page=page, per_page=per_page, error_out=False)
+    pagination.source = 'sql'
+    return pagination
+
+# ---------------------------------------------------------------------------
+# 增量维护
+# ---------------------------------------------------------------------------
+
+_PENDING_KEY = 'tag_index_changes'
+
+_VERSIONS_KEY = 'tag_index_versions'
+
+def _collect_index_changes(session, flush_context):
+    """flush后记录标签关联变更，待事务提交后再应用到索引"""
+    pending = session.info.setdefault(_PENDING_KEY, {tag_type: [] for tag_type in TAG_TYPES})
+
+    for tag_type, (entity_model, tag_model, _) in TAG_TYPES.items():
+        # 标签改名或删除时直接使索引失效（仅关联集合变化的标签不算）
+        renamed = any(isinstance(obj, tag_model) and session.is_modified(obj, include_collections=False)
+                      for obj in session.dirty)
+        if renamed or any(isinstance(obj, tag_model) for obj in session.deleted):
+            pending[tag_type].append(None)
+            continue
+
+        added_entities = [obj.id for obj in session.new if isinstance(obj, entity_model)]
+        removed_entities = [obj.id for obj in session.deleted if isinstance(obj, entity_model)]
+        tag_changes = [(obj.id, tag.name, delta)
+                       for obj, tag, delta in iter_tag_changes(session, entity_model)]
+        if added_entities or removed_entities or tag_changes:
+            pending[tag_type].append((added_entities, removed_entities, tag_changes))
+
+def _bump_index_versions(session):
+    """提交前在同一事务中增加发生变更的标签类型的共享版本号，其他进程据此发现索引过期"""
+    # 先flush，使提交时才写入的变更也被记录
+    session.flush()
+    pending = session.info.get(_PENDING_KEY)
+    if not pending:
+        return
+    names = {tag_type: _version_name(tag_type) for tag_type, batches in pending.items() if batches}
+    if names:
+        versions = bump_versions(session.connection(), names.values())
+        session.info[_VERSIONS_KEY] = {tag_type: versions[name] for tag_type, name in names.items()}
+
+def _apply_index_changes(session):
+    """事务提交后应用变更"""
+    pending = session.info.pop(_PENDING_KEY, None)
+    versions = session.info.pop(_VERSIONS_KEY, {})
+    if not pending:
+        return
+    for tag_type, batches in pending.items():
+        if not batches:
+            continue
+        index = tag_indexes[tag_type]
+        if None in batches or tag_type not in versions:
+            index.invalidate()
+            continue
+        # 同一事务的多次flush合并为一次变更
+        merged = ([], [], [])
+        for changes in batches:
+            for target, items in zip(merged, changes):
+                target.extend(items)
+        index.apply(*merged, versions[tag_type])
+
+def _discard_index_changes(session):
+    """事务回滚时丢弃未提交的变更"""
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_VERSIONS_KEY, None)
+
+def init_tag_index(app):
+    """
+    注册标签变更事件
+    未启用索引（TAG_INDEX_ENABLED）的进程也要在标签变更时增加共享版本号，其他进程的索引才能发现变更
+
+    Args:
+        app: Flask应用实例
+    """
+    if not event.contains(db.session, 'after_flush', _collect_index_changes):
+        event.listen(db.session, 'after_flush', _collect_index_changes)
+        event.listen(db.session, 'before_commit', _bump_index_versions)
+        event.listen(db.session, 'after_commit', _apply_index_changes)
+        event.listen(db.session, 'after_rollback', _discard_index_changes)
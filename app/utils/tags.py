@@ -0,0 +1,163 @@
+"""
+标签统计工具
+提供标签使用次数的聚合查询，以及可选的冗余计数器维护。
+冗余计数器只随ORM会话中tags集合的变更更新：通过Core语句或连接直接写入关联表后
+（如 benchmarks.generate），须调用 rebuild_tag_usage_counters 重新计算
+"""
+
+from collections import Counter, defaultdict
+from itertools import chain
+from sqlalchemy import event, func, literal, select, union_all, update
+from sqlalchemy.orm.attributes import PASSIVE_NO_INITIALIZE, get_history
+from app import db
+from app.models import (Influencer, InfluencerTag, Material, MaterialTag,
+                        influencer_tag_association, material_tag_association)
+import logging
+
+# 创建日志记录器
+logger = logging.getLogger(__name__)
+
+# 标签类型 -> (实体模型, 标签模型, 关联表)
+TAG_TYPES = {
+    'influencer': (Influencer, InfluencerTag, influencer_tag_association),
+    'material': (Material, MaterialTag, material_tag_association),
+}
+
+# 是否启用冗余计数器（由init_tag_counters根据配置设置）
+_counters_enabled = False
+
+def _usage_count_query():
+    """
+    构建一次性统计所有标签使用次数的查询
+    对两张关联表分别GROUP BY后UNION ALL，只需一次数据库往返
+    """
+    selects = []
+    for tag_type, (_, _, association) in TAG_TYPES.items():
+        selects.append(
+            select(
+                literal(tag_type).label('tag_type'),
+                association.c.tag_id,
+                func.count().label('usage_count')
+            ).group_by(association.c.tag_id)
+        )
+    return union_all(*selects)
+
+def get_tag_usage_counts():
+    """
+    获取所有标签的使用次数
+
+    启用冗余计数器时直接读取标签表中的计数列，否则对关联表做一次GROUP BY聚合
+
+    Returns:
+        dict: {'influencer': {tag_id: count}, 'material': {tag_id: count}}
+    """
+    counts = {tag_type: {} for tag_type in TAG_TYPES}
+
+    if _counters_enabled:
+        for tag_type, (_, tag_model, _) in TAG_TYPES.items():
+            rows = db.session.query(tag_model.id, tag_model.usage_counter).all()
+            counts[tag_type] = {tag_id: usage_counter for tag_id, usage_counter in rows}
+        return counts
+
+    for tag_type, tag_id, usage_count in db.session.execute(_usage_count_query()):
+        counts[tag_type][tag_id] = usage_count
+    return counts
+
+def rebuild_tag_usage_counters():
+    """
+    根据关联表重新计算并写入所有标签的冗余计数器
+    用于首次启用计数器、绕过ORM批量写入关联表之后，或修复计数偏差
+    """
+    actual = defaultdict(dict)
+    for tag_type, tag_id, usage_count in db.session.execute(_usage_count_query()):
+        actual[tag_type][tag_id] = usage_count
+
+    for tag_type, (_, tag_model, _) in TAG_TYPES.items():
+        db.session.query(tag_model).update({tag_model.usage_counter: 0}, synchronize_session=False)
+        _apply_deltas(db.session.connection(), tag_model, Counter(actual[tag_type]))
+
+    db.session.commit()
+    logger.info("标签计数器重建完成")
+
+def _apply_deltas(connection, tag_model, deltas):
+    """
+    将计数增量写入标签表
+    相同增量的标签合并为一条UPDATE语句
+    """
+    by_delta = defaultdict(list)
+    for tag_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(tag_id)
+
+    for delta, tag_ids in by_delta.items():
+        connection.execute(
+            update(tag_model.__table__)
+            .where(tag_model.__table__.c.id.in_(tag_ids))
+            .values(usage_counter=tag_model.__table__.c.usage_counter + delta)
+        )
+
+def iter_tag_changes(session, entity_model):
+    """
+    遍历本次flush中实体tags集合的变更
+    需在after_flush事件中调用，此时实体主键已生成且变更历史尚未重置
+
+    Yields:
+        tuple: (实体, 标签, 1表示关联/-1表示取消关联)
+    """
+    for obj in chain(session.new, session.dirty):
+        if not isinstance(obj, entity_model):
+            continue
+        # 未加载的集合不可能发生变更，无需触发加载
+        history = get_history(obj, 'tags', passive=PASSIVE_NO_INITIALIZE)
+        for tag in history.added:
+            yield obj, tag, 1
+        for tag in history.deleted:
+            yield obj, tag, -1
+
+    # 删除实体时其所有关联行都会被删除
+    for obj in session.deleted:
+        if not isinstance(obj, entity_model):
+            continue
+        for tag in get_history(obj, 'tags').non_added():
+            yield obj, tag, -1
+
+def _collect_tag_deltas(session, entity_model):
+    """
+    根据本次flush中的标签变更计算每个标签的计数增量
+    """
+    deltas = Counter()
+    for _, tag, delta in iter_tag_changes(session, entity_model):
+        deltas[tag.id] += delta
+    return deltas
+
+def _sync_tag_counters(session, flush_context):
+    """
+    flush后同步冗余计数器
+    计数更新与关联表的写入处于同一事务中，回滚时一并撤销
+    """
+    for entity_model, tag_model, _ in TAG_TYPES.values():
+        deltas = _collect_tag_deltas(session, entity_model)
+        if deltas:
+            _apply_deltas(session.connection(), tag_model, deltas)
+
+def init_tag_counters(app):
+    """
+    根据配置启用标签冗余计数器
+
+    Args:
+        app: Flask应用实例
+    """
+    global _counters_enabled
+
+    @app.cli.command('rebuild-tag-counters')
+    def rebuild_tag_counters_command():
+        """重建标签使用次数计数器"""
+        rebuild_tag_usage_counters()
+
+    if not app.config.get('TAG_USAGE_COUNTERS'):
+        return
+
+    if not _counters_enabled:
+        event.listen(db.session, 'after_flush', _sync_tag_counters)
+        _counters_enabled = True
+        logger.info("已启用标签冗余计数器")
@@ -0,0 +1,139 @@
+"""
+登录用户缓存
+Flask-Login在每个已登录请求中都会加载当前用户，这里按用户ID缓存用户的列数据，
+命中时通过session.merge(load=False)挂载到当前会话，不再查询数据库。
+用户更新或删除时清除本进程的对应缓存，并在同一事务中增加共享版本号 users；
+其他进程按 USER_CACHE_CHECK_INTERVAL 秒节流比较版本号，版本号变化时清空本进程缓存
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+from app.utils.data_versions import bump_versions, read_versions
+
+# 用户表的共享版本号名称
+VERSION_NAME = 'users'
+
+class UserCache:
+    """按用户ID缓存已分离的User对象，带过期时间和容量上限"""
+
+    def __init__(self, ttl=60, max_size=1024, check_interval=5):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.check_interval = check_interval
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+
+    def check_version(self, read_version):
+        """
+        按check_interval秒节流读取共享版本号，与缓存的版本号不一致时清空缓存
+
+        Args:
+            read_version: 读取当前版本号的可调用对象
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+        version = read_version()
+        with self._lock:
+            if version != self._version:
+                self._items.clear()
+                self._version = version
+
+    def get(self, user_id):
+        with self._lock:
+            item = self._items.get(user_id)
+            if item is None:
+                return None
+            expires_at, user = item
+            if expires_at < time.monotonic():
+                del self._items[user_id]
+                return None
+            return user
+
+    def set(self, user_id, user):
+        with self._lock:
+            self._items[user_id] = (time.monotonic() + self.ttl, user)
+            self._items.move_to_end(user_id)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        """清除指定用户的缓存，不指定时清空全部"""
+        with self._lock:
+            if user_id is None:
+                self._items.clear()
+                self._version = None
+            else:
+                self._items.pop(user_id, None)
+
+# 进程内用户缓存（参数由init_user_cache按配置设置）
+user_cache = UserCache()
+
+def _detached_copy(user):
+    """复制用户的列属性，得到不属于任何会话的分离对象"""
+    mapper = inspect(type(user))
+    copy = type(user)(**{attr.key: getattr(user, attr.key) for attr in mapper.column_attrs})
+    make_transient_to_detached(copy)
+    return copy
+
+def load_user_cached(user_id):
+    """
+    加载用户，优先使用缓存
+
+    Args:
+        user_id: 用户ID
+
+    Returns:
+        User: 挂载到当前会话的用户对象，不存在时返回None
+    """
+    from app import db
+    from app.models import User
+
+    if user_cache.ttl <= 0:
+        return db.session.get(User, user_id)
+
+    user_cache.check_version(lambda: read_versions([VERSION_NAME])[VERSION_NAME])
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return db.session.merge(cached, load=False)
+
+    user = db.session.get(User, user_id)
+    if user is not None:
+        user_cache.set(user_id, _detached_copy(user))
+    return user
+
+def _invalidate_user(mapper, connection, target):
+    """在写入用户的同一事务中增加共享版本号，使其他进程的缓存失效"""
+    user_cache.invalidate(target.id)
+    bump_versions(connection, [VERSION_NAME])
+
+def _invalidate_updated_user(mapper, connection, target):
+    """只改变关联集合（如新增达人）时也会触发after_update，列值没有变化时不使缓存失效"""
+    state = inspect(target)
+    if any(state.attrs[attr.key].history.has_changes() for attr in mapper.column_attrs):
+        _invalidate_user(mapper, connection, target)
+
+def init_user_cache(app):
+    """
+    根据配置设置用户缓存并注册失效事件
+
+    Args:
+        app: Flask应用实例
+    """
+    from app.models import User
+
+    user_cache.ttl = app.config.get('USER_CACHE_TTL', 60)
+    user_cache.max_size = app.config.get('USER_CACHE_SIZE', 1024)
+    user_cache.check_interval = app.config.get('USER_CACHE_CHECK_INTERVAL', 5)
+    user_cache.invalidate()
+
+    for event_name, listener in (('after_update', _invalidate_updated_user), ('after_delete', _invalidate_user)):
+        if not event.contains(User, event_name, listener):
+            event.listen(User, event_name, listener)
@@ -5,9 +5,13 @@
 
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
-from app import db, bcrypt
-from app.models import User
+from app import db
+from app.models import User, Influencer, Material, PromotionData
 from app.forms import LoginForm, UserRegisterForm
+from app.utils.http_cache import conditional_get
+from app.utils.replica import read_replica
+from app.utils.passwords import needs_rehash
+from app.utils.reports import creator_counts
 
 # 创建账户蓝图
 accounts_bp = Blueprint('accounts', __name__, template_folder='templates')
@@ -28,7 +32,12 @@ def login():
         user = User.query.filter_by(username=form.username.data).first()
         
         # 验证用户和密码
-        if user and bcrypt.check_password_hash(user.password, form.password.data):
+        if user and user.check_password(form.password.data):
+            # 哈希算法或计算成本与当前配置不同时重新哈希
+            if needs_rehash(user.password):
+                user.set_password(form.password.data)
+                db.session.commit()
+            
             # 登录用户
             login_user(user, remember=form.remember.data)
             
@@ -54,16 +63,13 @@ def register():
     form = UserRegisterForm()
     
     if form.validate_on_submit():
-        # 生成密码哈希
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
-        
         # 创建新用户
         user = User(
             username=form.username.data,
             email=form.email.data,
-            password=hashed_password,
             role=form.role.data
         )
+        user.set_password(form.password.data)
         
         # 保存用户到数据库
         db.session.add(user)
@@ -84,6 +90,9 @@ def logout():
 
 @accounts_bp.route('/dashboard')
 @login_required
+@read_replica
+@conditional_get(lambda: [model.query.filter_by(created_by_id=current_user.id)
+                          for model in (Influencer, Material, PromotionData)])
 def dashboard():
     """
     用户仪表盘视图
@@ -93,30 +102,28 @@ def dashboard():
     if current_user.is_business():
         # 商务用户仪表盘
         # 显示该商务创建的达人数量和素材数量
-        influencers_count = User.query.get(current_user.id).created_influencers.count()
-        materials_count = User.query.get(current_user.id).created_materials.count()
+        counts = creator_counts(current_user.id)
         
         context = {
             'title': '商务仪表盘',
             'user_type': '商务',
             'stats': {
-                'influencers_count': influencers_count,
-                'materials_count': materials_count
+                'influencers_count': counts['influencers_count'],
+                'materials_count': counts['materials_count']
             }
         }
         
     elif current_user.is_pitcher():
         # 投手用户仪表盘
         # 显示所有可查看的素材数量和推广数据数量
-        materials_count = User.query.get(current_user.id).created_materials.count()
-        promotions_count = User.query.get(current_user.id).created_promotions.count()
+        counts = creator_counts(current_user.id)
         
         context = {
             'title': '投手仪表盘',
             'user_type': '投手',
             'stats': {
-                'materials_count': materials_count,
-                'promotions_count': promotions_count
+                'materials_count': counts['materials_count'],
+                'promotions_count': counts['promotions_count']
             }
         }
     else:
@@ -0,0 +1,88 @@
+"""
+管理视图
+展示定时任务的执行历史与耗时趋势
+"""
+
+from datetime import datetime, timedelta
+from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask_login import login_required, current_user
+from sqlalchemy import case, func, text
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+from app.models import JobRun
+from app.utils.scheduler import SCHEDULED_JOBS
+
+# 创建管理蓝图
+admin_bp = Blueprint('admin', __name__, template_folder='templates')
+
+def _next_run_times():
+    """从持久化任务存储中读取各任务的下次执行时间（调度器可能运行在其他进程中）"""
+    try:
+        rows = db.session.execute(text('SELECT id, next_run_time FROM apscheduler_jobs')).all()
+    except SQLAlchemyError:
+        db.session.rollback()
+        return {}
+    return {job_id: datetime.utcfromtimestamp(next_run) if next_run else None for job_id, next_run in rows}
+
+@admin_bp.route('/admin/scheduler')
+@login_required
+def scheduler_runs():
+    """
+    定时任务执行历史视图
+    只有投手用户可以查看
+    """
+    # 权限检查
+    if not current_user.is_pitcher():
+        flash('权限不足，仅投手用户可查看定时任务', 'danger')
+        return redirect(url_for('accounts.dashboard'))
+
+    days = min(request.args.get('days', 30, type=int), 365)
+    job_id = request.args.get('job_id')
+    since = datetime.utcnow() - timedelta(days=days)
+
+    # 最近的执行记录
+    recent_query = JobRun.query.order_by(JobRun.id.desc())
+    if job_id:
+        recent_query = recent_query.filter_by(job_id=job_id)
+    recent_runs = recent_query.limit(100).all()
+
+    # 各任务在统计区间内的汇总
+    summary_rows = db.session.query(
+        JobRun.job_id,
+        func.count(JobRun.id),
+        func.sum(case((JobRun.status == 'failed', 1), else_=0)),
+        func.sum(case((JobRun.status == 'missed', 1), else_=0)),
+        func.avg(JobRun.duration_seconds),
+        func.max(JobRun.duration_seconds),
+        func.sum(JobRun.rows_processed),
+        func.max(JobRun.start_time),
+    ).filter(func.coalesce(JobRun.start_time, JobRun.scheduled_time) >= since).group_by(JobRun.job_id).all()
+
+    next_runs = _next_run_times()
+    summaries = {job: {'name': name, 'runs': 0, 'failed': 0, 'missed': 0, 'avg_duration': None,
+                       'max_duration': None, 'rows': 0, 'last_run': None, 'next_run': next_runs.get(job)}
+                 for job, (name, _, _) in SCHEDULED_JOBS.items()}
+    for job, runs, failed, missed, avg_duration, max_duration, rows, last_run in summary_rows:
+        summaries.setdefault(job, {'name': job, 'next_run': next_runs.get(job)}).update({
+            'runs': runs, 'failed': failed or 0, 'missed': missed or 0, 'avg_duration': avg_duration,
+            'max_duration': max_duration, 'rows': rows or 0, 'last_run': last_run,
+        })
+
+    # 按天统计的平均耗时趋势
+    day = func.date(JobRun.start_time)
+    trend_rows = db.session.query(JobRun.job_id, day, func.avg(JobRun.duration_seconds)) \
+        .filter(JobRun.start_time >= since, JobRun.duration_seconds.isnot(None)) \
+        .group_by(JobRun.job_id, day).order_by(JobRun.job_id, day).all()
+    trends = {}
+    for job, run_date, avg_duration in trend_rows:
+        trends.setdefault(job, []).append({'date': str(run_date), 'duration': float(avg_duration)})
+    trend_max = {job: max(item['duration'] for item in items) or 1 for job, items in trends.items()}
+
+    return render_template('admin/scheduler.html',
+                          title='定时任务',
+                          summaries=summaries,
+                          recent_runs=recent_runs,
+                          trends=trends,
+                          trend_max=trend_max,
+                          days=days,
+                          current_job_id=job_id)
@@ -0,0 +1,37 @@
+"""
+首页仪表盘视图
+展示达人、素材、推广数据总数以及最近的推广数据
+"""
+
+from flask import Blueprint, render_template
+from flask_login import login_required
+from sqlalchemy.orm import joinedload
+from app.models import Influencer, Material, PromotionData
+from app.utils.http_cache import conditional_get
+from app.utils.replica import read_replica
+from app.utils.scoping import scoped_query
+
+# 创建仪表盘蓝图
+dashboard_bp = Blueprint('dashboard', __name__, template_folder='templates')
+
+@dashboard_bp.route('/')
+@login_required
+@read_replica
+@conditional_get(lambda: [scoped_query(Influencer), scoped_query(Material), scoped_query(PromotionData)])
+def index():
+    """
+    首页仪表盘视图
+    - 商务用户：只统计自己创建的数据
+    - 投手用户：统计所有数据
+    """
+    # 最近推广数据，一次性加载素材及达人避免逐行查询
+    recent_promotions = scoped_query(PromotionData).options(
+        joinedload(PromotionData.material).joinedload(Material.influencer)
+    ).order_by(PromotionData.date.desc()).limit(10).all()
+    
+    return render_template('dashboard.html', 
+                          title='仪表盘', 
+                          influencers_count=scoped_query(Influencer).count(),
+                          materials_count=scoped_query(Material).count(),
+                          promotions_count=scoped_query(PromotionData).count(),
+                          recent_promotions=recent_promotions)
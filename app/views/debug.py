@@ -0,0 +1,43 @@
+"""
+调试视图
+展示SQL分析器记录的慢请求与疑似N+1查询
+"""
+
+from flask import Blueprint, render_template, redirect, url_for, flash, current_app
+from flask_login import login_required, current_user
+from app.utils.sql_profiler import slow_requests
+
+# 创建调试蓝图
+debug_bp = Blueprint('debug', __name__, template_folder='templates')
+
+@debug_bp.route('/debug/sql-profiler')
+@login_required
+def sql_profiler():
+    """
+    SQL分析器视图
+    只有投手用户可以查看
+    """
+    # 权限检查
+    if not current_user.is_pitcher():
+        flash('权限不足，仅投手用户可查看SQL分析', 'danger')
+        return redirect(url_for('accounts.dashboard'))
+    
+    return render_template('debug/sql_profiler.html', 
+                          title='SQL分析', 
+                          requests=slow_requests.items(),
+                          slow_threshold_ms=current_app.config.get('SQL_PROFILER_SLOW_MS'),
+                          repeat_threshold=current_app.config.get('SQL_PROFILER_N_PLUS_ONE_THRESHOLD'))
+
+@debug_bp.route('/debug/sql-profiler/clear', methods=['POST'])
+@login_required
+def sql_profiler_clear():
+    """
+    清空慢请求记录
+    """
+    if not current_user.is_pitcher():
+        flash('权限不足，仅投手用户可操作', 'danger')
+        return redirect(url_for('accounts.dashboard'))
+    
+    slow_requests.clear()
+    flash('慢请求记录已清空', 'success')
+    return redirect(url_for('debug.sql_profiler'))
@@ -3,17 +3,46 @@
 处理达人信息的增删改查功能
 """
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from datetime import date
+from flask import Blueprint, current_app, render_template, redirect, url_for, flash, request
+from sqlalchemy import func
 from flask_login import login_required, current_user
 from app import db
-from app.models import Influencer, Material
+from app.models import Influencer, InfluencerMetrics, InfluencerScore, Material, MaterialForecast, PromotionData
+from app.models import influencer_tag_association, material_tag_association
 from app.forms import InfluencerForm, MaterialForm, MaterialTagForm
+from app.utils.tag_index import paginate_by_tags, TagExpressionError
+from app.utils.http_cache import association_rows, conditional_get
+from app.utils.replica import read_replica
+from app.utils.scoping import scoped_query
+from app.utils.similarity import index_version, recommend_influencers, SimilarityIndexError
 
 # 创建达人管理蓝图
 influencers_bp = Blueprint('influencers', __name__, template_folder='templates')
 
+def _promotion_counts(material_ids):
+    """一次分组查询获取素材的推广数据条数，避免模板中逐个素材查询"""
+    if not material_ids:
+        return {}
+    return dict(db.session.query(PromotionData.material_id, func.count(PromotionData.id))
+                .filter(PromotionData.material_id.in_(material_ids))
+                .group_by(PromotionData.material_id).all())
+
+# 达人列表可用的排序字段（读取预先计算的influencer_scores与influencer_metrics）
+INFLUENCER_SORTS = {
+    'score': ('综合评分', InfluencerScore.score),
+    'engagement_rate': ('互动率', InfluencerMetrics.engagement_rate),
+    'play_growth_7d': ('近7天播放增长', InfluencerMetrics.play_growth_7d),
+    'play_growth_30d': ('近30天播放增长', InfluencerMetrics.play_growth_30d),
+    'level_percentile': ('等级内百分位', InfluencerMetrics.level_percentile),
+    'total_plays': ('总播放量', InfluencerMetrics.total_plays),
+}
+
 @influencers_bp.route('/influencers')
 @login_required
+@read_replica
+@conditional_get(lambda: [scoped_query(Influencer), influencer_tag_association, InfluencerMetrics.query,
+                                InfluencerScore.query])
 def influencer_list():
     """
     达人列表视图
@@ -24,21 +53,73 @@ def influencer_list():
     page = request.args.get('page', 1, type=int)
     per_page = 10
     
+    # 标签筛选表达式，如 "美妆 AND 测评 NOT 开箱"
+    tags = request.args.get('tags', '').strip()
+    
+    # 指标排序与筛选
+    sort = request.args.get('sort', '')
+    level = request.args.get('level', '').strip()
+    min_engagement = request.args.get('min_engagement', type=float)
+    
     # 根据用户角色查询达人列表
     if current_user.is_business():
         # 商务用户只看到自己创建的达人
-        influencers = Influencer.query.filter_by(created_by_id=current_user.id).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        query = Influencer.query.filter_by(created_by_id=current_user.id)
     else:
         # 投手用户可以看到所有达人
-        influencers = Influencer.query.paginate(
+        query = Influencer.query
+    
+    # 连接指标表与评分表用于筛选和排序
+    query = query.outerjoin(Influencer.metrics).outerjoin(Influencer.score)
+    if level:
+        query = query.filter(Influencer.influencer_level == level)
+    if min_engagement is not None:
+        # 页面上以百分比输入
+        query = query.filter(InfluencerMetrics.engagement_rate >= min_engagement / 100)
+    filtered = bool(level) or min_engagement is not None
+    
+    # 排序同时作用于标签筛选结果
+    order_by = ()
+    if sort in INFLUENCER_SORTS:
+        column = INFLUENCER_SORTS[sort][1]
+        order_by = (column.is_(None), column.desc(), Influencer.id)
+    
+    influencers = None
+    if tags:
+        try:
+            influencers = paginate_by_tags(query, 'influencer', tags, page, per_page,
+                                           scoped=current_user.is_business() or filtered, order_by=order_by)
+        except TagExpressionError as e:
+            flash(str(e), 'warning')
+    
+    if influencers is None:
+        if order_by:
+            query = query.order_by(*order_by)
+        influencers = query.paginate(
             page=page, per_page=per_page, error_out=False
         )
     
+    # 一次查询出当前页达人的指标与评分
+    page_ids = [influencer.id for influencer in influencers.items]
+    metrics = {item.influencer_id: item for item in
+               InfluencerMetrics.query.filter(InfluencerMetrics.influencer_id.in_(page_ids))} if page_ids else {}
+    scores = {item.influencer_id: item for item in
+              InfluencerScore.query.filter(InfluencerScore.influencer_id.in_(page_ids))} if page_ids else {}
+    
+    levels = [row[0] for row in db.session.query(Influencer.influencer_level)
+              .filter(Influencer.influencer_level.isnot(None)).distinct().order_by(Influencer.influencer_level)]
+    
     return render_template('influencers/influencer_list.html', 
                           title='达人列表', 
-                          influencers=influencers)
+                          influencers=influencers,
+                          metrics=metrics,
+                          scores=scores,
+                          current_tags=tags,
+                          sorts={key: label for key, (label, _) in INFLUENCER_SORTS.items()},
+                          levels=levels,
+                          current_sort=sort,
+                          current_level=level,
+                          current_min_engagement=min_engagement)
 
 @influencers_bp.route('/influencers/create', methods=['GET', 'POST'])
 @login_required
@@ -137,6 +218,18 @@ def influencer_delete(influencer_id):
 
 @influencers_bp.route('/influencers/<int:influencer_id>')
 @login_required
+@read_replica
+@conditional_get(lambda influencer_id: [Influencer.query.filter_by(id=influencer_id),
+                                        Material.query.filter_by(influencer_id=influencer_id),
+                                        InfluencerMetrics.query.filter_by(influencer_id=influencer_id),
+                                        InfluencerScore.query.filter_by(influencer_id=influencer_id),
+                                        MaterialForecast.query.join(Material, Material.id == MaterialForecast.material_id)
+                                        .filter(Material.influencer_id == influencer_id),
+                                        PromotionData.query.join(Material, Material.id == PromotionData.material_id)
+                                        .filter(Material.influencer_id == influencer_id),
+                                        date.today(),
+                                        association_rows(influencer_tag_association, influencer_id=influencer_id),
+                                        index_version(current_app.config.get('SIMILARITY_INDEX_DIR', 'similarity'))])
 def influencer_detail(influencer_id):
     """
     达人详情视图
@@ -150,15 +243,41 @@ def influencer_detail(influencer_id):
         return redirect(url_for('influencers.influencer_list'))
     
     # 获取该达人的素材列表
-    materials = influencer.materials.order_by(Material.created_at.desc()).all()
+    materials = Material.query.filter_by(influencer_id=influencer.id).order_by(Material.create_time.desc()).all()
+    
+    # 该达人全部素材未来7天的预测之和
+    forecasts = db.session.query(
+        MaterialForecast.forecast_date,
+        func.sum(MaterialForecast.cost), func.sum(MaterialForecast.cost_lower), func.sum(MaterialForecast.cost_upper),
+        func.sum(MaterialForecast.sales_amount), func.sum(MaterialForecast.sales_lower),
+        func.sum(MaterialForecast.sales_upper),
+    ).join(Material, Material.id == MaterialForecast.material_id) \
+        .filter(Material.influencer_id == influencer.id, MaterialForecast.forecast_date >= date.today()) \
+        .group_by(MaterialForecast.forecast_date).order_by(MaterialForecast.forecast_date).all()
+    
+    # 相似达人推荐（商务用户只推荐自己创建的达人），索引未构建时不显示
+    try:
+        similar = recommend_influencers(
+            current_app.config.get('SIMILARITY_INDEX_DIR', 'similarity'), influencer.id, 5,
+            created_by_id=current_user.id if current_user.is_business() else None
+        )
+    except SimilarityIndexError:
+        similar = []
     
     return render_template('influencers/influencer_detail.html', 
                           title='达人详情', 
                           influencer=influencer,
-                          materials=materials)
+                          metrics=influencer.metrics,
+                          score=influencer.score,
+                          similar=similar,
+                          forecasts=forecasts,
+                          materials=materials,
+                          promotion_counts=_promotion_counts([m.id for m in materials]))
 
 @influencers_bp.route('/materials')
 @login_required
+@read_replica
+@conditional_get(lambda: [scoped_query(Material), material_tag_association, PromotionData.query])
 def material_list():
     """
     素材列表视图
@@ -169,21 +288,35 @@ def material_list():
     page = request.args.get('page', 1, type=int)
     per_page = 10
     
+    # 标签筛选表达式
+    tags = request.args.get('tags', '').strip()
+    
     # 根据用户角色查询素材列表
     if current_user.is_business():
         # 商务用户只看到自己创建的素材
-        materials = Material.query.filter_by(created_by_id=current_user.id).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        query = Material.query.filter_by(created_by_id=current_user.id)
     else:
         # 投手用户可以看到所有素材
-        materials = Material.query.paginate(
+        query = Material.query
+    
+    materials = None
+    if tags:
+        try:
+            materials = paginate_by_tags(query, 'material', tags, page, per_page,
+                                         scoped=current_user.is_business())
+        except TagExpressionError as e:
+            flash(str(e), 'warning')
+    
+    if materials is None:
+        materials = query.paginate(
             page=page, per_page=per_page, error_out=False
         )
     
     return render_template('influencers/material_list.html', 
                           title='素材列表', 
-                          materials=materials)
+                          materials=materials,
+                          promotion_counts=_promotion_counts([m.id for m in materials.items]),
+                          current_tags=tags)
 
 @influencers_bp.route('/materials/create', methods=['GET', 'POST'])
 @login_required
@@ -289,6 +422,11 @@ def material_delete(material_id):
 
 @influencers_bp.route('/materials/<int:material_id>')
 @login_required
+@read_replica
+@conditional_get(lambda material_id: [Material.query.filter_by(id=material_id),
+                                      PromotionData.query.filter_by(material_id=material_id),
+                                      MaterialForecast.query.filter_by(material_id=material_id),
+                                      date.today()])
 def material_detail(material_id):
     """
     素材详情视图
@@ -301,9 +439,17 @@ def material_detail(material_id):
         flash('权限不足，无法查看此素材', 'danger')
         return redirect(url_for('influencers.material_list'))
     
+    forecasts = MaterialForecast.query.filter(
+        MaterialForecast.material_id == material.id, MaterialForecast.forecast_date >= date.today()
+    ).order_by(MaterialForecast.forecast_date).all()
+    
+    promotions = PromotionData.query.filter_by(material_id=material.id).order_by(PromotionData.date.desc()).all()
+    
     return render_template('influencers/material_detail.html', 
                           title='素材详情', 
-                          material=material)
+                          material=material,
+                          promotions=promotions,
+                          forecasts=forecasts)
 
 @influencers_bp.route('/tags', methods=['GET', 'POST'])
 @login_required
@@ -317,10 +463,15 @@ def tag_management():
         flash('权限不足，仅商务用户可管理标签', 'danger')
         return redirect(url_for('accounts.dashboard'))
     
-    from app.models import MaterialTag
+    from app.models import InfluencerTag, MaterialTag
+    from app.utils.tags import get_tag_usage_counts
     
     # 获取所有标签
-    tags = MaterialTag.query.all()
+    influencer_tags = InfluencerTag.query.order_by(InfluencerTag.name).all()
+    material_tags = MaterialTag.query.order_by(MaterialTag.name).all()
+    
+    # 一次聚合查询获取所有标签的使用次数
+    tag_usage_counts = get_tag_usage_counts()
     
     form = MaterialTagForm()
     
@@ -340,4 +491,7 @@ def tag_management():
     return render_template('influencers/tag_management.html', 
                           title='标签管理', 
                           form=form, 
-                          tags=tags)
\ No newline at end of file
+                          influencer_tags=influencer_tags,
+                          material_tags=material_tags,
+                          influencer_tag_counts=tag_usage_counts['influencer'],
+                          material_tag_counts=tag_usage_counts['material'])
\ No newline at end of file
@@ -6,16 +6,21 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from app import db
-from app.models import PromotionData, Material
+from app.models import PromotionData, Material, Influencer, MaterialTag, BackgroundJob
 from app.forms import PromotionDataForm
 from datetime import datetime
-from app.api.client import douyin_client
+from app.utils.jobs import enqueue_job
+from app.utils.http_cache import conditional_get
+from app.utils.replica import read_replica
+from app.utils.scoping import scoped_query
 
 # 创建推广管理蓝图
 promotions_bp = Blueprint('promotions', __name__, template_folder='templates')
 
 @promotions_bp.route('/promotions')
 @login_required
+@read_replica
+@conditional_get(lambda: [scoped_query(PromotionData), scoped_query(Material)])
 def promotion_list():
     """
     推广数据列表视图
@@ -187,6 +192,8 @@ def promotion_delete(promotion_id):
 
 @promotions_bp.route('/promotions/<int:promotion_id>')
 @login_required
+@read_replica
+@conditional_get(lambda promotion_id: [PromotionData.query.filter_by(id=promotion_id)])
 def promotion_detail(promotion_id):
     """
     推广数据详情视图
@@ -203,7 +210,8 @@ def promotion_detail(promotion_id):
 def batch_fetch_promotions():
     """
     批量获取推广数据视图
-    只有投手用户可以使用
+    只有投手用户可以使用，可选择多个素材、某个达人的全部素材或带有某个标签的全部素材；
+    获取操作作为后台任务执行，页面轮询任务进度
     """
     # 权限检查
     if not current_user.is_pitcher():
@@ -214,69 +222,58 @@ def batch_fetch_promotions():
     material_id = request.args.get('material_id', type=int)
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
-    
-    # 获取所有素材
-    materials = Material.query.all()
+    job_id = request.args.get('job_id', type=int)
     
     if request.method == 'POST':
         try:
             # 获取表单数据
-            material_id = request.form.get('material_id', type=int)
+            mode = request.form.get('mode', 'materials')
             start_date = request.form.get('start_date')
             end_date = request.form.get('end_date')
+            params = {'start_date': start_date, 'end_date': end_date, 'user_id': current_user.id}
             
-            if not material_id:
-                flash('请选择素材', 'danger')
-                return redirect(url_for('promotions.batch_fetch_promotions'))
-            
-            # 获取素材
-            material = Material.query.get_or_404(material_id)
-            
-            # 准备日期范围
-            date_range = None
-            if start_date and end_date:
-                date_range = (start_date, end_date)
-            
-            # 调用API获取推广数据
-            promotion_data_list = douyin_client.get_promotion_data(material.material_id, date_range)
+            if mode == 'influencer':
+                influencer_id = request.form.get('influencer_id', type=int)
+                if not influencer_id:
+                    flash('请选择达人', 'danger')
+                    return redirect(url_for('promotions.batch_fetch_promotions'))
+                params['influencer_id'] = Influencer.query.get_or_404(influencer_id).id
+            elif mode == 'tag':
+                tag = request.form.get('tag', '').strip()
+                if not tag:
+                    flash('请选择素材标签', 'danger')
+                    return redirect(url_for('promotions.batch_fetch_promotions'))
+                params['tag'] = tag
+            else:
+                material_ids = request.form.getlist('material_ids', type=int)
+                if not material_ids:
+                    flash('请选择素材', 'danger')
+                    return redirect(url_for('promotions.batch_fetch_promotions'))
+                params['material_ids'] = material_ids
             
-            if not promotion_data_list:
-                flash('未获取到推广数据', 'info')
-                return redirect(url_for('promotions.batch_fetch_promotions'))
+            # 提交后台任务，立即返回
+            job = enqueue_job('promotion_fetch', params, user_id=current_user.id)
             
-            # 保存推广数据
-            saved_count = 0
-            for pd in promotion_data_list:
-                # 检查是否已存在
-                existing = PromotionData.query.filter_by(
-                    material_id=material.id,
-                    date=datetime.strptime(pd['date'], '%Y-%m-%d').date()
-                ).first()
-                
-                if not existing:
-                    promotion_data = PromotionData(
-                        material_id=material.id,
-                        date=datetime.strptime(pd['date'], '%Y-%m-%d').date(),
-                        cost=pd['cost'],
-                        sales_amount=pd['sales_amount'],
-                        roi=pd['roi'],
-                        created_by_id=current_user.id
-                    )
-                    db.session.add(promotion_data)
-                    saved_count += 1
-            
-            db.session.commit()
-            
-            flash(f'成功获取并保存 {saved_count} 条推广数据', 'success')
-            return redirect(url_for('promotions.promotion_list', material_id=material_id))
+            flash(f'已提交获取任务 #{job.id}，可在下方查看进度', 'info')
+            return redirect(url_for('promotions.batch_fetch_promotions', job_id=job.id,
+                                    start_date=start_date, end_date=end_date))
             
         except Exception as e:
             db.session.rollback()
-            flash(f'获取数据失败: {str(e)}', 'danger')
+            flash(f'提交获取任务失败: {str(e)}', 'danger')
+    
+    # 获取所有素材、达人与素材标签
+    materials = Material.query.all()
+    influencers = Influencer.query.order_by(Influencer.name).all()
+    material_tags = MaterialTag.query.order_by(MaterialTag.name).all()
+    job = BackgroundJob.query.get(job_id) if job_id else None
     
     return render_template('promotions/batch_fetch.html', 
                           title='批量获取推广数据', 
                           materials=materials,
+                          influencers=influencers,
+                          material_tags=material_tags,
+                          job=job,
                           current_material_id=material_id,
                           current_start_date=start_date,
-                          current_end_date=end_date)
\ No newline at end of file
+                          current_end_date=end_date)
@@ -0,0 +1,3 @@
+"""
+性能基准脚本
+"""
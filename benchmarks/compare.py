@@ -0,0 +1,82 @@
+"""
+基准结果对比
+比较两次 benchmarks.run 输出的JSON，列出每项基准中位数耗时的变化；
+任一项变慢超过阈值时以非零状态退出，可用于CI
+
+用法：
+    python -m benchmarks.compare results/base.json results/head.json --threshold 0.2
+"""
+
+import argparse
+import json
+import sys
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def compare(base, head, threshold, metric='median_ms', min_ms=1.0):
+    """
+    对比两份结果
+
+    Args:
+        base: 基准结果
+        head: 新结果
+        threshold: 允许的相对变慢比例，如0.2表示20%
+        metric: 对比的统计字段
+        min_ms: 两次耗时都低于该值时忽略，避免微小波动被判定为退化
+
+    Returns:
+        tuple: (对比行列表, 退化项名称列表)
+    """
+    rows = []
+    regressions = []
+    base_results = base.get('results', {})
+    head_results = head.get('results', {})
+    for name in sorted(set(base_results) | set(head_results)):
+        before = base_results.get(name, {})
+        after = head_results.get(name, {})
+        if 'error' in after and 'error' not in before:
+            rows.append((name, before.get(metric), None, '新增失败'))
+            regressions.append(name)
+            continue
+        if metric not in before or metric not in after:
+            rows.append((name, before.get(metric), after.get(metric), '缺失'))
+            continue
+        old, new = before[metric], after[metric]
+        change = (new - old) / old if old else 0.0
+        status = ''
+        if change > threshold and max(old, new) >= min_ms:
+            status = '变慢'
+            regressions.append(name)
+        elif change < -threshold and max(old, new) >= min_ms:
+            status = '变快'
+        rows.append((name, old, new, f'{change:+.1%} {status}'.strip()))
+    return rows, regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='对比两次基准测试结果')
+    parser.add_argument('base', help='基准结果JSON')
+    parser.add_argument('head', help='新结果JSON')
+    parser.add_argument('--threshold', type=float, default=0.2, help='判定为退化的相对变慢比例')
+    parser.add_argument('--metric', default='median_ms', choices=['median_ms', 'p95_ms', 'min_ms', 'max_ms'])
+    parser.add_argument('--min-ms', type=float, default=1.0, help='低于该耗时的项目不判定退化')
+    args = parser.parse_args()
+
+    base, head = load(args.base), load(args.head)
+    if base.get('dialect') != head.get('dialect') or base.get('row_counts') != head.get('row_counts'):
+        print('警告：两次结果的数据库类型或数据量不同，对比结果仅供参考')
+
+    rows, regressions = compare(base, head, args.threshold, args.metric, args.min_ms)
+    print(f"{(base.get('git_commit') or '?')[:10]} -> {(head.get('git_commit') or '?')[:10]}（{args.metric}）")
+    for name, old, new, note in rows:
+        old_text = f'{old:.2f}' if isinstance(old, (int, float)) else '-'
+        new_text = f'{new:.2f}' if isinstance(new, (int, float)) else '-'
+        print(f'{name:<55} {old_text:>10} {new_text:>10}  {note}')
+
+    if regressions:
+        print(f'共 {len(regressions)} 项退化超过 {args.threshold:.0%}')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
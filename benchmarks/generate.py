@@ -0,0 +1,351 @@
+"""
+合成数据生成器
+按固定随机种子生成用户、达人、素材、标签关联与推广数据，用于基准测试和容量评估
+PostgreSQL使用COPY批量写入，其他数据库使用executemany分块插入
+
+用法：
+    python -m benchmarks.generate --influencers 10000 --materials 200000 --days 250
+    python -m benchmarks.generate --database-url sqlite:///bench.db --scale small
+"""
+
+import argparse
+import csv
+import io
+import math
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+# 预设规模：(用户数, 达人数, 素材数, 推广数据天数)
+SCALES = {
+    'small': (10, 500, 5000, 30),
+    'medium': (50, 10000, 200000, 30),
+    'large': (50, 10000, 200000, 250),
+}
+
+# 生成用户的统一登录密码
+DEFAULT_PASSWORD = 'benchmark123'
+
+INFLUENCER_LEVELS = ('S级', 'A级', 'B级', 'C级')
+INFLUENCER_LEVEL_WEIGHTS = (1, 4, 15, 80)
+INFLUENCER_TAG_NAMES = ('美妆', '时尚', '美食', '旅游', '健身', '母婴', '数码', '家居', '宠物', '汽车',
+                        '游戏', '教育', '搞笑', '剧情', '音乐')
+MATERIAL_TAG_NAMES = ('产品展示', '教程', '开箱', '测评', '种草', '口播', '剧情', '直播切片', '对比', '合集')
+MATERIAL_TYPES = ('短视频', '图文', '直播切片')
+
+def chunked(iterable, size):
+    """按固定大小切分可迭代对象"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _copy_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def bulk_insert(connection, table, rows, chunk_size=20000):
+    """
+    批量写入数据
+
+    Args:
+        connection: SQLAlchemy连接
+        table: 目标表（Table对象）
+        rows: 行字典的可迭代对象，所有行的键相同
+        chunk_size: 每批行数
+
+    Returns:
+        int: 写入行数
+    """
+    total = 0
+    for chunk in chunked(rows, chunk_size):
+        if connection.dialect.name == 'postgresql':
+            columns = list(chunk[0].keys())
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in chunk:
+                writer.writerow([_copy_value(row[column]) for column in columns])
+            buffer.seek(0)
+            cursor = connection.connection.dbapi_connection.cursor()
+            cursor.copy_expert(
+                f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+        else:
+            connection.execute(table.insert(), chunk)
+        total += len(chunk)
+    return total
+
+def _reset_sequences(connection, tables):
+    """显式指定主键写入后，同步PostgreSQL自增序列"""
+    from sqlalchemy import text
+
+    if connection.dialect.name != 'postgresql':
+        return
+    for table in tables:
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {table.name}), 1))"
+        ))
+
+class DatasetGenerator:
+    """按随机种子生成可复现的数据集"""
+
+    def __init__(self, seed, users, influencers, materials, days, density=1.0, end_date=None):
+        self.rng = random.Random(seed)
+        self.users = users
+        self.influencers = influencers
+        self.materials = materials
+        self.days = days
+        self.density = density
+        self.end_date = end_date or (date.today() - timedelta(days=1))
+        self.now = datetime.utcnow()
+        # 素材归属：少数头部达人拥有大量素材
+        self._influencer_weights = list(self._cumulative(1 / (i + 1) ** 0.8 for i in range(influencers)))
+
+    @staticmethod
+    def _cumulative(weights):
+        total = 0.0
+        for weight in weights:
+            total += weight
+            yield total
+
+    def user_rows(self, password_hash):
+        for user_id in range(1, self.users + 1):
+            # 约三分之一为投手
+            role = 'pitcher' if user_id % 3 == 1 else 'business'
+            yield {
+                'id': user_id,
+                'username': f'bench_{role}_{user_id}',
+                'email': f'bench_{user_id}@example.com',
+                'password': password_hash,
+                'role': role,
+                'create_time': self.now,
+                'update_time': self.now,
+            }
+
+    @property
+    def business_ids(self):
+        return [user_id for user_id in range(1, self.users + 1) if user_id % 3 != 1] or [1]
+
+    @property
+    def pitcher_ids(self):
+        return [user_id for user_id in range(1, self.users + 1) if user_id % 3 == 1]
+
+    def tag_rows(self, names):
+        for tag_id, name in enumerate(names, start=1):
+            yield {'id': tag_id, 'name': name, 'usage_counter': 0, 'create_time': self.now}
+
+    def influencer_rows(self):
+        rng = self.rng
+        business_ids = self.business_ids
+        for influencer_id in range(1, self.influencers + 1):
+            owner = rng.choice(business_ids)
+            followers = int(rng.lognormvariate(10, 1.6))
+            created = self.now - timedelta(days=rng.randint(0, 720))
+            yield {
+                'id': influencer_id,
+                'name': f'达人{influencer_id:06d}',
+                'douyin_id': f'dy{influencer_id:08d}',
+                'uid': f'uid{influencer_id:010d}',
+                'product_link': None,
+                'influencer_level': rng.choices(INFLUENCER_LEVELS, weights=INFLUENCER_LEVEL_WEIGHTS)[0],
+                'follower_count': followers,
+                'avg_views': int(followers * rng.uniform(0.05, 0.6)),
+                'contact_info': None,
+                'created_by_id': owner,
+                'created_by': owner,
+                'create_time': created,
+                'update_time': created,
+            }
+
+    def material_rows(self, influencer_owners):
+        rng = self.rng
+        owners = rng.choices(range(1, self.influencers + 1), cum_weights=self._influencer_weights,
+                             k=self.materials)
+        for material_id, influencer_id in enumerate(owners, start=1):
+            plays = int(rng.lognormvariate(9, 1.8))
+            published = self.now - timedelta(days=rng.randint(0, 540), seconds=rng.randint(0, 86399))
+            owner = influencer_owners[influencer_id]
+            yield {
+                'id': material_id,
+                'influencer_id': influencer_id,
+                'material_id': f'mat{material_id:010d}',
+                'video_url': f'https://www.douyin.com/video/mat{material_id:010d}',
+                'title': f'素材标题_{material_id}',
+                'material_type': rng.choice(MATERIAL_TYPES),
+                'play_count': plays,
+                'like_count': int(plays * rng.uniform(0.01, 0.08)),
+                'comment_count': int(plays * rng.uniform(0.001, 0.01)),
+                'share_count': int(plays * rng.uniform(0.0005, 0.005)),
+                'publish_time': published,
+                'created_by_id': owner,
+                'created_by': owner,
+                'create_time': published,
+                'update_time': published,
+            }
+
+    def association_rows(self, entity_count, tag_count, entity_column):
+        rng = self.rng
+        for entity_id in range(1, entity_count + 1):
+            for tag_id in rng.sample(range(1, tag_count + 1), rng.randint(1, min(3, tag_count))):
+                yield {entity_column: entity_id, 'tag_id': tag_id}
+
+    def promotion_rows(self, material_influencers):
+        """每个素材在最近days天内按density概率生成每日推广数据"""
+        rng = self.rng
+        pitcher_ids = self.pitcher_ids or [1]
+        start_date = self.end_date - timedelta(days=self.days - 1)
+        promotion_id = 0
+        for material_id in range(1, self.materials + 1):
+            influencer_id = material_influencers[material_id]
+            # 素材自身的量级与ROI水平
+            base_cost = rng.lognormvariate(6, 1.0)
+            base_roi = rng.gauss(1.2, 0.8)
+            pitcher = rng.choice(pitcher_ids)
+            for offset in range(self.days):
+                if self.density < 1.0 and rng.random() > self.density:
+                    continue
+                day = start_date + timedelta(days=offset)
+                # 周末消耗更高
+                weekday_factor = 1.25 if day.weekday() >= 5 else 1.0
+                cost = round(base_cost * weekday_factor * rng.uniform(0.5, 1.5), 2)
+                roi = round(max(base_roi + rng.gauss(0, 0.3), -0.95), 2)
+                sales = round(cost * (1 + roi), 2)
+                exposure = int(cost * rng.uniform(80, 200))
+                clicks = int(exposure * rng.uniform(0.01, 0.05))
+                promotion_id += 1
+                yield {
+                    'id': promotion_id,
+                    'name': f'推广{material_id}-{day.isoformat()}',
+                    'influencer_id': influencer_id,
+                    'material_id': material_id,
+                    'date': day,
+                    'exposure_count': exposure,
+                    'click_count': clicks,
+                    'conversion_count': int(clicks * rng.uniform(0.02, 0.1)),
+                    'cost': Decimal(str(cost)),
+                    'sales_amount': Decimal(str(sales)),
+                    'revenue': Decimal(str(sales)),
+                    'roi': Decimal(str(roi)),
+                    'notes': None,
+                    'created_by_id': pitcher,
+                    'created_by': pitcher,
+                    'create_time': self.now,
+                    'update_time': self.now,
+                }
+
+def generate(args):
+    """生成完整数据集"""
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+
+    from app import create_app, db
+    from app.utils.passwords import hash_password
+    from app.utils.query_cache import invalidate
+    from app.utils.tags import rebuild_tag_usage_counters
+    from app.utils.tag_index import bump_index_versions
+    from app.models import (User, Influencer, Material, InfluencerTag, MaterialTag, PromotionData,
+                            influencer_tag_association, material_tag_association)
+
+    app = create_app(lean=True, start_scheduler=False)
+    generator = DatasetGenerator(args.seed, args.users, args.influencers, args.materials,
+                                 args.days, density=args.density)
+    tables = [User.__table__, InfluencerTag.__table__, MaterialTag.__table__, Influencer.__table__,
+              Material.__table__, influencer_tag_association, material_tag_association,
+              PromotionData.__table__]
+
+    with app.app_context():
+        if args.drop:
+            db.drop_all()
+        db.create_all()
+
+        connection = db.session.connection()
+        timings = {}
+
+        def timed(name, table, rows):
+            start = time.perf_counter()
+            count = bulk_insert(connection, table, rows, args.chunk_size)
+            elapsed = time.perf_counter() - start
+            timings[name] = {'rows': count, 'seconds': round(elapsed, 2)}
+            print(f"{name}: {count} 行，{elapsed:.1f}s（{count / elapsed if elapsed else 0:.0f} 行/秒）")
+
+        # 与登录视图使用相同的哈希算法，所有用户共用一次计算结果
+        password_hash = hash_password(DEFAULT_PASSWORD)
+        timed('users', User.__table__, generator.user_rows(password_hash))
+        timed('influencer_tags', InfluencerTag.__table__, generator.tag_rows(INFLUENCER_TAG_NAMES))
+        timed('material_tags', MaterialTag.__table__, generator.tag_rows(MATERIAL_TAG_NAMES))
+
+        influencer_owners = {}
+
+        def influencers():
+            for row in generator.influencer_rows():
+                influencer_owners[row['id']] = row['created_by_id']
+                yield row
+
+        timed('influencers', Influencer.__table__, influencers())
+
+        material_influencers = {}
+
+        def materials():
+            for row in generator.material_rows(influencer_owners):
+                material_influencers[row['id']] = row['influencer_id']
+                yield row
+
+        timed('materials', Material.__table__, materials())
+        timed('influencer_tag_association', influencer_tag_association,
+              generator.association_rows(args.influencers, len(INFLUENCER_TAG_NAMES), 'influencer_id'))
+        timed('material_tag_association', material_tag_association,
+              generator.association_rows(args.materials, len(MATERIAL_TAG_NAMES), 'material_id'))
+        timed('promotion_data', PromotionData.__table__, generator.promotion_rows(material_influencers))
+
+        _reset_sequences(connection, [t for t in tables if 'id' in t.c])
+        # 数据通过连接直接写入，不经过会话事件，需手动使查询缓存与各进程的标签索引失效
+        invalidate(Influencer, Material, PromotionData, connection=connection)
+        bump_index_versions(connection)
+        db.session.commit()
+        # 关联表同样绕过了会话，按关联表重新计算标签的冗余计数器
+        rebuild_tag_usage_counters()
+
+    total_seconds = sum(item['seconds'] for item in timings.values())
+    total_rows = sum(item['rows'] for item in timings.values())
+    print(f"完成：共 {total_rows} 行，{total_seconds:.1f}s。用户密码统一为 {DEFAULT_PASSWORD}")
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description='生成合成基准数据集')
+    parser.add_argument('--database-url', help='目标数据库，默认使用DATABASE_URL')
+    parser.add_argument('--scale', choices=sorted(SCALES), help='预设规模，可被其他参数覆盖')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--influencers', type=int)
+    parser.add_argument('--materials', type=int)
+    parser.add_argument('--days', type=int, help='每个素材的推广数据天数')
+    parser.add_argument('--density', type=float, default=1.0, help='每天生成推广数据的概率')
+    parser.add_argument('--chunk-size', type=int, default=20000)
+    parser.add_argument('--drop', action='store_true', help='生成前删除所有表')
+    args = parser.parse_args()
+
+    users, influencers, materials, days = SCALES[args.scale or 'small']
+    args.users = args.users or users
+    args.influencers = args.influencers or influencers
+    args.materials = args.materials or materials
+    args.days = args.days or days
+
+    expected = math.ceil(args.materials * args.days * args.density)
+    print(f"生成 {args.users} 个用户、{args.influencers} 个达人、{args.materials} 个素材、"
+          f"约 {expected} 条推广数据（种子 {args.seed}）")
+    generate(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+冷启动耗时基准
+在全新的解释器中以 -X importtime 导入应用并创建应用实例，统计导入耗时与最慢的模块
+
+用法：
+    python -m benchmarks.importtime
+    python -m benchmarks.importtime --full --runs 5 --output importtime.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# 在子进程中执行的启动代码，输出create_app耗时（秒）
+STARTUP_CODE = '''
+import time
+start = time.perf_counter()
+from app import create_app
+create_app(lean={lean}, start_scheduler=False)
+print(time.perf_counter() - start)
+'''
+
+def parse_importtime(stderr):
+    """
+    解析 -X importtime 输出，每行格式为 'import time: self | cumulative | name'
+
+    Returns:
+        list: (模块名, 自身耗时us, 累计耗时us) 列表
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+def run_once(lean):
+    """在新解释器中启动一次应用"""
+    env = dict(os.environ, SCHEDULER_ENABLED='False')
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP_CODE.format(lean=lean)],
+        capture_output=True, text=True, env=env,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else '启动失败')
+    create_app_seconds = float(result.stdout.strip().splitlines()[-1])
+    return wall, create_app_seconds, parse_importtime(result.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description='应用冷启动耗时基准')
+    parser.add_argument('--full', action='store_true', help='完整模式（注册全部蓝图），默认精简模式')
+    parser.add_argument('--runs', type=int, default=3, help='重复次数')
+    parser.add_argument('--top', type=int, default=15, help='显示累计耗时最高的模块数')
+    parser.add_argument('--output', help='结果输出的JSON文件路径')
+    args = parser.parse_args()
+
+    lean = not args.full
+    walls, startups, modules = [], [], []
+    for _ in range(args.runs):
+        wall, startup, modules = run_once(lean)
+        walls.append(wall)
+        startups.append(startup)
+
+    top_modules = sorted(modules, key=lambda m: m[2], reverse=True)[:args.top]
+    result = {
+        'mode': 'lean' if lean else 'full',
+        'runs': args.runs,
+        'process_wall_seconds': statistics.median(walls),
+        'create_app_seconds': statistics.median(startups),
+        'module_count': len(modules),
+        'top_modules': [{'module': name, 'self_us': self_us, 'cumulative_us': cumulative_us}
+                        for name, self_us, cumulative_us in top_modules],
+    }
+
+    print(f"模式: {result['mode']}，运行 {args.runs} 次取中位数")
+    print(f"进程总耗时: {result['process_wall_seconds'] * 1000:.1f} ms")
+    print(f"导入并创建应用: {result['create_app_seconds'] * 1000:.1f} ms，共导入 {len(modules)} 个模块")
+    print("累计耗时最高的模块:")
+    for item in result['top_modules']:
+        print(f"  {item['cumulative_us'] / 1000:8.1f} ms  {item['module']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,371 @@
+"""
+本地HTTP压测
+在进程内启动应用（抖音客户端替换为带模拟延迟的假实现），由商务与投手混合的虚拟用户并发执行典型操作流程：
+登录、仪表盘、推广数据列表翻页与筛选、打开详情页、自动获取素材；按端点输出p50/p95/p99延迟与吞吐量
+
+先用 benchmarks.generate 生成数据，再运行：
+    python -m benchmarks.loadtest --users 20 --duration 60 --output results/load.json
+    python -m benchmarks.loadtest --base-url http://127.0.0.1:5000 --users 50   # 压测已启动的服务
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import requests
+
+# 生成数据的统一密码，见 benchmarks.generate
+DEFAULT_PASSWORD = 'benchmark123'
+
+_CSRF_PATTERN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+def percentile(values, percent):
+    """最近秩法计算百分位数"""
+    ordered = sorted(values)
+    index = min(max(int(round(percent / 100 * len(ordered))) - 1, 0), len(ordered) - 1)
+    return ordered[index]
+
+class FakeDouyinClient:
+    """
+    模拟抖音客户端
+    每次调用按配置的延迟休眠以模拟网络开销，返回与输入相关的确定性数据
+    """
+
+    def __init__(self, latency_ms=80, jitter_ms=40):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+
+    def _wait(self):
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(delay, 0) / 1000)
+
+    def get_influencer_info(self, video_url):
+        self._wait()
+        key = zlib.crc32(video_url.encode('utf-8')) % 100000
+        return {
+            'name': f'压测达人{key}',
+            'douyin_id': f'load{key}',
+            'uid': f'load_uid{key}',
+            'influencer_level': 'B级',
+        }
+
+    def get_material_data(self, material_ids):
+        self._wait()
+        return [{
+            'material_id': mid,
+            'video_url': f'https://www.douyin.com/video/{mid}',
+            'title': f'素材标题_{mid}',
+            'play_count': random.randint(1000, 100000),
+            'like_count': random.randint(10, 5000),
+            'comment_count': random.randint(0, 500),
+        } for mid in material_ids]
+
+    def get_promotion_data(self, material_id, date_range=None):
+        self._wait()
+        end = date.today() - timedelta(days=1)
+        cost = round(random.uniform(100, 2000), 2)
+        roi = round(random.uniform(0.5, 3), 2)
+        return [{'date': end.isoformat(), 'cost': cost, 'sales_amount': round(cost * roi, 2), 'roi': roi}]
+
+    def fetch_all_material_ids(self, influencer_uid):
+        self._wait()
+        return [f'{influencer_uid}_{index}' for index in range(3)]
+
+    def install(self, client):
+        """替换客户端实例上的API方法"""
+        for name in ('get_influencer_info', 'get_material_data', 'get_promotion_data', 'fetch_all_material_ids'):
+            setattr(client, name, getattr(self, name))
+
+class Stats:
+    """按端点汇总的请求统计（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+
+    def record(self, name, seconds, status, ok=True):
+        with self._lock:
+            self.latencies[name].append(seconds)
+            self.statuses[name][status] += 1
+            if not ok:
+                self.errors[name] += 1
+
+    def record_error(self, name, seconds, error):
+        with self._lock:
+            self.latencies[name].append(seconds)
+            self.errors[name] += 1
+            self.statuses[name][type(error).__name__] += 1
+
+    def report(self, elapsed):
+        """
+        Returns:
+            dict: {端点: {requests, rps, errors, p50_ms, p95_ms, p99_ms, max_ms, statuses}}
+        """
+        endpoints = {}
+        with self._lock:
+            names = sorted(self.latencies)
+            for name in names:
+                samples = self.latencies[name]
+                endpoints[name] = {
+                    'requests': len(samples),
+                    'rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+                    'errors': self.errors[name],
+                    'p50_ms': round(percentile(samples, 50) * 1000, 2),
+                    'p95_ms': round(percentile(samples, 95) * 1000, 2),
+                    'p99_ms': round(percentile(samples, 99) * 1000, 2),
+                    'max_ms': round(max(samples) * 1000, 2),
+                    'statuses': {str(key): value for key, value in self.statuses[name].items()},
+                }
+            all_samples = [sample for name in names for sample in self.latencies[name]]
+        total = {
+            'requests': len(all_samples),
+            'rps': round(len(all_samples) / elapsed, 2) if elapsed else 0.0,
+            'errors': sum(item['errors'] for item in endpoints.values()),
+        }
+        if all_samples:
+            total.update({
+                'p50_ms': round(percentile(all_samples, 50) * 1000, 2),
+                'p95_ms': round(percentile(all_samples, 95) * 1000, 2),
+                'p99_ms': round(percentile(all_samples, 99) * 1000, 2),
+            })
+        return {'total': total, 'endpoints': endpoints}
+
+class VirtualUser(threading.Thread):
+    """按操作流程循环发送请求的虚拟用户"""
+
+    def __init__(self, base_url, account, stats, stop_event, think_time, fetch_ratio):
+        super().__init__(daemon=True)
+        self.base_url = base_url.rstrip('/')
+        self.account = account
+        self.stats = stats
+        self.stop_event = stop_event
+        self.think_time = think_time
+        self.fetch_ratio = fetch_ratio
+        self.session = requests.Session()
+        self.rng = random.Random()
+
+    def request(self, name, method, path, expect=(200,), **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=30,
+                                            allow_redirects=False, **kwargs)
+        except requests.RequestException as e:
+            self.stats.record_error(name, time.perf_counter() - start, e)
+            return None
+        self.stats.record(name, time.perf_counter() - start, response.status_code,
+                          ok=response.status_code in expect)
+        return response
+
+    def pause(self):
+        if self.think_time:
+            self.stop_event.wait(self.rng.uniform(0, self.think_time * 2))
+
+    def login(self):
+        response = self.request('GET /login', 'GET', '/login')
+        token = None
+        if response is not None:
+            match = _CSRF_PATTERN.search(response.text)
+            token = match.group(1) if match else None
+        data = {'username': self.account['username'], 'password': self.account['password']}
+        if token:
+            data['csrf_token'] = token
+        response = self.request('POST /login', 'POST', '/login', expect=(302,), data=data)
+        return response is not None and response.status_code == 302
+
+    def browse_promotions(self):
+        """推广数据列表：随机日期范围筛选并连续翻页"""
+        end = date.today() - timedelta(days=1)
+        start = end - timedelta(days=self.rng.choice((7, 30, 90)))
+        query = f'start_date={start.isoformat()}&end_date={end.isoformat()}'
+        for page in range(1, self.rng.randint(2, 4) + 1):
+            self.request('GET /promotions', 'GET', f'/promotions?{query}&page={page}')
+            self.pause()
+
+    def open_details(self):
+        ids = self.account['ids']
+        for kind, path in (('promotions', '/promotions/{}'), ('materials', '/materials/{}'),
+                           ('influencers', '/influencers/{}')):
+            if ids.get(kind):
+                target = path.format(self.rng.choice(ids[kind]))
+                self.request(f'GET {path.format("<id>")}', 'GET', target)
+                self.pause()
+
+    def auto_fetch(self):
+        """商务用户通过视频链接自动创建素材（每次使用新链接）"""
+        video_url = f'https://www.douyin.com/video/load{uuid.uuid4().hex[:16]}'
+        self.request('POST /api/material/auto-fetch', 'POST', '/api/material/auto-fetch',
+                     expect=(200, 201), json={'video_url': video_url})
+
+    def run(self):
+        if not self.login():
+            return
+        while not self.stop_event.is_set():
+            self.request('GET /', 'GET', '/')
+            self.pause()
+            self.browse_promotions()
+            self.open_details()
+            if self.account['role'] == 'business' and self.rng.random() < self.fetch_ratio:
+                self.auto_fetch()
+                self.pause()
+
+def preflight(base_url, accounts):
+    """
+    压测前以每种角色各一个账号把操作流程中的页面各请求一次
+    任何页面返回非预期状态码时直接退出，避免把失败请求的耗时计入结果
+
+    Returns:
+        list: 失败的 (角色, 端点, 状态码) 列表
+    """
+    failures = []
+    for role in sorted({account['role'] for account in accounts}):
+        account = next(account for account in accounts if account['role'] == role)
+        stats = Stats()
+        user = VirtualUser(base_url, account, stats, threading.Event(), 0, 0)
+        if not user.login():
+            failures.append((role, 'POST /login', dict(stats.statuses['POST /login'])))
+            continue
+        user.request('GET /', 'GET', '/')
+        user.browse_promotions()
+        user.open_details()
+        for name, count in stats.errors.items():
+            if count:
+                failures.append((role, name, dict(stats.statuses[name])))
+    return failures
+
+def load_accounts(app, business_count, pitcher_count, password, ids_per_user=50):
+    """从数据库中选取压测账号及其可访问的数据ID"""
+    from app.models import User, Influencer, Material, PromotionData
+
+    accounts = []
+    with app.app_context():
+        for role, count in (('business', business_count), ('pitcher', pitcher_count)):
+            users = User.query.filter_by(role=role).order_by(User.id).limit(count).all()
+            for user in users:
+                ids = {}
+                for kind, model in (('influencers', Influencer), ('materials', Material),
+                                    ('promotions', PromotionData)):
+                    query = model.query.with_entities(model.id)
+                    if role == 'business':
+                        query = query.filter(model.created_by_id == user.id)
+                    ids[kind] = [row[0] for row in query.limit(ids_per_user)]
+                accounts.append({'username': user.username, 'password': password, 'role': role, 'ids': ids})
+    return accounts
+
+def start_local_server(app, host, port):
+    """在后台线程中启动多线程WSGI服务"""
+    from werkzeug.serving import make_server
+
+    server = make_server(host, port, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://{host}:{server.server_port}'
+
+def run(args):
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+
+    from app import create_app
+    from app.api.client import douyin_client
+
+    app = create_app(start_scheduler=False)
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    business_users = round(args.users * args.business_ratio)
+    accounts = load_accounts(app, business_users, args.users - business_users, args.password)
+    if not accounts:
+        raise SystemExit('数据库中没有用户，请先运行 python -m benchmarks.generate')
+
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        FakeDouyinClient(args.api_latency_ms, args.api_jitter_ms).install(douyin_client)
+        server, base_url = start_local_server(app, '127.0.0.1', args.port)
+
+    failures = preflight(base_url, accounts)
+    if failures:
+        if server is not None:
+            server.shutdown()
+        lines = '\n'.join(f'  {role} {name}: {statuses}' for role, name, statuses in failures)
+        raise SystemExit(f'以下页面在压测前检查中失败，请先修复：\n{lines}')
+
+    stats = Stats()
+    stop_event = threading.Event()
+    workers = []
+    print(f'{base_url}：{len(accounts)} 个虚拟用户（商务 {business_users}），持续 {args.duration}s')
+    started = time.perf_counter()
+    try:
+        for index in range(args.users):
+            account = accounts[index % len(accounts)]
+            worker = VirtualUser(base_url, account, stats, stop_event, args.think_time, args.fetch_ratio)
+            worker.start()
+            workers.append(worker)
+            # 按ramp-up时间逐步加压
+            if args.ramp_up:
+                time.sleep(args.ramp_up / args.users)
+        stop_event.wait(max(args.duration - (time.perf_counter() - started), 0))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        for worker in workers:
+            worker.join(timeout=30)
+        elapsed = time.perf_counter() - started
+        if server is not None:
+            server.shutdown()
+
+    report = stats.report(elapsed)
+    print(f'{"端点":<36}{"请求数":>8}{"RPS":>8}{"错误":>6}{"p50":>10}{"p95":>10}{"p99":>10}')
+    for name, item in report['endpoints'].items():
+        print(f'{name:<36}{item["requests"]:>8}{item["rps"]:>8}{item["errors"]:>6}'
+              f'{item["p50_ms"]:>10}{item["p95_ms"]:>10}{item["p99_ms"]:>10}')
+    total = report['total']
+    print(f'合计 {total["requests"]} 个请求，{total["rps"]} 请求/秒，错误 {total["errors"]}')
+
+    if args.output:
+        from benchmarks.run import git_revision
+
+        result = {
+            'git_commit': git_revision(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'base_url': base_url,
+            'users': args.users,
+            'business_ratio': args.business_ratio,
+            'duration_seconds': round(elapsed, 2),
+            'api_latency_ms': None if args.base_url else args.api_latency_ms,
+            **report,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f'结果已写入 {args.output}')
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description='本地HTTP压测')
+    parser.add_argument('--database-url', help='目标数据库，默认使用DATABASE_URL')
+    parser.add_argument('--base-url', help='压测已运行的服务；不指定时在进程内启动应用并使用模拟抖音客户端')
+    parser.add_argument('--port', type=int, default=0, help='进程内服务端口，0表示随机')
+    parser.add_argument('--users', type=int, default=10, help='并发虚拟用户数')
+    parser.add_argument('--business-ratio', type=float, default=0.7, help='商务用户占比')
+    parser.add_argument('--duration', type=float, default=60, help='压测持续秒数')
+    parser.add_argument('--ramp-up', type=float, default=5, help='所有用户启动完成的秒数')
+    parser.add_argument('--think-time', type=float, default=0.5, help='操作之间的平均等待秒数')
+    parser.add_argument('--fetch-ratio', type=float, default=0.2, help='商务用户每轮调用自动获取素材的概率')
+    parser.add_argument('--api-latency-ms', type=float, default=80, help='模拟抖音API的平均延迟')
+    parser.add_argument('--api-jitter-ms', type=float, default=40, help='模拟抖音API的延迟抖动')
+    parser.add_argument('--password', default=DEFAULT_PASSWORD, help='压测账号密码')
+    parser.add_argument('--output', help='结果JSON文件路径')
+    run(parser.parse_args())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+"""
+基准测试
+对列表视图、仪表盘、标签筛选、定时采集任务、分析查询和预算分配计时，结果输出为JSON，便于在提交之间对比
+
+先用 benchmarks.generate 生成数据，再运行：
+    python -m benchmarks.run --output results/sqlite.json
+    DATABASE_URL=postgresql://... python -m benchmarks.run --output results/pg.json --repeat 20
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import traceback
+from datetime import date, datetime, timedelta
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    index = min(int(round(percent / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+def summarize(samples):
+    """将耗时样本（秒）汇总为毫秒统计"""
+    if not samples:
+        return {}
+    return {
+        'runs': len(samples),
+        'min_ms': round(min(samples) * 1000, 3),
+        'median_ms': round(statistics.median(samples) * 1000, 3),
+        'p95_ms': round(_percentile(samples, 95) * 1000, 3),
+        'max_ms': round(max(samples) * 1000, 3),
+    }
+
+def measure(func, repeat, warmup=1):
+    """
+    多次执行函数并记录耗时
+
+    Returns:
+        dict: 耗时统计，失败时包含error
+    """
+    samples = []
+    detail = None
+    try:
+        for _ in range(warmup):
+            func()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            detail = func()
+            samples.append(time.perf_counter() - start)
+    except Exception as e:
+        return {'error': f'{type(e).__name__}: {e}', 'traceback': traceback.format_exc(limit=5),
+                **summarize(samples)}
+    result = summarize(samples)
+    if isinstance(detail, dict):
+        result.update(detail)
+    return result
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class BenchmarkClient:
+    """以指定用户身份请求视图的测试客户端"""
+
+    def __init__(self, app, user_id):
+        self.client = app.test_client()
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+
+    def get(self, url):
+        def request():
+            response = self.client.get(url)
+            if response.status_code >= 400:
+                raise RuntimeError(f'GET {url} 返回 {response.status_code}')
+            return {'status': response.status_code, 'bytes': len(response.data)}
+        return request
+
+def view_benchmarks(app, users, sample_ids):
+    """
+    视图基准：分别以商务和投手身份访问
+
+    Returns:
+        dict: {名称: 可调用对象}
+    """
+    benchmarks = {}
+    recent = (date.today() - timedelta(days=7)).isoformat()
+    for role, user_id in users.items():
+        client = BenchmarkClient(app, user_id)
+        influencer_id, material_id, promotion_id = sample_ids[role]
+        benchmarks.update({
+            f'views.{role}.index': client.get('/'),
+            f'views.{role}.dashboard': client.get('/dashboard'),
+            f'views.{role}.influencer_list': client.get('/influencers'),
+            f'views.{role}.influencer_list_page_50': client.get('/influencers?page=50'),
+            f'views.{role}.material_list': client.get('/materials'),
+            f'views.{role}.material_list_page_500': client.get('/materials?page=500'),
+            f'views.{role}.promotion_list': client.get('/promotions'),
+            f'views.{role}.promotion_list_last_7_days': client.get(f'/promotions?start_date={recent}'),
+            f'views.{role}.promotion_list_page_1000': client.get('/promotions?page=1000'),
+            f'views.{role}.tag_management': client.get('/tags'),
+        })
+        if influencer_id:
+            benchmarks[f'views.{role}.influencer_detail'] = client.get(f'/influencers/{influencer_id}')
+        if material_id:
+            benchmarks[f'views.{role}.material_detail'] = client.get(f'/materials/{material_id}')
+        if promotion_id:
+            benchmarks[f'views.{role}.promotion_detail'] = client.get(f'/promotions/{promotion_id}')
+        # 项目中没有全文搜索，搜索场景以标签筛选接口代替
+        benchmarks[f'search.{role}.influencer_single_tag'] = client.get('/api/tags/filter?type=influencer&q=美妆')
+        benchmarks[f'search.{role}.influencer_expression'] = client.get(
+            '/api/tags/filter?type=influencer&q=美妆 AND (时尚 OR 旅游) NOT 母婴')
+        benchmarks[f'search.{role}.material_expression'] = client.get(
+            '/api/tags/filter?type=material&q=测评 OR 开箱&page=20')
+        benchmarks[f'search.{role}.material_list_filtered'] = client.get('/materials?tags=种草 AND 口播')
+    return benchmarks
+
+def analytics_benchmarks(app, db):
+    """分析查询基准：报表查询（合并每日数据与归档数据）及聚合SQL"""
+    from sqlalchemy import func
+    from app.models import Influencer
+    from app.utils.reports import totals_by_day, totals_by_influencer, totals_by_material
+
+    since = date.today() - timedelta(days=30)
+
+    def run(query):
+        def execute():
+            with app.app_context():
+                return {'rows': len(query().all())}
+        return execute
+
+    def run_report(report):
+        def execute():
+            with app.app_context():
+                return {'rows': len(report())}
+        return execute
+
+    return {
+        'analytics.daily_totals_30d': run_report(lambda: totals_by_day(start=since)),
+        'analytics.top_materials_by_sales': run_report(lambda: totals_by_material(limit=50)),
+        'analytics.influencer_roi': run_report(lambda: totals_by_influencer(start=since, limit=None)),
+        'analytics.level_summary': run(lambda: db.session.query(
+            Influencer.influencer_level, func.count(Influencer.id), func.avg(Influencer.follower_count)
+        ).group_by(Influencer.influencer_level)),
+    }
+
+def optimizer_benchmarks(app, sizes=(1000, 10000, 50000), days=60):
+    """
+    预算分配基准：按数据库中的推广数据拟合并分配，
+    以及合成的大规模素材组合（每个素材days天数据，10%的达人有花费上限），只计时拟合与分配计算
+    """
+    import numpy as np
+    from app.utils.budget import BudgetError, allocate_with_minimum, fit_response_curves, optimize_budget
+
+    def run_database():
+        with app.app_context():
+            try:
+                result = optimize_budget(100000, default_influencer_cap=20000, min_spend=50)
+            except BudgetError as e:
+                return {'skipped': str(e)}
+            return {'materials': result['material_count'], 'allocated_materials': len(result['items'])}
+
+    def synthetic(size):
+        rng = np.random.default_rng(size)
+        index = np.repeat(np.arange(size), days)
+        scale = rng.uniform(1, 5, size)
+        elasticity = rng.uniform(0.3, 0.8, size)
+        cost = rng.uniform(10, 1000, size * days)
+        sales = scale[index] * cost ** elasticity[index] * np.exp(rng.normal(0, 0.2, size * days))
+        influencers = size // 10
+        groups = rng.integers(0, influencers, size)
+        caps = np.full(influencers, np.inf)
+        caps[:influencers // 10] = 500.0
+
+        def execute():
+            fitted_scale, fitted_elasticity, _ = fit_response_curves(index, cost, sales, size)
+            allocation = allocate_with_minimum(fitted_scale, fitted_elasticity, size * 100.0, groups, caps,
+                                               min_spend=20)
+            return {'materials': size, 'allocated_materials': int((allocation > 0).sum())}
+        return execute
+
+    benchmarks = {'optimizer.database_portfolio': run_database}
+    for size in sizes:
+        benchmarks[f'optimizer.synthetic_{size}'] = synthetic(size)
+    return benchmarks
+
+def job_benchmarks(app):
+    """
+    定时采集任务基准
+    任务会写入数据，只执行一次；抖音客户端为模拟实现，不会发出网络请求
+    """
+    from app.utils.scheduler import fetch_latest_promotion_data
+
+    def run_job():
+        with app.app_context():
+            return {'rows_written': fetch_latest_promotion_data()}
+
+    return {'job.fetch_latest_promotion_data': run_job}
+
+def _pick_users(db):
+    from app.models import User
+
+    users = {}
+    business = User.query.filter_by(role='business').order_by(User.id).first()
+    pitcher = User.query.filter_by(role='pitcher').order_by(User.id).first()
+    if business:
+        users['business'] = business.id
+    if pitcher:
+        users['pitcher'] = pitcher.id
+    return users
+
+def _pick_sample_ids(users):
+    """为每个角色选取其可访问的达人、素材和推广数据"""
+    from app.models import Influencer, Material, PromotionData
+
+    samples = {}
+    for role, user_id in users.items():
+        if role == 'business':
+            influencer = Influencer.query.filter_by(created_by_id=user_id).first()
+            material = Material.query.filter_by(created_by_id=user_id).first()
+            promotion = PromotionData.query.filter_by(created_by_id=user_id).first()
+        else:
+            influencer, material, promotion = Influencer.query.first(), Material.query.first(), \
+                PromotionData.query.first()
+        samples[role] = tuple(item.id if item else None for item in (influencer, material, promotion))
+    return samples
+
+def _row_counts(db):
+    from app.models import User, Influencer, Material, PromotionData
+
+    return {model.__tablename__: db.session.query(model).count()
+            for model in (User, Influencer, Material, PromotionData)}
+
+def run(args):
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+
+    from app import create_app, db
+
+    app = create_app(start_scheduler=False)
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    selected = set(args.only or ['views', 'search', 'analytics', 'optimizer', 'jobs'])
+    results = {}
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        counts = _row_counts(db)
+        users = _pick_users(db)
+        if not users:
+            sys.exit('数据库中没有用户，请先运行 python -m benchmarks.generate')
+        samples = _pick_sample_ids(users)
+
+    # 每个请求使用独立的应用上下文，与线上行为一致
+    benchmarks = {}
+    if selected & {'views', 'search'}:
+        benchmarks.update(view_benchmarks(app, users, samples))
+    if 'analytics' in selected:
+        benchmarks.update(analytics_benchmarks(app, db))
+    if 'optimizer' in selected:
+        benchmarks.update(optimizer_benchmarks(app))
+
+    for name, func in benchmarks.items():
+        if name.split('.', 1)[0] not in selected:
+            continue
+        results[name] = measure(func, args.repeat)
+        print(_format_line(name, results[name]))
+
+    if 'jobs' in selected and not args.skip_jobs:
+        for name, func in job_benchmarks(app).items():
+            results[name] = measure(func, 1, warmup=0)
+            print(_format_line(name, results[name]))
+
+    report = {
+        'git_commit': git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'dialect': dialect,
+        'python': platform.python_version(),
+        'repeat': args.repeat,
+        'row_counts': counts,
+        'results': results,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'结果已写入 {args.output}')
+    return report
+
+def _format_line(name, result):
+    if 'error' in result:
+        return f'{name:<55} 失败：{result["error"]}'
+    return f'{name:<55} 中位数 {result["median_ms"]:>10.2f}ms  p95 {result["p95_ms"]:>10.2f}ms'
+
+def main():
+    parser = argparse.ArgumentParser(description='运行基准测试并输出JSON结果')
+    parser.add_argument('--database-url', help='目标数据库，默认使用DATABASE_URL')
+    parser.add_argument('--repeat', type=int, default=10, help='每项基准的执行次数')
+    parser.add_argument('--only', nargs='+', choices=['views', 'search', 'analytics', 'optimizer', 'jobs'],
+                        help='只运行指定类别')
+    parser.add_argument('--skip-jobs', action='store_true', help='跳过会写入数据的定时任务基准')
+    parser.add_argument('--output', help='结果JSON文件路径')
+    run(parser.parse_args())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,15 @@
+"""
+gunicorn配置
+多进程部署时需设置PROMETHEUS_MULTIPROC_DIR，使/metrics汇总所有worker的监控指标
+"""
+
+import os
+
+bind = f"{os.getenv('FLASK_HOST', '0.0.0.0')}:{os.getenv('FLASK_PORT', '5000')}"
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+
+def child_exit(server, worker):
+    """worker退出时清理其多进程指标文件中的实时数据"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
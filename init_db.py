@@ -2,9 +2,12 @@
 数据库初始化脚本
 """
 
-from app import app, db
+from app import create_app, db
 from app.models import User, InfluencerTag, MaterialTag
 
+# 以精简模式创建应用，不注册视图也不启动调度器
+app = create_app(lean=True)
+
 # 创建应用上下文
 with app.app_context():
     # 创建所有表
@@ -0,0 +1,35 @@
+"""
+测试公共夹具
+每个测试使用临时目录中的SQLite数据库，以精简模式创建应用（不注册视图、不启动后台线程）
+"""
+
+import pytest
+from app import create_app, db as _db
+from app.models import User
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv('SECRET_KEY', 'test-secret-key')
+    monkeypatch.setenv('METRICS_ENABLED', 'False')
+    monkeypatch.setenv('TAG_INDEX_ENABLED', 'False')
+    monkeypatch.setenv('BCRYPT_LOG_ROUNDS', '4')
+    app = create_app(lean=True)
+    app.config['TESTING'] = True
+    with app.app_context():
+        _db.create_all()
+        yield app
+        _db.session.remove()
+        _db.drop_all()
+
+@pytest.fixture
+def db(app):
+    return _db
+
+@pytest.fixture
+def user(db):
+    user = User(username='pitcher', email='pitcher@example.com', role='pitcher')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+    return user
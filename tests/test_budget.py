@@ -0,0 +1,110 @@
+"""
+预算分配：响应曲线拟合与带约束的分配
+"""
+
+from datetime import date, timedelta
+import numpy as np
+import pytest
+from app.models import Influencer, Material, PromotionData
+from app.utils.budget import (DEFAULT_ELASTICITY, BudgetError, allocate, allocate_with_minimum,
+                              fit_response_curves, optimize_budget)
+
+def _marginal(scale, elasticity, allocation):
+    return scale * elasticity * allocation ** (elasticity - 1)
+
+def test_fit_recovers_power_law():
+    cost = np.array([10, 20, 40, 80, 15, 30, 60], dtype=float)
+    index = np.array([0, 0, 0, 0, 1, 1, 1])
+    truth = {0: (3.0, 0.6), 1: (5.0, 0.3)}
+    sales = np.array([truth[i][0] * c ** truth[i][1] for i, c in zip(index, cost)])
+
+    scale, elasticity, points = fit_response_curves(index, cost, sales, 2)
+    np.testing.assert_allclose(scale, [3.0, 5.0], rtol=1e-9)
+    np.testing.assert_allclose(elasticity, [0.6, 0.3], rtol=1e-9)
+    assert points.tolist() == [4, 3]
+
+def test_fit_falls_back_without_enough_points():
+    # 素材0只有两个数据点，素材1只有花费没有销售额，素材2没有花费
+    index = np.array([0, 0, 1, 2])
+    cost = np.array([100, 100, 50, 0], dtype=float)
+    sales = np.array([200, 400, 0, 10], dtype=float)
+    scale, elasticity, points = fit_response_curves(index, cost, sales, 3)
+    assert elasticity.tolist() == [DEFAULT_ELASTICITY] * 3
+    assert scale[0] == pytest.approx(300 / 100 ** DEFAULT_ELASTICITY)
+    assert scale[1] == 0 and scale[2] == 0
+    assert points.tolist() == [2, 0, 0]
+
+def test_allocation_spends_budget_with_equal_marginal_returns():
+    scale = np.array([3.0, 5.0, 1.0, 0.0])
+    elasticity = np.array([0.6, 0.3, 0.8, 0.5])
+    allocation = allocate(scale, elasticity, 10000)
+    assert allocation.sum() == pytest.approx(10000, rel=1e-9)
+    assert allocation[3] == 0
+    marginal = _marginal(scale[:3], elasticity[:3], allocation[:3])
+    np.testing.assert_allclose(marginal, marginal[0], rtol=1e-6)
+
+def test_group_caps_are_respected():
+    scale = np.array([3.0, 5.0, 1.0])
+    elasticity = np.array([0.8, 0.6, 0.3])
+    groups = np.array([0, 0, 1])
+    # 不设上限时分组0几乎花完全部预算
+    assert allocate(scale, elasticity, 10000)[:2].sum() > 9000
+    allocation = allocate(scale, elasticity, 10000, groups, np.array([1000, np.inf]))
+    assert allocation[:2].sum() == pytest.approx(1000, rel=1e-6)
+    assert allocation.sum() == pytest.approx(10000, rel=1e-9)
+    # 同一分组内的素材边际收益仍然相等
+    marginal = _marginal(scale[:2], elasticity[:2], allocation[:2])
+    assert marginal[0] == pytest.approx(marginal[1], rel=1e-6)
+
+    # 上限之和小于预算时不能花完预算
+    allocation = allocate(scale, elasticity, 10000, groups, np.array([1000, 2000]))
+    assert allocation.sum() == pytest.approx(3000, rel=1e-6)
+
+def test_minimum_spend_drops_small_allocations():
+    scale = np.array([10.0, 10.0, 0.01])
+    elasticity = np.array([0.5, 0.5, 0.5])
+    assert 0 < allocate(scale, elasticity, 1000)[2] < 50
+
+    allocation = allocate_with_minimum(scale, elasticity, 1000, min_spend=50)
+    assert allocation[2] == 0
+    assert allocation[:2] == pytest.approx([500, 500], rel=1e-6)
+
+@pytest.mark.parametrize('kwargs', [
+    {'budget': 0},
+    {'budget': 100, 'min_spend': 200},
+    {'budget': 100, 'influencer_caps': {1: -1}},
+    {'budget': 100, 'lookback_days': 0},
+])
+def test_optimize_rejects_invalid_parameters(app, kwargs):
+    with pytest.raises(BudgetError):
+        optimize_budget(**kwargs)
+
+def test_optimize_without_history(app, db):
+    with pytest.raises(BudgetError):
+        optimize_budget(1000)
+
+def test_optimize_from_history(db, user):
+    influencers = [Influencer(name=f'达人{i}', douyin_id=f'dy{i}', uid=f'uid{i}', created_by_id=user.id)
+                   for i in range(2)]
+    curves = [(3.0, 0.6), (5.0, 0.3), (2.0, 0.7)]
+    materials = [Material(influencer=influencers[i // 2], material_id=f'70{i}',
+                          video_url=f'https://example.com/{i}', created_by_id=user.id) for i in range(3)]
+    db.session.add_all(materials)
+    for material, (scale, elasticity) in zip(materials, curves):
+        for day, cost in enumerate((20, 40, 80, 160), 1):
+            db.session.add(PromotionData(material=material, influencer=material.influencer,
+                                         date=date.today() - timedelta(days=day), cost=cost,
+                                         sales_amount=round(scale * cost ** elasticity, 2),
+                                         created_by_id=user.id))
+    db.session.commit()
+
+    result = optimize_budget(5000, influencer_caps={influencers[1].id: 500})
+    assert result['material_count'] == 3
+    assert result['allocated'] == pytest.approx(5000, abs=0.05)
+    items = {item['material_id']: item for item in result['items']}
+    assert items[materials[2].id]['cost'] == pytest.approx(500, abs=0.05)
+    assert [item['cost'] for item in result['items']] == sorted((item['cost'] for item in result['items']),
+                                                                reverse=True)
+    for material, (_, elasticity) in zip(materials, curves):
+        assert items[material.id]['elasticity'] == pytest.approx(elasticity, abs=0.01)
+        assert items[material.id]['data_points'] == 4
@@ -0,0 +1,81 @@
+"""
+素材预测：带星期效应的指数加权平均
+"""
+
+from datetime import date, datetime, timedelta
+import numpy as np
+import pytest
+from app.models import Influencer, Material, MaterialForecast, PromotionData
+from app.utils.forecasting import HORIZON, forecast_arrays, refresh_material_forecasts
+
+def test_constant_series_has_flat_forecast_and_no_spread():
+    values = np.full((1, 28), 50.0)
+    forecast, lower, upper = forecast_arrays(values, values > 0, first_weekday=0)
+    assert forecast.shape == (1, HORIZON)
+    np.testing.assert_allclose(forecast, 50.0)
+    np.testing.assert_allclose(lower, forecast)
+    np.testing.assert_allclose(upper, forecast)
+
+def test_weekly_pattern_follows_target_weekday():
+    # 周六、周日的数值是工作日的3倍，序列从周三开始
+    pattern = np.array([10, 10, 10, 10, 10, 30, 30], dtype=float)
+    first_weekday = 2
+    values = pattern[(first_weekday + np.arange(56)) % 7][None, :]
+    forecast, _, _ = forecast_arrays(values, values > 0, first_weekday)
+
+    future_weekdays = (first_weekday + 56 + np.arange(HORIZON)) % 7
+    weekend = future_weekdays >= 5
+    assert forecast[0, weekend].min() > 2 * forecast[0, ~weekend].max()
+    # 星期系数被收缩，但整体水平保持不变
+    assert forecast[0].sum() == pytest.approx(pattern.sum(), rel=0.05)
+
+def test_days_before_first_observation_are_ignored():
+    rng = np.random.default_rng(7)
+    history = rng.uniform(20, 80, 21)
+    padded = np.concatenate([np.zeros(7), history])[None, :]
+    observed = np.concatenate([np.zeros(7, dtype=bool), np.ones(21, dtype=bool)])[None, :]
+
+    # 前7天没有数据，与从第8天开始的序列（星期相同）结果一致
+    expected = forecast_arrays(history[None, :], np.ones((1, 21), dtype=bool), first_weekday=3)
+    for actual, wanted in zip(forecast_arrays(padded, observed, first_weekday=3), expected):
+        np.testing.assert_allclose(actual, wanted)
+
+def test_interval_widens_and_lower_bound_is_non_negative():
+    rng = np.random.default_rng(3)
+    values = rng.uniform(0, 100, (2, 35))
+    values[1] = 0
+    observed = np.ones_like(values, dtype=bool)
+    observed[1] = False
+    forecast, lower, upper = forecast_arrays(values, observed, first_weekday=0)
+
+    assert np.isfinite(forecast).all() and np.isfinite(lower).all() and np.isfinite(upper).all()
+    assert (lower >= 0).all()
+    assert np.all(np.diff(upper[0] - forecast[0]) > 0)
+    # 没有数据的素材预测为0
+    assert forecast[1].tolist() == [0] * HORIZON
+
+def test_refresh_replaces_forecasts(db, user):
+    influencer = Influencer(name='达人', douyin_id='dy1', uid='uid1', created_by_id=user.id)
+    materials = [Material(influencer=influencer, material_id=f'70{i}', video_url=f'https://example.com/{i}',
+                          created_by_id=user.id) for i in range(3)]
+    db.session.add_all(materials)
+    today = date(2024, 6, 1)
+    # 素材2只有超出历史范围的数据
+    for material, days in ((materials[0], range(1, 15)), (materials[1], range(1, 4)), (materials[2], [40])):
+        for day in days:
+            db.session.add(PromotionData(material=material, influencer=influencer,
+                                         date=today - timedelta(days=day), cost=100, sales_amount=250,
+                                         created_by_id=user.id))
+    db.session.commit()
+    # 上次计算的旧预测
+    db.session.add(MaterialForecast(material_id=materials[2].id, forecast_date=today, cost=1, sales_amount=1,
+                                    update_time=datetime(2024, 5, 31, 2)))
+    db.session.commit()
+
+    assert refresh_material_forecasts(history_days=28, today=today) == 2
+    rows = MaterialForecast.query.order_by(MaterialForecast.material_id, MaterialForecast.forecast_date).all()
+    assert {row.material_id for row in rows} == {materials[0].id, materials[1].id}
+    assert len(rows) == 2 * HORIZON
+    assert rows[0].forecast_date == today and rows[HORIZON - 1].forecast_date == today + timedelta(days=HORIZON - 1)
+    assert all(float(row.cost) == pytest.approx(100) and float(row.sales_amount) == pytest.approx(250)
+               for row in rows)
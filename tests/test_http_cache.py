@@ -0,0 +1,76 @@
+"""
+ETag条件请求
+"""
+
+import pytest
+from app.models import Influencer, InfluencerTag, influencer_tag_association
+from app.utils.http_cache import conditional_get
+
+@pytest.fixture
+def client(app, user):
+    calls = []
+
+    @conditional_get(lambda: [Influencer.query, influencer_tag_association])
+    def influencer_list():
+        calls.append(1)
+        return ','.join(influencer.name for influencer in Influencer.query.order_by(Influencer.id))
+
+    app.add_url_rule('/influencer-list', 'influencer_list', influencer_list)
+    client = app.test_client()
+    client.view_calls = calls
+    return client
+
+def _add_influencer(db, user, number):
+    influencer = Influencer(name=f'达人{number}', douyin_id=f'dy{number}', uid=f'uid{number}',
+                            created_by_id=user.id)
+    db.session.add(influencer)
+    db.session.commit()
+    return influencer
+
+def test_matching_etag_returns_304_without_rendering(client, db, user):
+    _add_influencer(db, user, 1)
+    response = client.get('/influencer-list')
+    assert response.status_code == 200
+    etag, weak = response.get_etag()
+    assert etag and weak
+    assert response.cache_control.private and response.cache_control.no_cache
+
+    response = client.get('/influencer-list', headers={'If-None-Match': f'W/"{etag}"'})
+    assert response.status_code == 304
+    assert response.get_etag() == (etag, True)
+    assert len(client.view_calls) == 1
+
+def test_etag_changes_with_updates_deletes_and_associations(client, db, user):
+    first = _add_influencer(db, user, 1)
+    second = _add_influencer(db, user, 2)
+    etags = [client.get('/influencer-list').get_etag()[0]]
+
+    second.name = '改名'
+    db.session.commit()
+    etags.append(client.get('/influencer-list').get_etag()[0])
+
+    # 删除不是最新的行时最大update_time不变，行数变化仍使ETag改变
+    db.session.delete(first)
+    db.session.commit()
+    etags.append(client.get('/influencer-list').get_etag()[0])
+
+    # 只改变标签关联时父表的update_time不变
+    second.tags.append(InfluencerTag(name='美妆'))
+    db.session.commit()
+    etags.append(client.get('/influencer-list').get_etag()[0])
+
+    assert len(set(etags)) == len(etags)
+    response = client.get('/influencer-list', headers={'If-None-Match': f'W/"{etags[0]}"'})
+    assert response.status_code == 200
+
+def test_if_modified_since_alone_is_not_trusted(client, db, user):
+    _add_influencer(db, user, 1)
+    response = client.get('/influencer-list', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == '达人1'
+
+def test_disabled_conditional_get(app, client, db, user):
+    app.config['CONDITIONAL_GET_ENABLED'] = False
+    response = client.get('/influencer-list')
+    assert response.status_code == 200
+    assert response.get_etag() == (None, None)
@@ -0,0 +1,84 @@
+"""
+推广数据推送：逐行解析与按 (素材, 日期) upsert
+"""
+
+import gzip
+import io
+import json
+from datetime import date
+from decimal import Decimal
+import pytest
+from app.models import IngestBatch, Influencer, Material, PromotionData
+from app.utils.ingest import IngestError, begin_batch, ingest_batch, ingest_promotion_lines, iter_lines, material_keys
+
+@pytest.fixture
+def material(db, user):
+    material_keys.clear()
+    influencer = Influencer(name='达人', douyin_id='dy1', uid='uid1', created_by_id=user.id)
+    material = Material(influencer=influencer, material_id='7001', video_url='https://example.com/7001',
+                        created_by_id=user.id)
+    db.session.add(material)
+    db.session.commit()
+    yield material
+    material_keys.clear()
+
+def _lines(*records):
+    return [json.dumps(record).encode() if not isinstance(record, bytes) else record for record in records]
+
+def test_iter_lines_handles_chunks_and_gzip():
+    payload = b'{"a": 1}\n\n{"b": 2}\n{"c": 3}'
+    assert list(iter_lines(io.BytesIO(payload))) == [b'{"a": 1}', b'', b'{"b": 2}', b'{"c": 3}']
+    assert list(iter_lines(io.BytesIO(gzip.compress(payload)), compressed=True)) == \
+        list(iter_lines(io.BytesIO(payload)))
+    with pytest.raises(IngestError):
+        list(iter_lines(io.BytesIO(b'not gzip'), compressed=True))
+
+def test_upsert_inserts_then_updates_same_day(db, user, material):
+    stats = ingest_promotion_lines(_lines(
+        {'material_id': '7001', 'date': '2024-05-01', 'cost': '100.50', 'sales_amount': 300, 'click_count': 7},
+        {'material_id': 7001, 'date': '2024-05-02', 'cost': 50, 'sales_amount': 80},
+    ), user.id)
+    db.session.commit()
+    assert (stats['rows'], stats['upserted'], stats['rejected']) == (2, 2, 0)
+
+    stats = ingest_promotion_lines(_lines(
+        {'material_id': '7001', 'date': '2024-05-01', 'cost': 120, 'sales_amount': 310},
+        # 同一批中同一天的数据以最后一条为准
+        {'material_id': '7001', 'date': '2024-05-01', 'cost': 130, 'sales_amount': 320},
+    ), user.id)
+    db.session.commit()
+    assert stats['upserted'] == 1
+
+    rows = {row.date: row for row in PromotionData.query.filter_by(material_id=material.id)}
+    assert len(rows) == 2
+    updated = rows[date(2024, 5, 1)]
+    assert (updated.cost, updated.sales_amount, updated.revenue) == (Decimal('130'), Decimal('320'), Decimal('320'))
+    assert updated.influencer_id == material.influencer_id
+    assert updated.created_by_id == user.id
+
+def test_invalid_and_unknown_rows_are_rejected(db, user, material):
+    stats = ingest_promotion_lines(_lines(
+        b'not json',
+        {'material_id': '7001', 'date': '2024-13-01', 'cost': 1, 'sales_amount': 1},
+        {'material_id': '7001', 'date': '2024-05-01', 'cost': 'NaN', 'sales_amount': 1},
+        {'material_id': '7001', 'date': '2024-05-01'},
+        {'material_id': '9999', 'date': '2024-05-01', 'cost': 1, 'sales_amount': 1},
+        {'material_id': '7001', 'date': '2024-05-01', 'cost': 1, 'sales_amount': 2},
+    ), user.id)
+    db.session.commit()
+    assert (stats['rows'], stats['upserted'], stats['rejected']) == (6, 1, 5)
+    assert [error['line'] for error in stats['errors']] == [1, 2, 3, 4]
+    assert stats['unknown_material_ids'] == ['9999']
+    assert PromotionData.query.count() == 1
+
+def test_batch_is_processed_once(db, user, material):
+    body = b'{"material_id": "7001", "date": "2024-05-01", "cost": 1, "sales_amount": 2}\n'
+    batch, process = begin_batch('batch-1', user.id)
+    assert process
+    stats = ingest_batch(batch, io.BytesIO(body), user.id)
+    assert stats['upserted'] == 1
+    assert IngestBatch.query.filter_by(batch_id='batch-1').one().status == 'completed'
+
+    batch, process = begin_batch('batch-1', user.id)
+    assert not process
+    assert batch.upserted_count == 1
@@ -0,0 +1,95 @@
+"""
+标签筛选表达式与位图索引
+"""
+
+import pytest
+from app.models import Influencer, InfluencerTag
+from app.utils.tag_index import (TagBitmapIndex, TagExpressionError, bitset_from_ids, bitset_slice,
+                                 compile_tag_filter, parse_tag_expression, popcount)
+
+def test_parse_operators_and_precedence():
+    assert parse_tag_expression('美妆') == ('tag', '美妆')
+    assert parse_tag_expression('美妆 or 时尚 AND 测评') == \
+        ('or', ('tag', '美妆'), ('and', ('tag', '时尚'), ('tag', '测评')))
+    assert parse_tag_expression('(美妆 OR 时尚) 测评') == \
+        ('and', ('or', ('tag', '美妆'), ('tag', '时尚')), ('tag', '测评'))
+
+def test_parse_infix_not_means_and_not():
+    assert parse_tag_expression('美妆 NOT 开箱') == ('and', ('tag', '美妆'), ('not', ('tag', '开箱')))
+    assert parse_tag_expression('NOT NOT 美妆') == ('not', ('not', ('tag', '美妆')))
+
+@pytest.mark.parametrize('expression', ['', '   ', 'AND', '美妆 OR', '(美妆', '美妆)', '()', 'NOT'])
+def test_parse_rejects_malformed_expressions(expression):
+    with pytest.raises(TagExpressionError):
+        parse_tag_expression(expression)
+
+def test_bitset_helpers():
+    ids = [0, 3, 7, 8, 100, 5000]
+    bitset = bitset_from_ids(ids)
+    assert bitset_from_ids([]) == 0
+    assert popcount(bitset) == len(ids)
+    assert all((bitset >> entity_id) & 1 for entity_id in ids)
+    assert bitset_slice(bitset, 0, 10) == ids
+    assert bitset_slice(bitset, 2, 3) == [7, 8, 100]
+    assert bitset_slice(bitset, 6, 5) == []
+    assert bitset_slice(bitset, 0, 0) == []
+
+def test_bitset_slice_skips_whole_chunks():
+    ids = list(range(0, 20000, 3))
+    bitset = bitset_from_ids(ids)
+    assert bitset_slice(bitset, 5000, 20, chunk_size=16) == ids[5000:5020]
+    assert bitset_slice(bitset, len(ids) - 2, 20, chunk_size=16) == ids[-2:]
+
+def _index(universe, members):
+    index = TagBitmapIndex('influencer')
+    index._universe = bitset_from_ids(universe)
+    index._bitmaps = {tag_name: bitset_from_ids(ids) for tag_name, ids in members.items()}
+    index._version = 1
+    index._ready = True
+    return index
+
+def test_evaluate_matches_set_semantics():
+    universe = set(range(1, 11))
+    members = {'美妆': {1, 2, 3, 4}, '时尚': {3, 4, 5, 6}, '开箱': {4, 6, 8}}
+    index = _index(universe, members)
+
+    def ids(expression):
+        return set(bitset_slice(index.evaluate(parse_tag_expression(expression)), 0, 100))
+
+    assert ids('美妆 时尚') == {3, 4}
+    assert ids('美妆 OR 时尚') == {1, 2, 3, 4, 5, 6}
+    assert ids('(美妆 OR 时尚) NOT 开箱') == {1, 2, 3, 5}
+    assert ids('NOT 美妆') == universe - members['美妆']
+    assert ids('未知标签') == set()
+    assert ids('NOT 未知标签') == universe
+
+def test_apply_tracks_consecutive_versions_only():
+    index = _index({1, 2}, {'美妆': {1}})
+    index.apply([3], [], [(3, '美妆', 1), (1, '美妆', -1)], version=2)
+    assert bitset_slice(index.evaluate(('tag', '美妆')), 0, 10) == [3]
+    assert bitset_slice(index._universe, 0, 10) == [1, 2, 3]
+
+    # 已包含的版本被忽略
+    index.apply([], [2], [], version=2)
+    assert bitset_slice(index._universe, 0, 10) == [1, 2, 3]
+
+    # 版本不连续说明有其他进程的变更，索引失效
+    index.apply([4], [], [], version=4)
+    assert not index.ready
+
+def test_built_index_agrees_with_sql_filter(db, user):
+    tags = {name: InfluencerTag(name=name) for name in ('美妆', '时尚', '开箱')}
+    assignments = [('美妆',), ('美妆', '时尚'), ('时尚', '开箱'), (), ('美妆', '开箱')]
+    for number, names in enumerate(assignments):
+        db.session.add(Influencer(name=f'达人{number}', douyin_id=f'dy{number}', uid=f'uid{number}',
+                                  created_by_id=user.id, tags=[tags[name] for name in names]))
+    db.session.commit()
+
+    index = TagBitmapIndex('influencer')
+    index.build()
+    assert index.ready
+    for expression in ('美妆', '美妆 时尚', '美妆 OR 开箱', 'NOT 美妆', '(美妆 OR 时尚) NOT 开箱'):
+        node = parse_tag_expression(expression)
+        expected = [influencer.id for influencer in Influencer.query
+                    .filter(compile_tag_filter(node, Influencer, InfluencerTag)).order_by(Influencer.id)]
+        assert bitset_slice(index.evaluate(node), 0, 100) == expected, expression